@@ -0,0 +1,58 @@
+"""
+Benchmark: arranque del broker de consola (preparar_rag) en frío vs. en caliente.
+
+- frío: no hay índice para la huella actual; se leen y fragmentan los PDFs, se embeben y se
+  guarda el índice FAISS (lo que antes ocurría en cada arranque).
+- caliente: la huella coincide; se hashean los PDFs y se abre el índice guardado con mmap.
+
+Usa los PDFs de data/ y un cliente de embeddings simulado con latencia proporcional al número de
+fragmentos (aprox. OpenAI), sin llamadas reales. El índice se guarda en un directorio temporal.
+
+Uso:
+    uv run python benchmarks/bench_broker_index.py
+"""
+import os
+import sys
+import time
+import tempfile
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.infrastructure.advanced_broker_vehicular import (
+    archivos_polizas, huella_indice, cargar_o_construir_indice,
+)
+
+EMBED_LATENCY_PER_CHUNK = 0.002   # segundos por fragmento (~2 s por lote de 1000 en OpenAI)
+DIMENSIONS = 1536                 # dimensión de text-embedding-ada-002 (OpenAIEmbeddings por defecto)
+
+
+class SlowEmbeddings(DeterministicFakeEmbedding):
+    """Embeddings deterministas con la latencia de una llamada remota por lote."""
+
+    def embed_documents(self, texts):
+        time.sleep(EMBED_LATENCY_PER_CHUNK * len(texts))
+        return super().embed_documents(texts)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    archivos = archivos_polizas()
+    embeddings = SlowEmbeddings(size=DIMENSIONS)
+    _, hash_s = timed(lambda: huella_indice(archivos, embeddings))
+    print(f"📄 {len(archivos)} PDFs  |  huella en {hash_s * 1000:.0f} ms")
+
+    with tempfile.TemporaryDirectory() as index_dir:
+        store, cold_s = timed(lambda: cargar_o_construir_indice(archivos, embeddings, index_dir=index_dir))
+        print(f"🧊 Frío:     {cold_s:7.2f} s  ({store.index.ntotal} fragmentos embebidos y guardados)")
+        for attempt in range(3):
+            store, warm_s = timed(lambda: cargar_o_construir_indice(archivos, embeddings, index_dir=index_dir))
+            print(f"🔥 Caliente: {warm_s:7.2f} s  (índice cargado con mmap, intento {attempt + 1})")
+        _, search_s = timed(lambda: store.similarity_search("deducible por robo total", k=5))
+        print(f"🔎 Primera búsqueda sobre el índice mapeado: {search_s * 1000:.1f} ms")
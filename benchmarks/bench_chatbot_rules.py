@@ -0,0 +1,107 @@
+"""
+Benchmark: latencia por mensaje de ChatbotReglas.buscar_mejor_intencion con 1k, 10k y 20k patrones.
+
+Compara el recorrido original (normalizar cada patrón y difflib contra todos en cada mensaje) con
+el índice compilado en cargar_flujos (IndicePatrones), con y sin el umbral de similitud como
+mínimo (como lo llama procesar_mensaje), y verifica que la intención elegida sea la misma.
+Los flujos son sintéticos y se escriben en un archivo temporal.
+
+Uso:
+    uv run python benchmarks/bench_chatbot_rules.py
+"""
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.infrastructure.chatbot_rules import ChatbotReglas
+
+VOCABULARIO = (
+    "hola buenos dias quiero consultar mi poliza seguro vehicular auto carro camioneta choque robo "
+    "grua auxilio mecanico deducible franquicia cobertura prima pago cuota vencimiento reclamo siniestro "
+    "inspeccion cita taller rimac pacifico mapfre positiva interseguro precio cotizar contratar cancelar "
+    "renovar beneficio asistencia viaje salud vida hogar tarjeta banco telefono horario gracias adios"
+).split()
+CONECTORES = ["de", "la", "el", "mi", "para", "con", "por", "en", "que", "como"]
+MENSAJES = 200
+UMBRAL = 0.6
+
+
+def frase(rng, n_min=2, n_max=7):
+    palabras = rng.choices(VOCABULARIO, k=rng.randint(n_min, n_max))
+    return " ".join(p if rng.random() > 0.3 else f"{rng.choice(CONECTORES)} {p}" for p in palabras)
+
+
+def escribir_flujos(path, n_patrones, seed=0):
+    rng = random.Random(seed)
+    intenciones = [{"id": f"intencion_{i}", "patrones": [frase(rng) for _ in range(10)], "respuestas": ["ok"]}
+                   for i in range(n_patrones // 10)]
+    flujos = {f"flujo_{f}": {"intenciones": intenciones[f::5]} for f in range(5)}
+    config = {"umbral_similitud": UMBRAL, "mensaje_no_entendido": "?", "mensaje_bienvenida": "", "mensaje_despedida": ""}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"configuracion": config, "flujos": flujos}, f, ensure_ascii=False)
+
+
+def busqueda_lineal(bot, mensaje):
+    """Implementación anterior de buscar_mejor_intencion."""
+    mejor = (None, 0, None)
+    for nombre_flujo, flujo in bot.flujos.items():
+        for intencion in flujo['intenciones']:
+            for patron in intencion['patrones']:
+                patron_normalizado = bot.normalizar_texto(patron)
+                score = bot.calcular_similitud(mensaje, patron_normalizado)
+                if patron_normalizado in mensaje:
+                    score = max(score, 0.8)
+                palabras_patron = patron_normalizado.split()
+                palabras_mensaje = mensaje.split()
+                if all(palabra in palabras_mensaje for palabra in palabras_patron):
+                    score = max(score, 0.85)
+                if score > mejor[1]:
+                    mejor = (intencion, score, nombre_flujo)
+    return mejor
+
+
+def medir(fn, mensajes):
+    latencias, resultados = [], []
+    for mensaje in mensajes:
+        start = time.perf_counter()
+        resultados.append(fn(mensaje))
+        latencias.append((time.perf_counter() - start) * 1000)
+    return np.array(latencias), resultados
+
+
+def decision(resultado):
+    intencion, score, _ = resultado
+    return intencion['id'] if intencion and score >= UMBRAL else None
+
+
+if __name__ == "__main__":
+    rng = random.Random(42)
+    for n_patrones in (1_000, 10_000, 20_000):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "flujos.json")
+            escribir_flujos(path, n_patrones)
+            start = time.perf_counter()
+            bot = ChatbotReglas(archivo_flujos=path)
+            carga_s = time.perf_counter() - start
+
+        mensajes = [bot.normalizar_texto(frase(rng, 1, 8)) for _ in range(MENSAJES)]
+        # La búsqueda lineal es lenta: se mide sobre una muestra
+        muestra = mensajes[:max(10, MENSAJES * 1000 // n_patrones)]
+        lineal_ms, lineal = medir(lambda m: busqueda_lineal(bot, m), muestra)
+        indice_ms, indice = medir(bot.buscar_mejor_intencion, mensajes)
+        umbral_ms, umbral = medir(lambda m: bot.buscar_mejor_intencion(m, UMBRAL), mensajes)
+
+        iguales = sum((a[0] is b[0] and a[1] == b[1]) for a, b in zip(lineal, indice))
+        iguales_umbral = sum(decision(a) == decision(b) for a, b in zip(lineal, umbral))
+        print(f"\n📚 {len(bot.indice):,} patrones (carga + compilación {carga_s:.2f}s)")
+        for nombre, ms in (("lineal", lineal_ms), ("índice", indice_ms), ("índice+umbral", umbral_ms)):
+            print(f"   {nombre:<14} p50={np.percentile(ms, 50):8.2f} ms  p95={np.percentile(ms, 95):8.2f} ms")
+        print(f"   resultado idéntico: {iguales}/{len(muestra)}  |  misma decisión con umbral: "
+              f"{iguales_umbral}/{len(muestra)}")
@@ -0,0 +1,87 @@
+"""
+Benchmark: etapa de recuperación de compare_policies para 2, 5 y 20 aseguradoras.
+
+Compara el bucle anterior (una similarity_search por aseguradora, cada una re-embebiendo la
+característica, en serie) con la versión actual: un solo embedding y búsquedas por vector
+en paralelo (síncrona con hilos y asíncrona con asyncio). Usa una colección Chroma temporal
+y un cliente de embeddings simulado con latencia fija, sin llamadas a OpenAI.
+
+Uso:
+    uv run python benchmarks/bench_compare_fanout.py
+"""
+import os
+import sys
+import time
+import asyncio
+import tempfile
+
+from langchain_chroma import Chroma
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.core.resources import registry
+from src.core.lexical_index import LexicalIndex
+from src.core.tools.comparator import retrieve_by_insurer, aretrieve_by_insurer, COMPARE_K
+
+EMBED_LATENCY = 0.15    # segundos por llamada de embedding (aprox. OpenAI)
+CHUNKS_PER_INSURER = 200
+FEATURE = "deducible por robo total"
+
+
+class SlowEmbeddings(DeterministicFakeEmbedding):
+    """Embeddings deterministas con la latencia de una llamada remota."""
+
+    def embed_query(self, text):
+        time.sleep(EMBED_LATENCY)
+        return super().embed_query(text)
+
+    async def aembed_query(self, text):
+        await asyncio.sleep(EMBED_LATENCY)
+        return super().embed_query(text)
+
+
+def build_store(directory, insurers, embeddings):
+    store = Chroma(collection_name="bench_compare", embedding_function=embeddings, persist_directory=directory)
+    lexical = LexicalIndex(os.path.join(directory, "lexical.sqlite"))
+    fast = DeterministicFakeEmbedding(size=embeddings.size)
+    for insurer in insurers:
+        ids = [f"{insurer}-{i}" for i in range(CHUNKS_PER_INSURER)]
+        texts = [f"{insurer} cláusula {i}: deducible, robo, siniestro y cobertura {i % 17}" for i in range(CHUNKS_PER_INSURER)]
+        metadatas = [{"insurer": insurer, "source": "bench.pdf", "page": i} for i in range(CHUNKS_PER_INSURER)]
+        store._collection.upsert(ids=ids, embeddings=fast.embed_documents(texts), documents=texts, metadatas=metadatas)
+        lexical.upsert(ids, texts, metadatas)
+    return store, lexical
+
+
+def serial_baseline(store, insurers):
+    """Implementación anterior: re-embebe la característica por aseguradora, en serie."""
+    return {insurer: store.similarity_search(FEATURE, k=COMPARE_K, filter={"insurer": insurer})
+            for insurer in insurers}
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+if __name__ == "__main__":
+    insurers = [f"ASEGURADORA{i:02d}" for i in range(20)]
+    embeddings = SlowEmbeddings(size=256)
+
+    with tempfile.TemporaryDirectory() as directory:
+        store, lexical = build_store(directory, insurers, embeddings)
+        registry.reset()
+        registry.get("vectorstore", lambda: store)
+        registry.get("lexical_index", lambda: lexical)
+        registry.get("embeddings", lambda: embeddings)
+
+        for n in (2, 5, 20):
+            keys = insurers[:n]
+            serial_ms = timed(lambda: serial_baseline(store, keys))
+            threads_ms = timed(lambda: retrieve_by_insurer(FEATURE, keys))
+            async_ms = timed(lambda: asyncio.run(aretrieve_by_insurer(FEATURE, keys)))
+            print(f"{n:>2} aseguradoras  serie={serial_ms:8.1f} ms  hilos={threads_ms:7.1f} ms  "
+                  f"async={async_ms:7.1f} ms  ({serial_ms / threads_ms:4.1f}x / {serial_ms / async_ms:4.1f}x)")
+        registry.reset()
@@ -0,0 +1,53 @@
+"""
+Benchmark: chequeo de similitud contra N frases de ejemplo (guardrail / intenciones).
+
+Compara el bucle Python anterior (np.array + norma por ejemplo en cada mensaje) con el
+producto matriz-vector sobre la matriz float32 pre-normalizada de ExemplarIndex.
+
+Uso:
+    uv run python benchmarks/bench_exemplars.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.core.exemplars import ExemplarIndex, normalize_rows
+
+DIMENSIONS = 3072
+
+
+def loop_best_score(query, vectors):
+    """Implementación anterior: un ejemplo a la vez con listas de floats."""
+    vec_a = np.array(query)
+    norm_a = np.linalg.norm(vec_a)
+    best = -1.0
+    for target in vectors:
+        vec_b = np.array(target)
+        best = max(best, np.dot(vec_a, vec_b) / (norm_a * np.linalg.norm(vec_b)))
+    return best
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(42)
+    query = rng.standard_normal(DIMENSIONS).tolist()
+
+    for n in (30, 1000, 5000):
+        vectors = rng.standard_normal((n, DIMENSIONS)).tolist()
+        texts = [f"frase {i}" for i in range(n)]
+        index = ExemplarIndex(texts, texts, normalize_rows(vectors))
+        repeat = 3 if n > 1000 else 10
+
+        loop_ms = timed(lambda: loop_best_score(query, vectors), repeat)
+        matrix_ms = timed(lambda: index.top_k(query, k=3), repeat * 10)
+        print(f"N={n:>5}  bucle={loop_ms:9.2f} ms  matriz={matrix_ms:7.3f} ms  ({loop_ms / matrix_ms:6.0f}x)")
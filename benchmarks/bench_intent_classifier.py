@@ -0,0 +1,85 @@
+"""
+Benchmark: router de intenciones local (intent_classifier.py) frente al LLM de clasificar_intencion.
+
+Mide el costo de cargar el pipeline guardado, la latencia por consulta (sin caché y desde la
+caché LRU), el throughput en lote y, sobre un conjunto de frases que no están en el dataset
+sintético, la exactitud y la tasa de derivación al LLM para varios umbrales de confianza.
+Con OPENAI_API_KEY también mide la latencia del router LLM anterior.
+
+Uso:
+    uv run python benchmarks/bench_intent_classifier.py
+"""
+import os
+import sys
+import time
+import tempfile
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.infrastructure.intent_classifier import IntentClassifier, train_intent_classifier
+
+# Frases escritas a mano, fuera de las plantillas de entrenamiento
+HELD_OUT = [
+    ("holaa que tal", "SALUDO"), ("buen día", "SALUDO"), ("mil gracias!", "SALUDO"),
+    ("ok gracias, hasta mañana", "SALUDO"), ("buenas", "SALUDO"), ("chao, gracias por todo", "SALUDO"),
+    ("un camión me chocó en la vía expresa", "EMERGENCIA"), ("me acaban de robar el auto", "EMERGENCIA"),
+    ("se me malogró el carro en plena pista", "EMERGENCIA"), ("necesito una grúa urgente", "EMERGENCIA"),
+    ("tuve un choque leve, qué hago", "EMERGENCIA"), ("hay un herido, ayuda", "EMERGENCIA"),
+    ("me robaron las llantas", "EMERGENCIA"), ("mi auto se volcó", "EMERGENCIA"),
+    ("¿rimac cubre inundaciones?", "CONSULTA"), ("cuánto es la prima anual en mapfre", "CONSULTA"),
+    ("qué diferencia hay entre pacífico e interseguro", "CONSULTA"), ("el deducible aplica en talleres afiliados?", "CONSULTA"),
+    ("la positiva cubre accidentes de los ocupantes", "CONSULTA"), ("quiero cotizar un seguro para mi camioneta", "CONSULTA"),
+    ("qué pasa si presto mi auto y lo chocan", "CONSULTA"), ("cubre el robo de accesorios?", "CONSULTA"),
+    ("cuáles son las exclusiones por manejar ebrio", "CONSULTA"), ("cómo pago la cuota del seguro", "CONSULTA"),
+]
+THRESHOLDS = (0.6, 0.7, 0.8, 0.9)
+BATCH = 10000
+
+
+def timed(fn, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "intent_router.joblib")
+        train_s = timed(lambda: train_intent_classifier(path))
+        load_s = timed(lambda: IntentClassifier.load_or_train(path), repeat=5)
+        classifier = IntentClassifier.load_or_train(path)
+
+    texts = [text for text, _ in HELD_OUT]
+    expected = np.array([label for _, label in HELD_OUT])
+
+    cold = []
+    for text in texts:
+        classifier._classify.cache_clear()
+        start = time.perf_counter()
+        classifier.classify(text)
+        cold.append((time.perf_counter() - start) * 1e6)
+    cached_us = timed(lambda: classifier.classify(texts[0]), repeat=10000) * 1e6
+    batch_s = timed(lambda: classifier.predict((texts * (BATCH // len(texts) + 1))[:BATCH]))
+
+    print(f"🧠 Entrenamiento {train_s:.2f}s  |  carga joblib {load_s * 1000:.1f} ms")
+    print(f"⚡ Una consulta: p50={np.percentile(cold, 50):.0f} µs  p95={np.percentile(cold, 95):.0f} µs  "
+          f"(caché LRU {cached_us:.1f} µs)")
+    print(f"📦 Lote de {BATCH}: {BATCH / batch_s:,.0f} consultas/s")
+
+    labels, confidences = classifier.predict(texts)
+    labels = np.array(labels)
+    print(f"🎯 Exactitud sin umbral: {np.mean(labels == expected):.0%} ({len(texts)} frases fuera del dataset)")
+    for threshold in THRESHOLDS:
+        local = confidences >= threshold
+        accuracy = np.mean(labels[local] == expected[local]) if local.any() else float("nan")
+        print(f"   umbral {threshold:.1f}: derivación al LLM {1 - local.mean():5.1%}  "
+              f"exactitud de las decisiones locales {accuracy:5.1%}")
+
+    if os.getenv("OPENAI_API_KEY"):
+        from src.infrastructure.advanced_broker_vehicular import clasificar_intencion_llm
+
+        llm_ms = [timed(lambda: clasificar_intencion_llm(text)) * 1000 for text in texts[:5]]
+        print(f"🌐 Router LLM anterior: p50={np.percentile(llm_ms, 50):.0f} ms por consulta")
@@ -0,0 +1,103 @@
+"""
+Benchmark: estrategias de reranking de consult_policy (latencia y coincidencia del top-5).
+
+Con OPENAI_API_KEY y la base vectorial ingerida, recupera los 15 candidatos reales de cada
+consulta y usa el reranker LLM (estrategia original) como referencia para medir cuántos de
+sus 5 fragmentos elige cada estrategia local. Sin clave, solo mide la latencia de las
+estrategias locales sobre candidatos sintéticos.
+
+Uso:
+    uv run python benchmarks/bench_rerankers.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+from langchain_core.documents import Document
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.core.reranker import RERANKERS, get_reranker
+
+QUERIES = [
+    "¿Cuál es el deducible por robo total?",
+    "¿Cubre daños por lluvia o inundación?",
+    "¿Qué exclusiones tiene la cobertura de responsabilidad civil?",
+    "¿Cubre el auto de reemplazo?",
+    "¿Qué pasa si el conductor está en estado de ebriedad?",
+    "¿Cuál es el plazo para reportar un siniestro?",
+    "¿Incluye asistencia en carretera?",
+    "¿Cubre accesorios musicales instalados?",
+]
+TOP_N = 5
+INITIAL_K = 15
+
+
+def real_candidates():
+    """(consulta, docs, scores) desde Chroma, o None si no hay clave o datos."""
+    if not os.getenv("OPENAI_API_KEY"):
+        return None
+    from src.core.database import get_vectorstore
+    from src.core.query_context import embed_query
+    from src.core.tools.rag_tool import search_with_scores
+
+    vectorstore = get_vectorstore()
+    candidates = []
+    for query in QUERIES:
+        docs, scores = search_with_scores(vectorstore, embed_query(query), k=INITIAL_K)
+        if docs:
+            candidates.append((query, docs, scores))
+    return candidates or None
+
+
+def synthetic_candidates():
+    rng = np.random.default_rng(42)
+    words = ("deducible robo siniestro cobertura exclusión póliza vehículo conductor lluvia "
+             "inundación asistencia reemplazo accesorios responsabilidad civil plazo aviso").split()
+    candidates = []
+    for query in QUERIES:
+        docs = [Document(page_content=" ".join(rng.choice(words, size=180))) for _ in range(INITIAL_K)]
+        scores = sorted(rng.uniform(0.6, 0.9, size=INITIAL_K), reverse=True)
+        candidates.append((query, docs, scores))
+    return candidates
+
+
+def run(strategy, candidates):
+    reranker = get_reranker(strategy)
+    if reranker.name != strategy:
+        return None
+    latencies, selections = [], []
+    for query, docs, scores in candidates:
+        start = time.perf_counter()
+        selected = reranker.rerank(query, docs, scores, top_n=TOP_N)
+        latencies.append((time.perf_counter() - start) * 1000)
+        selections.append([id(d) for d in selected])
+    return latencies, selections
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    candidates = real_candidates()
+    strategies = list(RERANKERS)
+    if candidates is None:
+        print("Sin OPENAI_API_KEY o sin datos: candidatos sintéticos, solo latencia de estrategias locales.\n")
+        candidates = synthetic_candidates()
+        strategies.remove("llm")
+
+    results = {}
+    for strategy in strategies:
+        result = run(strategy, candidates)
+        if result is None:
+            print(f"{strategy:>14}: no disponible")
+            continue
+        results[strategy] = result
+
+    reference = results.get("llm")
+    for strategy, (latencies, selections) in results.items():
+        line = f"{strategy:>14}: p50={np.percentile(latencies, 50):8.2f} ms  p95={np.percentile(latencies, 95):8.2f} ms"
+        if reference is not None:
+            overlap = [len(set(a) & set(b)) / TOP_N for a, b in zip(selections, reference[1])]
+            line += f"  coincidencia top-{TOP_N} con llm={np.mean(overlap):6.1%}"
+        print(line)
@@ -0,0 +1,67 @@
+"""
+Benchmark: costo por petición de construir clientes, vectorstore y agente vs. reutilizarlos.
+
+Uso:
+    uv run python benchmarks/bench_resources.py [iteraciones]
+
+No realiza llamadas a OpenAI: solo mide la construcción de objetos y conexiones.
+"""
+import os
+import sys
+import time
+import statistics
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from langchain_chroma import Chroma
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from langgraph.prebuilt import create_react_agent
+
+from src.core.agent import get_agent_executor
+from src.core.database import get_vectorstore, PERSIST_DIRECTORY, COLLECTION_NAME, EMBEDDING_MODEL
+from src.core.resources import get_llm, registry
+from src.core.tools.comparator import compare_policies
+from src.core.tools.rag_tool import consult_policy
+
+
+def per_request_construction():
+    """Lo que se hacía antes en cada petición/herramienta."""
+    embeddings = OpenAIEmbeddings(model=EMBEDDING_MODEL)
+    Chroma(persist_directory=PERSIST_DIRECTORY, embedding_function=embeddings, collection_name=COLLECTION_NAME)
+    ChatOpenAI(model_name="gpt-4o-mini", temperature=0)
+    create_react_agent(ChatOpenAI(temperature=0, model="gpt-4o-mini"), [compare_policies, consult_policy])
+
+
+def registry_lookup():
+    """Ruta actual: recursos compartidos del registro."""
+    get_vectorstore()
+    get_llm()
+    get_agent_executor()
+
+
+def measure(fn, iterations):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(name, timings):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{name:<28} media={statistics.mean(timings):8.3f} ms  p50={statistics.median(timings):8.3f} ms  p95={p95:8.3f} ms")
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+    registry.reset()
+    start = time.perf_counter()
+    registry_lookup()
+    print(f"Primera creación (registro): {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    report("Construcción por petición", measure(per_request_construction, iterations))
+    report("Registro compartido", measure(registry_lookup, iterations))
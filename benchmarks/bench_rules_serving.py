@@ -0,0 +1,100 @@
+"""
+Prueba de carga: POST /rules/chat con miles de sesiones simultáneas.
+
+Levanta la app FastAPI en proceso (ASGI) con un ServidorReglas sobre flujos sintéticos y envía
+mensajes de N sesiones con una concurrencia fija: la mayoría son variaciones de un patrón (una
+palabra más o menos) y el resto frases al azar que no coinciden con ninguna intención. A mitad de la prueba reescribe el archivo de
+flujos para medir la recarga en caliente bajo carga. Reporta requests/s, latencias y el estado
+del almacén de sesiones (creadas, desalojadas, vencidas). Como referencia, mide antes el mismo
+tráfico llamando a ServidorReglas.responder desde un pool de hilos, sin la capa HTTP (el cliente
+httpx y la app comparten proceso, así que la cifra HTTP incluye el costo de ambos lados).
+
+Uso:
+    uv run python benchmarks/bench_rules_serving.py
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bench_chatbot_rules import escribir_flujos, frase
+from src.infrastructure.api import api
+from src.infrastructure.chatbot_rules import ServidorReglas, AlmacenSesiones
+
+PATRONES = 2_000
+SESIONES = 5_000
+MENSAJES = 20_000
+RUIDO = 0.2                 # fracción de mensajes al azar (sin intención clara)
+CONCURRENCIA = 64
+MAX_SESIONES = 4_000        # por debajo de SESIONES para ejercitar el desalojo LRU
+
+
+def mensaje_de_usuario(rng, patrones):
+    if rng.random() < RUIDO:
+        return frase(rng, 1, 6)
+    palabras = rng.choice(patrones).split()
+    if len(palabras) > 2 and rng.random() < 0.5:
+        palabras.pop(rng.randrange(len(palabras)))
+    else:
+        palabras.insert(rng.randrange(len(palabras) + 1), frase(rng, 1, 1))
+    return " ".join(palabras)
+
+
+def generar_mensajes(server, seed=7):
+    rng = random.Random(seed)
+    patrones = [p for p, _, _ in server.bot.indice.patrones]
+    return [(f"sesion-{rng.randrange(SESIONES)}", mensaje_de_usuario(rng, patrones)) for _ in range(MENSAJES)]
+
+
+def run_directo(server, mensajes, hilos=8):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(hilos) as pool:
+        list(pool.map(lambda m: server.responder(*m), mensajes))
+    total = time.perf_counter() - start
+    print(f"⚙️  Sin HTTP ({hilos} hilos): {MENSAJES / total:,.0f} mensajes/s")
+
+
+async def run(path, server, mensajes):
+    semaphore = asyncio.Semaphore(CONCURRENCIA)
+    latencias = []
+
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def enviar(i, session_id, mensaje):
+            async with semaphore:
+                if i == MENSAJES // 2:
+                    # Nueva versión de los flujos en plena carga
+                    escribir_flujos(path, PATRONES, seed=1)
+                start = time.perf_counter()
+                response = await client.post("/rules/chat", json={"session_id": session_id, "message": mensaje})
+                response.raise_for_status()
+                latencias.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(enviar(i, s, m) for i, (s, m) in enumerate(mensajes)))
+        total = time.perf_counter() - start
+
+    ms = np.array(latencias) * 1000
+    print(f"🚀 {MENSAJES:,} mensajes de {SESIONES:,} sesiones, concurrencia {CONCURRENCIA}")
+    print(f"   {MENSAJES / total:,.0f} requests/s  p50={np.percentile(ms, 50):.1f} ms  "
+          f"p95={np.percentile(ms, 95):.1f} ms  max={ms.max():.1f} ms")
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "flujos.json")
+        escribir_flujos(path, PATRONES)
+        run_directo(ServidorReglas(path), generar_mensajes(ServidorReglas(path), seed=3))
+
+        server = ServidorReglas(path, sesiones=AlmacenSesiones(max_sesiones=MAX_SESIONES), intervalo_recarga=0.5)
+        api.get_rules_server = lambda: server
+        asyncio.run(run(path, server, generar_mensajes(server)))
+        print(f"📊 {server.stats()}")
@@ -0,0 +1,62 @@
+"""
+Benchmark: entrenamiento del modelo de intenciones de rules.py en memoria vs. out-of-core.
+
+- tfidf: genera el dataset completo en un DataFrame (iter_dataset_rules concatenado) y entrena
+  TfidfVectorizer + LogisticRegression, como el flujo original del notebook.
+- hashing: entrenar_rules_streaming (HashingVectorizer + SGDClassifier.partial_fit por bloques).
+
+Cada configuración corre en un proceso aparte para que el pico de RSS sea solo suyo.
+
+Uso:
+    uv run python benchmarks/bench_rules_training.py
+    uv run python benchmarks/bench_rules_training.py hashing 5000000   # una sola corrida
+"""
+import os
+import sys
+import time
+import json
+import subprocess
+
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.infrastructure.rules import (
+    INTENTS, iter_dataset_rules, entrenar_rules_streaming, peak_rss_mb,
+)
+
+CONFIGS = [("tfidf", 200_000), ("tfidf", 1_000_000), ("hashing", 200_000), ("hashing", 1_000_000), ("hashing", 3_000_000)]
+
+
+def train_tfidf(n_rows):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+
+    start = time.perf_counter()
+    df = pd.concat(iter_dataset_rules(n_rows))
+    vectorizer = TfidfVectorizer(ngram_range=(1, 2), strip_accents="unicode")
+    classifier = LogisticRegression(max_iter=200).fit(vectorizer.fit_transform(df["text"]), df["label"])
+    elapsed = time.perf_counter() - start
+    assert list(classifier.classes_) == sorted(INTENTS)
+    return {"rows": n_rows, "seconds": elapsed, "samples_per_sec": n_rows / elapsed, "peak_rss_mb": peak_rss_mb()}
+
+
+def run(mode, n_rows):
+    if mode == "tfidf":
+        return train_tfidf(n_rows)
+    _, _, stats = entrenar_rules_streaming(n_rows)
+    return stats
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3:
+        # Proceso hijo: imprime las métricas como JSON en la última línea
+        print(json.dumps(run(sys.argv[1], int(sys.argv[2]))))
+        sys.exit(0)
+
+    for mode, n_rows in CONFIGS:
+        output = subprocess.run([sys.executable, __file__, mode, str(n_rows)],
+                                capture_output=True, text=True, check=True).stdout
+        stats = json.loads(output.strip().splitlines()[-1])
+        print(f"{mode:<8} {n_rows:>9,} filas  {stats['seconds']:6.1f} s  "
+              f"{stats['samples_per_sec']:>9,.0f} muestras/s  pico RSS {stats['peak_rss_mb']:6.0f} MB")
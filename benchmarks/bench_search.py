@@ -0,0 +1,100 @@
+"""
+Benchmark: latencia de POST /search y POST /search/batch con el proceso ya caliente.
+
+Usa una colección Chroma temporal con embeddings deterministas y un cliente de embeddings
+simulado con latencia fija detrás de la caché de consultas: la primera vez que aparece una
+consulta paga la llamada remota; las repeticiones (caso habitual de un buscador) solo pagan la
+búsqueda vectorial. Las peticiones pasan por la app FastAPI completa (ASGI en proceso).
+
+Uso:
+    uv run python benchmarks/bench_search.py
+"""
+import os
+import sys
+import time
+import asyncio
+import tempfile
+
+import httpx
+import numpy as np
+from langchain_chroma import Chroma
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.core.resources import registry
+from src.core.embedding_cache import CachedEmbeddings
+from src.infrastructure.api import api
+
+EMBED_LATENCY = 0.15    # segundos por llamada de embedding (aprox. OpenAI)
+INSURERS = ["RIMAC", "MAPFRE", "PACIFICO", "POSITIVA", "LA_PROTECTORA"]
+CHUNKS_PER_INSURER = 2000
+QUERIES = [f"deducible por robo total del vehículo {i}" for i in range(50)]
+ROUNDS = 10
+
+
+class SlowEmbeddings(DeterministicFakeEmbedding):
+    """Embeddings deterministas con la latencia de una llamada remota."""
+
+    async def aembed_query(self, text):
+        await asyncio.sleep(EMBED_LATENCY)
+        return super().embed_query(text)
+
+    async def aembed_documents(self, texts):
+        await asyncio.sleep(EMBED_LATENCY)
+        return super().embed_documents(texts)
+
+
+def build_store(directory, size):
+    store = Chroma(collection_name="bench_search", persist_directory=directory)
+    fast = DeterministicFakeEmbedding(size=size)
+    for insurer in INSURERS:
+        ids = [f"{insurer}-{i}" for i in range(CHUNKS_PER_INSURER)]
+        texts = [f"{insurer} cláusula {i}: deducible, robo y siniestro" for i in range(CHUNKS_PER_INSURER)]
+        metadatas = [{"insurer": insurer, "source": f"{insurer.lower()}.pdf", "page": i // 4}
+                     for i in range(CHUNKS_PER_INSURER)]
+        store._collection.upsert(ids=ids, embeddings=fast.embed_documents(texts), documents=texts, metadatas=metadatas)
+    return store
+
+
+def report(label, latencies):
+    ms = np.array(latencies) * 1000
+    print(f"{label:<28} n={len(ms):>4}  p50={np.percentile(ms, 50):7.1f} ms  "
+          f"p95={np.percentile(ms, 95):7.1f} ms  max={ms.max():7.1f} ms")
+
+
+async def run():
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def timed(path, payload):
+            start = time.perf_counter()
+            response = await client.post(path, json=payload)
+            response.raise_for_status()
+            return time.perf_counter() - start
+
+        cold = [await timed("/search", {"query": q, "insurer": INSURERS[i % len(INSURERS)]})
+                for i, q in enumerate(QUERIES)]
+        warm = [await timed("/search", {"query": q, "insurer": INSURERS[i % len(INSURERS)]})
+                for _ in range(ROUNDS) for i, q in enumerate(QUERIES)]
+        unfiltered = [await timed("/search", {"query": q, "k": 20, "offset": 20}) for q in QUERIES]
+        report("/search (consulta nueva)", cold)
+        report("/search (caliente)", warm)
+        report("/search (sin filtro, pág. 2)", unfiltered)
+
+        batch = [{"query": f"franquicia en pérdida parcial {i}"} for i in range(20)]
+        report("/search/batch ×20 (nuevas)", [await timed("/search/batch", {"queries": batch})])
+        report("/search/batch ×20 (caliente)",
+               [await timed("/search/batch", {"queries": batch}) for _ in range(ROUNDS)])
+
+
+if __name__ == "__main__":
+    embeddings = CachedEmbeddings(SlowEmbeddings(size=256), model="bench", dimensions=256)
+    with tempfile.TemporaryDirectory() as directory:
+        store = build_store(directory, size=256)
+        registry.reset()
+        registry.get("vectorstore", lambda: store)
+        registry.get("embeddings", lambda: embeddings)
+        print(f"🔎 {len(INSURERS) * CHUNKS_PER_INSURER} fragmentos, {len(QUERIES)} consultas distintas")
+        asyncio.run(run())
+        print(f"📊 Caché de consultas: {embeddings.stats()}")
+        registry.reset()
@@ -1,17 +1,47 @@
+import os
+from langchain_core.messages import HumanMessage, ToolMessage
 from langgraph.prebuilt import create_react_agent
-from langchain_openai import ChatOpenAI
+from src.core.resources import registry, get_llm
 from src.core.tools.comparator import compare_policies
 from src.core.tools.rag_tool import consult_policy
 
+# Herramientas estructuradas cuyo resultado se entrega tal cual, sin una pasada final del LLM
+DIRECT_RETURN = os.getenv("AGENT_DIRECT_RETURN", "1") != "0"
+STRUCTURED_TOOLS = {"compare_policies"}
+
+
+def _create_agent_executor():
+    llm = get_llm()
+
+    tools = [compare_policies, consult_policy]
+    if DIRECT_RETURN:
+        # El agente termina tras la herramienta y su dict queda en ToolMessage.artifact
+        tools = [tool.model_copy(update={"return_direct": True}) if tool.name in STRUCTURED_TOOLS else tool
+                 for tool in tools]
+
+    return create_react_agent(llm, tools)
+
 
 def get_agent_executor():
     """
-    Inicializa y retorna el agente ejecutor usando LangGraph.
+    Retorna el agente ejecutor usando LangGraph.
+    El grafo se compila una vez por proceso y se reutiliza entre peticiones.
     """
-    llm = ChatOpenAI(temperature=0, model="gpt-4o-mini")
+    return registry.get("agent_executor", _create_agent_executor)
 
-    tools = [compare_policies, consult_policy]
 
-    agent_executor = create_react_agent(llm, tools)
+def structured_output(messages) -> dict | None:
+    """
+    Resultado estructurado del turno (p. ej. el comparativo de compare_policies) o None.
 
-    return agent_executor
+    Recorre hacia atrás los mensajes del turno actual (hasta el último HumanMessage): con retorno
+    directo el dict viaja en el artefacto del último ToolMessage, pero con llamadas en paralelo
+    puede no ser el último, y sin retorno directo el turno termina con la respuesta del LLM.
+    """
+    for message in reversed(messages or []):
+        if isinstance(message, HumanMessage):
+            break
+        if (isinstance(message, ToolMessage) and message.name in STRUCTURED_TOOLS
+                and isinstance(message.artifact, dict)):
+            return message.artifact
+    return None
@@ -0,0 +1,180 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict, Counter
+
+import numpy as np
+
+from src.core.exemplars import normalize_rows
+
+# Similitud coseno mínima entre consultas para reutilizar una respuesta
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", 0.95))
+# Vigencia de una respuesta en segundos y número máximo de respuestas (0 desactiva la caché)
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", 3600))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", 1024))
+# Registro de consultas (JSONL) para pre-calentar la caché al iniciar; sin ruta no se registra
+QUERY_LOG_PATH = os.getenv("QUERY_LOG_PATH")
+# Consultas más frecuentes del registro que se responden al iniciar el servidor (0 = no pre-calentar)
+ANSWER_CACHE_WARM = int(os.getenv("ANSWER_CACHE_WARM", 0))
+
+
+class SemanticAnswerCache:
+    """
+    Caché de respuestas por similitud de la consulta.
+
+    Una consulta reutiliza la respuesta de otra si sus embeddings superan `threshold` de
+    similitud coseno y ambas se respondieron con la misma generación del índice (la ingesta
+    la incrementa, invalidando todas las respuestas anteriores). Las entradas vencen a los
+    `ttl` segundos y, por encima de `max_size`, se descarta la menos usada recientemente.
+
+    Los vectores viven en una matriz preasignada de `max_size` filas: guardar o descartar una
+    entrada solo escribe o libera su fila, sin reconstruir la matriz.
+    """
+
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD, ttl: float = ANSWER_CACHE_TTL,
+                 max_size: int = ANSWER_CACHE_SIZE):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_size = max_size
+
+        self._entries = OrderedDict()   # id -> (query, answer, metadata, generation, created_at)
+        self._matrix = None             # (max_size, dim), se reserva con el primer vector
+        self._row_ids = []              # fila -> id (None si la fila está libre)
+        self._rows = {}                 # id -> fila
+        self._free_rows = []
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def _allocate(self, dim: int):
+        self._matrix = np.zeros((self.max_size, dim), dtype=np.float32)
+        self._row_ids = [None] * self.max_size
+        self._rows = {}
+        self._free_rows = list(range(self.max_size - 1, -1, -1))
+
+    def _remove(self, entry_id):
+        self._entries.pop(entry_id, None)
+        row = self._rows.pop(entry_id, None)
+        if row is not None:
+            # Fila a cero: no supera el umbral y queda libre para la próxima respuesta
+            self._matrix[row] = 0.0
+            self._row_ids[row] = None
+            self._free_rows.append(row)
+
+    def lookup(self, query_vector, generation: int):
+        """
+        Busca una respuesta para una consulta similar.
+
+        Returns:
+            (answer, metadata, cached_query, score) o None si no hay acierto.
+        """
+        if self.max_size <= 0:
+            return None
+        query = normalize_rows(query_vector)[0]
+        with self._lock:
+            if not self._entries or self._matrix.shape[1] != query.shape[0]:
+                self.misses += 1
+                return None
+
+            scores = self._matrix @ query
+            now = time.monotonic()
+            for row in np.argsort(-scores):
+                if scores[row] < self.threshold:
+                    break
+                entry_id = self._row_ids[row]
+                if entry_id is None:
+                    continue
+                cached_query, answer, metadata, entry_generation, created_at = self._entries[entry_id]
+                if entry_generation != generation or now - created_at > self.ttl:
+                    # Respuesta de un índice anterior o vencida: se descarta
+                    self.expired += 1
+                    self._remove(entry_id)
+                    continue
+                self._entries.move_to_end(entry_id)
+                self.hits += 1
+                return answer, metadata, cached_query, float(scores[row])
+
+            self.misses += 1
+            return None
+
+    def store(self, query: str, query_vector, answer: str, metadata: dict, generation: int):
+        """Guarda la respuesta de una consulta."""
+        if self.max_size <= 0:
+            return
+        vector = normalize_rows(query_vector)[0]
+        with self._lock:
+            if self._matrix is None or self._matrix.shape[1] != vector.shape[0]:
+                # Primer vector (o cambio de modelo de embeddings): se reserva la matriz
+                self._entries.clear()
+                self._allocate(vector.shape[0])
+            while len(self._entries) >= self.max_size:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evicted += 1
+            entry_id = self._next_id
+            self._next_id += 1
+            row = self._free_rows.pop()
+            self._matrix[row] = vector
+            self._row_ids[row] = entry_id
+            self._rows[entry_id] = row
+            self._entries[entry_id] = (query, answer, metadata, generation, time.monotonic())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def stats(self) -> dict:
+        """Contadores de aciertos, fallos, invalidaciones y tasa de acierto."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "entries": len(self._entries),
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+_log_lock = threading.Lock()
+
+
+def append_query_log(query: str, path: str = QUERY_LOG_PATH):
+    """Agrega una consulta al registro JSONL (no hace nada si no hay ruta configurada)."""
+    if not path:
+        return
+    line = json.dumps({"query": query, "ts": time.time()}, ensure_ascii=False)
+    try:
+        with _log_lock, open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    except OSError as e:
+        print(f"⚠️  No se pudo escribir el registro de consultas: {e}")
+
+
+def load_query_log(path: str, limit: int = None) -> list[str]:
+    """
+    Lee un registro de consultas (JSONL con campo 'query' o texto plano, una por línea).
+
+    Returns:
+        Consultas distintas ordenadas de más a menos frecuente (como máximo `limit`).
+    """
+    counts = Counter()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                try:
+                    line = json.loads(line).get("query", "")
+                except json.JSONDecodeError:
+                    continue
+            if line:
+                counts[line] += 1
+    return [query for query, _ in counts.most_common(limit)]
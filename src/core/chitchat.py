@@ -1,8 +1,8 @@
 import random
-import numpy as np
 import os
-import pickle
-from langchain_openai import OpenAIEmbeddings
+from src.core.database import get_embeddings, EMBEDDING_MODEL, EMBEDDING_DIMENSIONS
+from src.core.exemplars import ExemplarIndex
+from src.core.query_context import embed_query
 
 # --- CONFIGURACIÓN DE INTENCIONES ---
 INTENT_COMMONS = {
@@ -53,11 +53,11 @@ INTENT_RESPONSES = {
 
 
 class SemanticRouter:
-    def __init__(self, threshold: float = 0.85, cache_file: str = "chitchat_embeddings.pkl"):
+    def __init__(self, threshold: float = 0.85, cache_file: str = "chitchat_embeddings.npy"):
         """
         Enrutador semántico para conversaciones casuales.
         """
-        self.embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
+        self.embeddings = get_embeddings()
         self.threshold = threshold
         self.cache_path = os.path.join(os.path.dirname(__file__), cache_file)
         
@@ -69,57 +69,34 @@ class SemanticRouter:
                 self.corpus_texts.append(text)
                 self.intent_map.append(intent)
         
-        self.intent_vectors = self._load_or_generate_embeddings()
+        self.index = self._load_or_generate_embeddings()
 
     def _embed_list(self, texts: list[str]) -> list[list[float]]:
         if not texts: return []
         return self.embeddings.embed_documents(texts)
 
-    def _load_or_generate_embeddings(self) -> list[list[float]]:
-        if os.path.exists(self.cache_path):
-            try:
-                with open(self.cache_path, "rb") as f:
-                    return pickle.load(f)
-            except Exception as e:
-                print(f"Error cargando cache chitchat: {e}")
-        
-        print("Generando embeddings de Chitchat...")
-        vectors = self._embed_list(self.corpus_texts)
-        
-        try:
-            with open(self.cache_path, "wb") as f:
-                pickle.dump(vectors, f)
-        except: pass
-            
-        return vectors
+    def _load_or_generate_embeddings(self) -> ExemplarIndex:
+        return ExemplarIndex.load_or_build(
+            self.cache_path, self.corpus_texts, self.intent_map, self._embed_list,
+            model=EMBEDDING_MODEL, dimensions=EMBEDDING_DIMENSIONS
+        )
 
-    def detect_intent(self, text: str) -> tuple[str | None, float]:
+    def top_intents(self, text: str, k: int = 3, query_vector=None) -> list[tuple[str, str, float]]:
+        """Retorna los k ejemplos más cercanos como (ejemplo, intención, score)."""
+        if query_vector is None:
+            query_vector = embed_query(text)
+        return self.index.top_k(query_vector, k)
+
+    def detect_intent(self, text: str, query_vector=None) -> tuple[str | None, float]:
         """
         Detecta la intención del texto. 
+        Si se pasa query_vector (embedding del turno), no se vuelve a calcular.
         Retorna (intent_name, score) o (None, 0.0) si no supera el umbral.
         """
-        query_vec = self.embeddings.embed_query(text)
-        
-        vec_a = np.array(query_vec)
-        norm_a = np.linalg.norm(vec_a)
-        if norm_a == 0: return None, 0.0
-        
-        best_score = -1.0
-        best_intent = None
-        
-        for i, target_vec in enumerate(self.intent_vectors):
-            vec_b = np.array(target_vec)
-            norm_b = np.linalg.norm(vec_b)
-            if norm_b == 0: continue
-            
-            cosine_sim = np.dot(vec_a, vec_b) / (norm_a * norm_b)
-            
-            if cosine_sim > best_score:
-                best_score = cosine_sim
-                best_intent = self.intent_map[i]
-        
-        if best_score >= self.threshold:
-            return best_intent, float(best_score)
+        matches = self.top_intents(text, k=1, query_vector=query_vector)
+        if matches and matches[0][2] >= self.threshold:
+            _, best_intent, best_score = matches[0]
+            return best_intent, best_score
             
         return None, 0.0
 
@@ -0,0 +1,78 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+from src.core.embedding_cache import normalize_query
+
+# Vigencia (segundos) y número máximo de extracciones por aseguradora guardadas
+COMPARE_CACHE_TTL = float(os.getenv("COMPARE_CACHE_TTL", 86400))
+COMPARE_CACHE_SIZE = int(os.getenv("COMPARE_CACHE_SIZE", 2048))
+
+
+class ComparisonCache:
+    """
+    Caché de compare_policies por (característica normalizada, aseguradora, generación del índice).
+
+    Se guarda la extracción de cada aseguradora por separado, de modo que el comparativo de un
+    conjunto {RIMAC, MAPFRE, PACIFICO} reutiliza lo ya calculado para {RIMAC, MAPFRE} y solo
+    recalcula PACIFICO. Un conjunto ya visto completo se resuelve sin búsquedas ni LLM.
+    """
+
+    def __init__(self, ttl: float = COMPARE_CACHE_TTL, max_size: int = COMPARE_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()   # (feature, insurer, generation) -> (entry, created_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(feature: str, insurer_key: str, generation: int):
+        return normalize_query(feature), insurer_key, generation
+
+    def get_many(self, feature: str, insurer_keys: list[str], generation: int) -> dict:
+        """Extracciones cacheadas vigentes de las aseguradoras indicadas ({aseguradora: entrada})."""
+        found = {}
+        now = time.monotonic()
+        with self._lock:
+            for insurer_key in insurer_keys:
+                key = self._key(feature, insurer_key, generation)
+                cached = self._entries.get(key)
+                if cached is not None and now - cached[1] > self.ttl:
+                    del self._entries[key]
+                    cached = None
+                if cached is None:
+                    self.misses += 1
+                    continue
+                self._entries.move_to_end(key)
+                found[insurer_key] = dict(cached[0])
+                self.hits += 1
+        return found
+
+    def put_many(self, feature: str, entries: dict, generation: int):
+        """Guarda las extracciones {aseguradora: entrada} calculadas para la característica."""
+        if self.max_size <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            for insurer_key, entry in entries.items():
+                key = self._key(feature, insurer_key, generation)
+                self._entries[key] = (dict(entry), now)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Aciertos y fallos por aseguradora y tasa de acierto."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "hit_rate": self.hits / total if total else 0.0,
+        }
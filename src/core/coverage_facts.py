@@ -0,0 +1,88 @@
+import os
+import time
+import sqlite3
+import threading
+
+from src.core.embedding_cache import normalize_query
+
+# Características que el job offline precalcula si no se indica otra lista
+DEFAULT_FEATURES = [
+    "deducible",
+    "robo total",
+    "responsabilidad civil",
+    "auxilio mecánico",
+    "exclusiones",
+]
+
+
+class CoverageFacts:
+    """
+    Matriz precalculada característica × aseguradora con las filas {insurer, value, details, source}.
+
+    La llena el job offline (src/infrastructure/build_coverage_facts.py) con la misma extracción de
+    compare_policies; las consultas la leen en milisegundos. Cada fila recuerda la generación
+    del índice con la que se calculó, y solo se sirve mientras esa generación siga vigente.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute('''
+                CREATE TABLE IF NOT EXISTS coverage_facts (
+                    feature_key TEXT NOT NULL,
+                    feature TEXT NOT NULL,
+                    insurer TEXT NOT NULL,
+                    value TEXT,
+                    details TEXT,
+                    source TEXT,
+                    generation INTEGER NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (feature_key, insurer)
+                )
+            ''')
+            self._db.commit()
+
+    def upsert(self, feature: str, entries: dict, generation: int):
+        """Guarda las filas {aseguradora: entrada} de una característica."""
+        now = time.time()
+        rows = [
+            (normalize_query(feature), feature, insurer_key, entry.get("value"), entry.get("details"),
+             entry.get("source"), generation, now)
+            for insurer_key, entry in entries.items()
+        ]
+        with self._lock:
+            self._db.executemany('''
+                INSERT OR REPLACE INTO coverage_facts
+                (feature_key, feature, insurer, value, details, source, generation, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            self._db.commit()
+
+    def lookup(self, feature: str, insurer_keys: list[str], generation: int) -> dict:
+        """Filas vigentes de las aseguradoras indicadas ({aseguradora: entrada})."""
+        if not insurer_keys:
+            return {}
+        placeholders = ",".join("?" * len(insurer_keys))
+        with self._lock:
+            rows = self._db.execute(f'''
+                SELECT insurer, value, details, source FROM coverage_facts
+                WHERE feature_key = ? AND generation = ? AND insurer IN ({placeholders})
+            ''', [normalize_query(feature), generation, *insurer_keys]).fetchall()
+        return {
+            insurer: {"insurer": insurer, "value": value, "details": details, "source": source}
+            for insurer, value, details, source in rows
+        }
+
+    def features(self, generation: int = None) -> list[str]:
+        """Características precalculadas (opcionalmente solo las de una generación)."""
+        query = "SELECT DISTINCT feature FROM coverage_facts"
+        params = []
+        if generation is not None:
+            query += " WHERE generation = ?"
+            params.append(generation)
+        with self._lock:
+            return [row[0] for row in self._db.execute(query + " ORDER BY feature", params)]
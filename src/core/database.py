@@ -1,17 +1,116 @@
 import os
 from langchain_chroma import Chroma
 from langchain_openai import OpenAIEmbeddings
+from src.core.resources import registry
+from src.core.embedding_cache import CachedEmbeddings
+from src.core.lexical_index import LexicalIndex
 
 PERSIST_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../data/chroma_db")
+COLLECTION_NAME = "insurance_policies"
+EMBEDDING_MODEL = "text-embedding-3-large"
+EMBEDDING_DIMENSIONS = 3072
+LEXICAL_INDEX_PATH = os.path.join(PERSIST_DIRECTORY, "lexical_index.sqlite")
+COVERAGE_FACTS_PATH = os.path.join(PERSIST_DIRECTORY, "coverage_facts.sqlite")
+# Contador que la ingesta incrementa cada vez que cambia el contenido indexado
+GENERATION_PATH = os.path.join(PERSIST_DIRECTORY, "index_generation")
 
+# Caché de embeddings de consultas (LRU en memoria + SQLite). QUERY_CACHE_PATH="" desactiva el disco.
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", 4096))
+QUERY_CACHE_PATH = os.getenv(
+    "QUERY_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../data/query_embeddings.sqlite")
+)
+
+
+def _create_embeddings():
+    return CachedEmbeddings(
+        OpenAIEmbeddings(model=EMBEDDING_MODEL),
+        model=EMBEDDING_MODEL,
+        dimensions=EMBEDDING_DIMENSIONS,
+        max_size=QUERY_CACHE_SIZE,
+        db_path=QUERY_CACHE_PATH or None,
+    )
+
+
+def get_embeddings():
+    """Cliente de embeddings compartido por el proceso (con caché de consultas)."""
+    return registry.get("embeddings", _create_embeddings)
 
-def get_vectorstore():
-    """Retorna la instancia conectada a ChromaDB."""
-    embedding_function = OpenAIEmbeddings(model="text-embedding-3-large")
 
-    vectorstore = Chroma(
+def _create_vectorstore():
+    return Chroma(
         persist_directory=PERSIST_DIRECTORY,
-        embedding_function=embedding_function,
-        collection_name="insurance_policies"
+        embedding_function=get_embeddings(),
+        collection_name=COLLECTION_NAME
     )
-    return vectorstore
+
+
+def get_vectorstore():
+    """Retorna la instancia conectada a ChromaDB (una por proceso)."""
+    return registry.get("vectorstore", _create_vectorstore)
+
+
+def _create_lexical_index():
+    index = LexicalIndex(LEXICAL_INDEX_PATH)
+    # Solo se informa: los conteos difieren mientras corre una ingesta, y es ella la que reconcilia
+    drift = index.count() - get_vectorstore()._collection.count()
+    if drift:
+        print(f"⚠️  Índice léxico desfasado de ChromaDB ({drift:+d} fragmentos); se reconcilia en la próxima ingesta.")
+    return index
+
+
+def get_lexical_index():
+    """Índice BM25 de la colección de ChromaDB (uno por proceso)."""
+    return registry.get("lexical_index", _create_lexical_index)
+
+
+def reconcile_lexical_index() -> LexicalIndex:
+    """
+    Reconstruye el índice léxico desde Chroma si quedó desfasado (p. ej. ingesta interrumpida
+    entre ambos upserts). Solo lo llama la ingesta; la reconstrucción es una única transacción.
+    """
+    index, vectorstore = get_lexical_index(), get_vectorstore()
+    if index.count() != vectorstore._collection.count():
+        print("🔄 Reconstruyendo índice léxico desde ChromaDB...")
+        index.rebuild(vectorstore)
+    return index
+
+
+def reset_vectorstore():
+    """Descarta la conexión a ChromaDB, el índice léxico y el agente, p. ej. después de reconstruir el índice."""
+    registry.reset("vectorstore", "lexical_index", "agent_executor")
+
+
+_generation_cache = {"mtime": None, "value": 0}
+
+
+def get_index_generation() -> int:
+    """
+    Generación actual del índice (0 si nunca se incrementó).
+
+    Se relee el archivo solo si cambió su mtime, así los procesos del API detectan una
+    ingesta hecha por otro proceso sin costo apreciable por consulta.
+    """
+    try:
+        mtime = os.stat(GENERATION_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+    if mtime != _generation_cache["mtime"]:
+        try:
+            with open(GENERATION_PATH, "r") as f:
+                _generation_cache["value"] = int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return _generation_cache["value"]
+        _generation_cache["mtime"] = mtime
+    return _generation_cache["value"]
+
+
+def bump_index_generation() -> int:
+    """Incrementa la generación del índice (invalida las cachés de respuestas) y la retorna."""
+    generation = get_index_generation() + 1
+    os.makedirs(PERSIST_DIRECTORY, exist_ok=True)
+    tmp_path = GENERATION_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(str(generation))
+    os.replace(tmp_path, GENERATION_PATH)
+    return generation
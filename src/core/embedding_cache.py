@@ -0,0 +1,202 @@
+import os
+import asyncio
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+_EDGE_PUNCTUATION = " \t\n¿?¡!.,;:"
+
+
+def normalize_query(text: str) -> str:
+    """Forma canónica de una consulta: NFKC, minúsculas, espacios simples y sin signos en los extremos."""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return " ".join(text.split()).strip(_EDGE_PUNCTUATION)
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Cliente de embeddings con caché de consultas: texto normalizado -> vector.
+
+    Dos niveles:
+      1. LRU en memoria acotado (max_size entradas).
+      2. SQLite opcional en disco, con clave (modelo, dimensiones, texto normalizado),
+         compartido entre reinicios y procesos.
+
+    Solo se cachean las consultas (embed_query); embed_documents pasa directo al cliente.
+    """
+
+    def __init__(self, embeddings: Embeddings, model: str, dimensions: int,
+                 max_size: int = 4096, db_path: str = None):
+        self.embeddings = embeddings
+        self.model = model
+        self.dimensions = dimensions
+        self.max_size = max_size
+        self.db_path = db_path
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+
+        if db_path:
+            self._open_db(db_path)
+
+    # --- Nivel en disco ---
+    def _open_db(self, db_path: str):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute('''
+                CREATE TABLE IF NOT EXISTS query_embeddings (
+                    model TEXT NOT NULL,
+                    dimensions INTEGER NOT NULL,
+                    text TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    PRIMARY KEY (model, dimensions, text)
+                )
+            ''')
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️  Caché de embeddings en disco deshabilitada: {e}")
+            self._db = None
+
+    def _disk_get(self, key: str):
+        if self._db is None:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                "SELECT vector FROM query_embeddings WHERE model = ? AND dimensions = ? AND text = ?",
+                (self.model, self.dimensions, key)
+            ).fetchone()
+        if row is None:
+            return None
+        vector = np.frombuffer(row[0], dtype=np.float32)
+        return vector.tolist() if vector.size == self.dimensions else None
+
+    def _disk_put(self, key: str, vector: list[float]):
+        if self._db is None:
+            return
+        blob = np.asarray(vector, dtype=np.float32).tobytes()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO query_embeddings (model, dimensions, text, vector) VALUES (?, ?, ?, ?)",
+                (self.model, self.dimensions, key, blob)
+            )
+            self._db.commit()
+
+    # --- Nivel en memoria ---
+    def _memory_get(self, key: str):
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+            return vector
+
+    def _memory_put(self, key: str, vector: list[float]):
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_size:
+                self._memory.popitem(last=False)
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _lookup(self, key: str):
+        vector = self._memory_get(key)
+        if vector is not None:
+            self._count("hits_memory")
+            return vector
+        vector = self._disk_get(key)
+        if vector is not None:
+            self._count("hits_disk")
+            self._memory_put(key, vector)
+            return vector
+        self._count("misses")
+        return None
+
+    def _store(self, key: str, vector: list[float]):
+        self._memory_put(key, vector)
+        self._disk_put(key, vector)
+
+    # --- Versiones asíncronas: SQLite corre en un hilo para no bloquear el event loop ---
+    async def _alookup_many(self, keys: list[str]) -> dict:
+        vectors = {}
+        for key in keys:
+            vectors[key] = self._memory_get(key)
+            if vectors[key] is not None:
+                self._count("hits_memory")
+        pending = [key for key, vector in vectors.items() if vector is None]
+        if pending and self._db is not None:
+            found = await asyncio.to_thread(lambda: {key: self._disk_get(key) for key in pending})
+            for key, vector in found.items():
+                if vector is not None:
+                    self._count("hits_disk")
+                    self._memory_put(key, vector)
+                    vectors[key] = vector
+        for key, vector in vectors.items():
+            if vector is None:
+                self._count("misses")
+        return vectors
+
+    async def _astore_many(self, items: dict):
+        for key, vector in items.items():
+            self._memory_put(key, vector)
+        if self._db is not None:
+            await asyncio.to_thread(lambda: [self._disk_put(key, vector) for key, vector in items.items()])
+
+    # --- Interfaz Embeddings ---
+    # El texto normalizado es solo la clave: se embebe el texto original, igual que los documentos
+    def embed_query(self, text: str) -> list[float]:
+        key = normalize_query(text) or text
+        vector = self._lookup(key)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self._store(key, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> list[float]:
+        key = normalize_query(text) or text
+        vector = (await self._alookup_many([key]))[key]
+        if vector is None:
+            vector = await self.embeddings.aembed_query(text)
+            await self._astore_many({key: vector})
+        return vector
+
+    async def aembed_queries(self, texts: list[str]) -> list[list[float]]:
+        """Varias consultas a la vez: las que no están en caché se embeben en una sola llamada."""
+        keys = [normalize_query(text) or text for text in texts]
+        originals = dict(zip(reversed(keys), reversed(texts)))   # primer texto de cada clave
+        vectors = await self._alookup_many(list(dict.fromkeys(keys)))
+        missing = [key for key, vector in vectors.items() if vector is None]
+        if missing:
+            documents = [originals[key] for key in missing]
+            computed = dict(zip(missing, await self.embeddings.aembed_documents(documents)))
+            await self._astore_many(computed)
+            vectors.update(computed)
+        return [vectors[key] for key in keys]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return await self.embeddings.aembed_documents(texts)
+
+    def stats(self) -> dict:
+        """Contadores de aciertos por nivel y tasa de acierto."""
+        total = self.hits_memory + self.hits_disk + self.misses
+        return {
+            "hits_memory": self.hits_memory,
+            "hits_disk": self.hits_disk,
+            "misses": self.misses,
+            "hit_rate": (self.hits_memory + self.hits_disk) / total if total else 0.0,
+            "memory_entries": len(self._memory),
+        }
@@ -0,0 +1,188 @@
+import os
+import json
+import hashlib
+import numpy as np
+
+KEYS_VERSION = 1
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    """Convierte a float32 y normaliza cada fila (las filas nulas quedan en cero)."""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class ExemplarIndex:
+    """
+    Índice de frases de ejemplo (amenazas, intenciones) como matriz float32 pre-normalizada.
+
+    El puntaje contra todos los ejemplos es un único producto matriz-vector, por lo que el
+    costo se mantiene plano aunque el catálogo crezca a miles de frases. La matriz se guarda
+    en .npy y se abre con mmap, de modo que varios procesos worker comparten las mismas páginas.
+    """
+
+    def __init__(self, texts: list[str], labels: list[str], matrix: np.ndarray):
+        if len(texts) != len(labels) or len(texts) != matrix.shape[0]:
+            raise ValueError("texts, labels y la matriz deben tener el mismo número de filas")
+        self.texts = list(texts)
+        self.labels = list(labels)
+        self.matrix = matrix
+
+    @classmethod
+    def load_or_build(cls, path: str, texts: list[str], labels: list[str], embed_fn,
+                      model: str = None, dimensions: int = None):
+        """
+        Carga la matriz desde `path` (mmap) y genera solo los embeddings que falten.
+
+        Junto al .npy se guarda un índice de claves (`<nombre>.keys.json`) con el hash de cada
+        frase, el modelo y las dimensiones. Al agregar una frase solo se calcula su embedding,
+        las frases eliminadas se descartan y, si nada cambió, la matriz se abre tal cual.
+
+        Args:
+            path: Ruta del archivo .npy.
+            texts: Frases de ejemplo, en orden.
+            labels: Etiqueta de cada frase (intención, tipo de amenaza...).
+            embed_fn: Función que retorna un embedding por texto.
+            model: Modelo de embeddings (un cambio invalida todas las filas).
+            dimensions: Dimensión esperada de los vectores.
+        """
+        name = os.path.basename(path)
+        keys = [phrase_key(text) for text in texts]
+        matrix, cached_keys = _load_cached(path, model, dimensions)
+
+        if matrix is not None and cached_keys == keys:
+            return cls(texts, labels, matrix)
+
+        rows = {}
+        if matrix is not None:
+            rows = {key: row for row, key in enumerate(cached_keys)}
+        missing = list(dict.fromkeys(text for text, key in zip(texts, keys) if key not in rows))
+
+        if missing:
+            print(f"Generando embeddings de {name} ({len(missing)} de {len(texts)} frases)...")
+            new_vectors = normalize_rows(embed_fn(missing))
+        else:
+            print(f"Actualizando cache {name} (frases eliminadas o reordenadas)...")
+            new_vectors = np.zeros((0, 0), dtype=np.float32)
+        new_rows = {phrase_key(text): i for i, text in enumerate(missing)}
+
+        if texts:
+            matrix = np.vstack([
+                matrix[rows[key]] if key in rows else new_vectors[new_rows[key]]
+                for key in keys
+            ]).astype(np.float32)
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+
+        try:
+            save_matrix(path, matrix, keys=keys, model=model, dimensions=dimensions)
+        except OSError as e:
+            print(f"No se pudo guardar cache {name}: {e}")
+        return cls(texts, labels, matrix)
+
+    @classmethod
+    def concat(cls, indexes: list["ExemplarIndex"], prefixes: list[str] = None):
+        """
+        Une varios índices en uno para puntuarlos en una sola pasada.
+
+        Args:
+            indexes: Índices a unir (deben tener la misma dimensión).
+            prefixes: Prefijo opcional para las etiquetas de cada índice (ej. 'threat:').
+        """
+        prefixes = prefixes or [""] * len(indexes)
+        texts, labels = [], []
+        for index, prefix in zip(indexes, prefixes):
+            texts.extend(index.texts)
+            labels.extend(f"{prefix}{label}" for label in index.labels)
+        matrices = [index.matrix for index in indexes if len(index.texts)]
+        matrix = np.vstack(matrices) if matrices else np.zeros((0, 0), dtype=np.float32)
+        return cls(texts, labels, matrix)
+
+    def scores(self, query_vector) -> np.ndarray:
+        """Similitud coseno de la consulta contra todos los ejemplos."""
+        if len(self.texts) == 0:
+            return np.zeros(0, dtype=np.float32)
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return np.zeros(len(self.texts), dtype=np.float32)
+        return self.matrix @ (query / norm)
+
+    def top_k(self, query_vector, k: int = 1) -> list[tuple[str, str, float]]:
+        """Retorna los k ejemplos más similares como (texto, etiqueta, score), de mayor a menor."""
+        scores = self.scores(query_vector)
+        if scores.size == 0:
+            return []
+        k = min(k, scores.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.texts[i], self.labels[i], float(scores[i])) for i in top]
+
+
+def phrase_key(text: str) -> str:
+    """Hash estable de una frase de ejemplo."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def keys_path(path: str) -> str:
+    """Ruta del índice de claves asociado a una matriz .npy."""
+    return os.path.splitext(path)[0] + ".keys.json"
+
+
+def _load_cached(path: str, model: str, dimensions: int):
+    """
+    Abre la matriz en caché y sus claves por fila.
+
+    Returns:
+        (matrix, keys), o (None, None) si falta algo o no corresponde al modelo/dimensiones.
+    """
+    name = os.path.basename(path)
+    if not os.path.exists(path) or not os.path.exists(keys_path(path)):
+        return None, None
+    try:
+        with open(keys_path(path), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        matrix = np.load(path, mmap_mode="r")
+    except (OSError, ValueError) as e:
+        print(f"Error cargando cache {name}: {e}")
+        return None, None
+
+    keys = meta.get("keys", [])
+    if meta.get("version") != KEYS_VERSION or len(keys) != matrix.shape[0]:
+        print(f"Cache {name} inconsistente; se regenerará.")
+        return None, None
+    if meta.get("model") != model or meta.get("dimensions") != dimensions:
+        print(f"Cache {name} generado con otro modelo ({meta.get('model')}, {meta.get('dimensions')}).")
+        return None, None
+    if dimensions is not None and keys and matrix.shape[1] != dimensions:
+        print(f"Cache {name} con dimensión {matrix.shape[1]} (se esperaba {dimensions}).")
+        return None, None
+    return matrix, keys
+
+
+def save_matrix(path: str, matrix: np.ndarray, keys: list[str] = None,
+                model: str = None, dimensions: int = None):
+    """
+    Guarda la matriz en .npy de forma atómica, junto con su índice de claves si se indica.
+
+    El índice viejo se borra antes de reemplazar la matriz: si el proceso se interrumpe
+    entre ambos pasos, la siguiente carga regenera en lugar de usar filas desalineadas.
+    """
+    meta_path = keys_path(path)
+    if keys is not None and os.path.exists(meta_path):
+        os.remove(meta_path)
+
+    tmp_path = path + ".tmp.npy"
+    np.save(tmp_path, np.ascontiguousarray(matrix, dtype=np.float32))
+    os.replace(tmp_path, path)
+
+    if keys is not None:
+        meta = {"version": KEYS_VERSION, "model": model, "dimensions": dimensions, "keys": keys}
+        tmp_meta = meta_path + ".tmp"
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=1)
+        os.replace(tmp_meta, meta_path)
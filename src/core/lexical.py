@@ -0,0 +1,64 @@
+import re
+import unicodedata
+
+import numpy as np
+
+# Palabras vacías frecuentes en consultas y pólizas (sin tildes, como quedan tras tokenize)
+STOPWORDS = {
+    "a", "al", "con", "como", "cual", "cuales", "de", "del", "el", "en", "es", "esta", "este",
+    "hay", "la", "las", "lo", "los", "mi", "me", "o", "para", "por", "que", "se", "si", "su",
+    "sus", "un", "una", "uno", "y", "le", "les", "son", "ser", "mas", "no",
+}
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def strip_accents(text: str) -> str:
+    """Quita tildes y diacríticos ('póliza' -> 'poliza')."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def tokenize(text: str) -> list[str]:
+    """Tokens en minúsculas, sin tildes ni palabras vacías."""
+    return [t for t in _TOKEN_RE.findall(strip_accents(text.lower())) if t not in STOPWORDS]
+
+
+def bm25_scores(query_tokens: list[str], docs_tokens: list[list[str]],
+                k1: float = 1.5, b: float = 0.75) -> np.ndarray:
+    """
+    Puntaje BM25 de cada documento para la consulta, con IDF calculado sobre los propios documentos.
+
+    Pensado para conjuntos pequeños (los candidatos de una búsqueda vectorial).
+    """
+    n_docs = len(docs_tokens)
+    if n_docs == 0:
+        return np.zeros(0, dtype=np.float32)
+
+    lengths = np.array([len(tokens) for tokens in docs_tokens], dtype=np.float32)
+    avg_length = max(float(lengths.mean()), 1.0)
+    counts = [{} for _ in docs_tokens]
+    for doc_counts, tokens in zip(counts, docs_tokens):
+        for token in tokens:
+            doc_counts[token] = doc_counts.get(token, 0) + 1
+
+    scores = np.zeros(n_docs, dtype=np.float32)
+    for term in set(query_tokens):
+        tf = np.array([doc_counts.get(term, 0) for doc_counts in counts], dtype=np.float32)
+        df = int((tf > 0).sum())
+        if df == 0:
+            continue
+        idf = np.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+        scores += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * lengths / avg_length))
+    return scores
+
+
+def min_max(values) -> np.ndarray:
+    """Escala los valores a [0, 1] (todo ceros si son constantes)."""
+    values = np.asarray(values, dtype=np.float32)
+    if values.size == 0:
+        return values
+    spread = float(values.max() - values.min())
+    if spread == 0:
+        return np.zeros_like(values)
+    return (values - values.min()) / spread
@@ -0,0 +1,159 @@
+import os
+import json
+import sqlite3
+import threading
+
+from langchain_core.documents import Document
+
+from src.core.lexical import tokenize
+
+# Campos de metadata por los que se puede filtrar (igual que en los filtros de Chroma)
+FILTER_FIELDS = ("insurer", "source")
+
+
+class LexicalIndex:
+    """
+    Índice BM25 (SQLite FTS5) sobre los mismos fragmentos que la colección de Chroma.
+
+    Complementa la búsqueda vectorial en tokens exactos que los embeddings capturan mal:
+    códigos SBS de producto (0020200013), números de artículo o cláusula, nombres propios.
+    Los fragmentos se identifican con los mismos IDs que en Chroma, de modo que la ingesta
+    puede actualizar y borrar en ambos índices a la vez.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute('''
+                CREATE TABLE IF NOT EXISTS chunks (
+                    rowid INTEGER PRIMARY KEY,
+                    id TEXT UNIQUE NOT NULL,
+                    insurer TEXT,
+                    source TEXT,
+                    metadata TEXT NOT NULL
+                )
+            ''')
+            # unicode61 + remove_diacritics: 'Póliza' y 'poliza' son el mismo término
+            self._db.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts
+                USING fts5(content, tokenize = 'unicode61 remove_diacritics 2')
+            ''')
+            self._db.commit()
+
+    # --- Escritura ---
+    def _delete_ids(self, ids):
+        placeholders = ",".join("?" * len(ids))
+        rowids = [row[0] for row in self._db.execute(
+            f"SELECT rowid FROM chunks WHERE id IN ({placeholders})", ids
+        )]
+        if rowids:
+            marks = ",".join("?" * len(rowids))
+            self._db.execute(f"DELETE FROM chunks_fts WHERE rowid IN ({marks})", rowids)
+            self._db.execute(f"DELETE FROM chunks WHERE rowid IN ({marks})", rowids)
+
+    def _insert(self, ids, documents, metadatas):
+        for ident, content, metadata in zip(ids, documents, metadatas):
+            metadata = metadata or {}
+            cursor = self._db.execute(
+                "INSERT INTO chunks (id, insurer, source, metadata) VALUES (?, ?, ?, ?)",
+                (ident, metadata.get("insurer"), metadata.get("source"), json.dumps(metadata))
+            )
+            self._db.execute("INSERT INTO chunks_fts (rowid, content) VALUES (?, ?)",
+                             (cursor.lastrowid, content))
+
+    def upsert(self, ids: list[str], documents: list[str], metadatas: list[dict]):
+        """Inserta o reemplaza fragmentos por ID."""
+        if not ids:
+            return
+        with self._lock:
+            self._delete_ids(ids)
+            self._insert(ids, documents, metadatas)
+            self._db.commit()
+
+    def delete(self, ids: list[str]):
+        """Elimina fragmentos por ID."""
+        if not ids:
+            return
+        with self._lock:
+            self._delete_ids(list(ids))
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM chunks_fts")
+            self._db.execute("DELETE FROM chunks")
+            self._db.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def rebuild(self, vectorstore, batch_size: int = 1000):
+        """
+        Reconstruye el índice a partir del contenido actual de la colección de Chroma.
+
+        Todo ocurre en una sola transacción: otros procesos siguen leyendo el índice anterior
+        (WAL) hasta el commit, y si la reconstrucción falla no queda a medias.
+        """
+        offset = 0
+        with self._lock:
+            try:
+                self._db.execute("DELETE FROM chunks_fts")
+                self._db.execute("DELETE FROM chunks")
+                while True:
+                    page = vectorstore.get(include=["documents", "metadatas"], limit=batch_size, offset=offset)
+                    if not page["ids"]:
+                        break
+                    self._insert(page["ids"], page["documents"], page["metadatas"])
+                    offset += len(page["ids"])
+                self._db.commit()
+            except BaseException:
+                self._db.rollback()
+                raise
+        return offset
+
+    # --- Búsqueda ---
+    @staticmethod
+    def _where(filter: dict):
+        """Traduce un filtro estilo Chroma ({'insurer': 'RIMAC'} o {'insurer': {'$in': [...]}}) a SQL."""
+        clauses, params = [], []
+        for field, value in (filter or {}).items():
+            if field not in FILTER_FIELDS:
+                raise ValueError(f"Filtro no soportado por el índice léxico: {field}")
+            if isinstance(value, dict) and "$in" in value:
+                values = list(value["$in"])
+                clauses.append(f"c.{field} IN ({','.join('?' * len(values))})")
+                params.extend(values)
+            else:
+                clauses.append(f"c.{field} = ?")
+                params.append(value)
+        return "".join(f" AND {clause}" for clause in clauses), params
+
+    def search(self, query: str, k: int = 10, filter: dict = None) -> list[tuple[Document, float]]:
+        """
+        Los k fragmentos con mejor BM25 para la consulta, como (Document, score) con score mayor = mejor.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        match = " OR ".join(f'"{term}"' for term in terms)
+        where, params = self._where(filter)
+        with self._lock:
+            rows = self._db.execute(
+                f"""
+                SELECT c.id, c.metadata, f.content, bm25(chunks_fts) AS rank
+                FROM chunks_fts f JOIN chunks c ON c.rowid = f.rowid
+                WHERE chunks_fts MATCH ?{where}
+                ORDER BY rank LIMIT ?
+                """,
+                [match, *params, k]
+            ).fetchall()
+        # bm25() de FTS5 es negativo (más bajo = mejor)
+        return [
+            (Document(page_content=content, metadata=json.loads(metadata), id=ident), -rank)
+            for ident, metadata, content, rank in rows
+        ]
@@ -0,0 +1,74 @@
+import threading
+import contextvars
+from contextlib import contextmanager
+from src.core.database import get_embeddings
+from src.core.embedding_cache import normalize_query
+
+_current_query = contextvars.ContextVar("current_query_embedding", default=None)
+
+
+class QueryEmbedding:
+    """
+    Embedding de la consulta del usuario, calculado como máximo una vez por turno.
+
+    Lo comparten el guardrail semántico, el router de chitchat y la primera búsqueda
+    vectorial cuando consultan exactamente el mismo texto.
+    """
+
+    def __init__(self, text: str, embeddings=None):
+        self.text = text
+        self.key = normalize_query(text)
+        self._embeddings = embeddings
+        self._vector = None
+        self._lock = threading.Lock()
+
+    def _client(self):
+        return self._embeddings or get_embeddings()
+
+    @property
+    def vector(self) -> list[float]:
+        if self._vector is None:
+            with self._lock:
+                if self._vector is None:
+                    self._vector = self._client().embed_query(self.text)
+        return self._vector
+
+    async def avector(self) -> list[float]:
+        if self._vector is None:
+            self._vector = await self._client().aembed_query(self.text)
+        return self._vector
+
+    def matches(self, text: str) -> bool:
+        return normalize_query(text) == self.key
+
+
+@contextmanager
+def query_turn(text: str, embeddings=None):
+    """Declara la consulta del turno actual; las funciones llamadas dentro pueden reutilizar su embedding."""
+    turn = QueryEmbedding(text, embeddings)
+    token = _current_query.set(turn)
+    try:
+        yield turn
+    finally:
+        _current_query.reset(token)
+
+
+def current_query_embedding():
+    """Retorna el QueryEmbedding del turno actual o None."""
+    return _current_query.get()
+
+
+def embed_query(text: str) -> list[float]:
+    """Embedding de `text`, reutilizando el del turno si es la misma consulta."""
+    turn = current_query_embedding()
+    if turn is not None and turn.matches(text):
+        return turn.vector
+    return get_embeddings().embed_query(text)
+
+
+async def aembed_query(text: str) -> list[float]:
+    """Versión asíncrona de embed_query."""
+    turn = current_query_embedding()
+    if turn is not None and turn.matches(text):
+        return await turn.avector()
+    return await get_embeddings().aembed_query(text)
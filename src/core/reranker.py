@@ -0,0 +1,144 @@
+import asyncio
+import os
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from src.core.lexical import tokenize, bm25_scores, min_max
+from src.core.resources import registry, get_llm
+
+# Estrategia por defecto: "lexical" (CPU, sin red), "cross-encoder" o "llm"
+DEFAULT_RERANKER = os.getenv("RERANKER", "lexical")
+CROSS_ENCODER_MODEL = os.getenv("RERANKER_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+
+RERANK_TEMPLATE = """
+    Como experto en seguros, evalúa la relevancia de los siguientes fragmentos para responder a la pregunta: "{question}"
+
+    Devuelve ÚNICAMENTE los índices de los 5 fragmentos más útiles, separados por comas (ej: 0,3,4,1,2).
+
+    Fragmentos:
+    {fragments}
+    """
+
+
+class Reranker(ABC):
+    """
+    Reordena los candidatos de una búsqueda vectorial y retorna los top_n más útiles.
+
+    `scores` son las relevancias de la búsqueda vectorial (mayor = más similar), en el
+    mismo orden que `docs`; las estrategias que no las usan pueden ignorarlas.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def rerank(self, query: str, docs: list, scores: list[float] = None, top_n: int = 5) -> list:
+        ...
+
+    async def arerank(self, query: str, docs: list, scores: list[float] = None, top_n: int = 5) -> list:
+        return self.rerank(query, docs, scores, top_n)
+
+
+class LexicalReranker(Reranker):
+    """
+    BM25 sobre los candidatos combinado con el score vectorial de Chroma.
+
+    Ambos puntajes se escalan a [0, 1] y se mezclan con `vector_weight`. Corre en
+    microsegundos para 15 fragmentos, sin llamadas de red.
+    """
+
+    name = "lexical"
+
+    def __init__(self, vector_weight: float = 0.5):
+        self.vector_weight = vector_weight
+
+    def rerank(self, query, docs, scores=None, top_n=5):
+        if not docs:
+            return []
+        lexical = min_max(bm25_scores(tokenize(query), [tokenize(d.page_content) for d in docs]))
+        if scores is None:
+            # Sin scores: se asume que el orden de llegada ya es el vectorial
+            scores = np.linspace(1.0, 0.0, num=len(docs))
+        combined = self.vector_weight * min_max(scores) + (1 - self.vector_weight) * lexical
+        # Orden estable: ante empate se respeta el orden vectorial
+        order = np.argsort(-combined, kind="stable")
+        return [docs[i] for i in order[:top_n]]
+
+
+class CrossEncoderReranker(Reranker):
+    """Cross-encoder local (sentence-transformers). Requiere el paquete instalado."""
+
+    name = "cross-encoder"
+
+    def __init__(self, model_name: str = CROSS_ENCODER_MODEL):
+        from sentence_transformers import CrossEncoder
+        self.model = CrossEncoder(model_name)
+
+    def rerank(self, query, docs, scores=None, top_n=5):
+        if not docs:
+            return []
+        pair_scores = self.model.predict([(query, d.page_content) for d in docs])
+        order = np.argsort(-np.asarray(pair_scores), kind="stable")
+        return [docs[i] for i in order[:top_n]]
+
+    async def arerank(self, query, docs, scores=None, top_n=5):
+        # Inferencia en CPU: fuera del event loop
+        return await asyncio.to_thread(self.rerank, query, docs, scores, top_n)
+
+
+class LLMReranker(Reranker):
+    """Reranking con una llamada al LLM que devuelve los índices elegidos (estrategia original)."""
+
+    name = "llm"
+
+    def __init__(self, model: str = "gpt-4o-mini"):
+        self.model = model
+
+    @staticmethod
+    def _prompt(query, docs):
+        fragments_str = "\n".join([f"[{i}] {d.page_content[:200]}..." for i, d in enumerate(docs)])
+        return RERANK_TEMPLATE.format(question=query, fragments=fragments_str)
+
+    @staticmethod
+    def _parse(response, docs, top_n):
+        """Convierte la respuesta del LLM ('0,3,4,...') en la lista de documentos elegidos."""
+        indices = [int(i.strip()) for i in response.split(",") if i.strip().isdigit()]
+        reranked = [docs[i] for i in indices if i < len(docs)][:top_n]
+        return reranked or docs[:top_n]
+
+    def rerank(self, query, docs, scores=None, top_n=5):
+        try:
+            response = get_llm(self.model, temperature=0).invoke(self._prompt(query, docs)).content
+            return self._parse(response, docs, top_n)
+        except Exception:
+            return docs[:top_n]
+
+    async def arerank(self, query, docs, scores=None, top_n=5):
+        try:
+            response = (await get_llm(self.model, temperature=0).ainvoke(self._prompt(query, docs))).content
+            return self._parse(response, docs, top_n)
+        except Exception:
+            return docs[:top_n]
+
+
+RERANKERS = {
+    "lexical": LexicalReranker,
+    "cross-encoder": CrossEncoderReranker,
+    "llm": LLMReranker,
+}
+
+
+def _create_reranker(name: str) -> Reranker:
+    if name not in RERANKERS:
+        raise ValueError(f"Reranker desconocido '{name}'. Opciones: {', '.join(RERANKERS)}")
+    try:
+        return RERANKERS[name]()
+    except ImportError as e:
+        print(f"⚠️  Reranker '{name}' no disponible ({e}); se usa 'lexical'.")
+        return LexicalReranker()
+
+
+def get_reranker(name: str = None) -> Reranker:
+    """Reranker compartido por el proceso (por defecto el de la variable RERANKER)."""
+    name = name or DEFAULT_RERANKER
+    return registry.get(f"reranker:{name}", lambda: _create_reranker(name))
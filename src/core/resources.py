@@ -0,0 +1,51 @@
+import threading
+from langchain_openai import ChatOpenAI
+
+DEFAULT_CHAT_MODEL = "gpt-4o-mini"
+
+
+class ResourceRegistry:
+    """
+    Registro de recursos compartidos por proceso (clientes LLM, embeddings, vectorstore, agente).
+
+    Cada recurso se crea una sola vez, de forma perezosa y thread-safe, y se reutiliza en
+    todas las peticiones para mantener calientes los pools de conexiones HTTP.
+    """
+
+    def __init__(self):
+        self._resources = {}
+        # RLock: una fábrica puede pedir otros recursos del registro (p. ej. el agente pide el LLM)
+        self._lock = threading.RLock()
+
+    def get(self, name: str, factory):
+        """Retorna el recurso `name`, creándolo con `factory()` la primera vez."""
+        resource = self._resources.get(name)
+        if resource is None:
+            with self._lock:
+                resource = self._resources.get(name)
+                if resource is None:
+                    resource = factory()
+                    self._resources[name] = resource
+        return resource
+
+    def reset(self, *names: str):
+        """Descarta los recursos indicados (o todos) para que se recreen en el próximo uso."""
+        with self._lock:
+            if not names:
+                self._resources.clear()
+            for name in names:
+                self._resources.pop(name, None)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._resources
+
+
+registry = ResourceRegistry()
+
+
+def get_llm(model: str = DEFAULT_CHAT_MODEL, temperature: float = 0):
+    """Cliente ChatOpenAI compartido por modelo y temperatura."""
+    return registry.get(
+        f"llm:{model}:{temperature}",
+        lambda: ChatOpenAI(model=model, temperature=temperature)
+    )
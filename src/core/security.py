@@ -1,8 +1,8 @@
 import random
-import numpy as np
 import os
-import pickle
-from langchain_openai import OpenAIEmbeddings
+from src.core.database import get_embeddings, EMBEDDING_MODEL, EMBEDDING_DIMENSIONS
+from src.core.exemplars import ExemplarIndex
+from src.core.query_context import embed_query
 
 # Palabras prohibidas en el INPUT del usuario
 palabras_in = [
@@ -78,69 +78,48 @@ def check_output(response: str) -> tuple[bool, str]:
 
 
 class SemanticSecurity:
-    def __init__(self, threshold: float = 0.82, cache_file: str = "security_embeddings.pkl"):
+    def __init__(self, threshold: float = 0.82, cache_file: str = "security_embeddings.npy"):
         """
         Inicializa el filtro de seguridad semántica con caché.
         Args:
             threshold: Umbral de similitud (0 a 1). Si es mayor, se considera una amenaza.
-            cache_file: Nombre del archivo para almacenar los embeddings en caché.
+            cache_file: Nombre del archivo .npy con la matriz de embeddings normalizados.
         """
-        self.embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
+        self.embeddings = get_embeddings()
         self.threshold = threshold
         self.cache_path = os.path.join(os.path.dirname(__file__), cache_file)
         
         self.threat_text_list = palabras_in + semantic_phrases
 
-        self.forbidden_vectors = self._load_or_generate_embeddings()
+        self.index = self._load_or_generate_embeddings()
 
     def _embed_list(self, texts: list[str]) -> list[list[float]]:
         if not texts:
             return []
         return self.embeddings.embed_documents(texts)
 
-    def _load_or_generate_embeddings(self) -> list[list[float]]:
-        """Intenta cargar embeddings desde disco, si no existen, los genera y guarda."""
-        if os.path.exists(self.cache_path):
-            try:
-                with open(self.cache_path, "rb") as f:
-                    return pickle.load(f)
-            except Exception as e:
-                print(f"Error cargando cache de seguridad: {e}")
-        
-        print("Generando nuevos embeddings de seguridad...")
-        vectors = self._embed_list(self.threat_text_list)
-        
-        try:
-            with open(self.cache_path, "wb") as f:
-                pickle.dump(vectors, f)
-        except Exception as e:
-            print(f"No se pudo guardar cache de seguridad: {e}")
-            
-        return vectors
-
-    def check_semantic_similarity(self, text: str) -> tuple[bool, str, float]:
+    def _load_or_generate_embeddings(self) -> ExemplarIndex:
+        """Carga la matriz de amenazas desde disco (mmap); si no existe, la genera y guarda."""
+        return ExemplarIndex.load_or_build(
+            self.cache_path, self.threat_text_list, self.threat_text_list, self._embed_list,
+            model=EMBEDDING_MODEL, dimensions=EMBEDDING_DIMENSIONS
+        )
+
+    def top_matches(self, text: str, k: int = 3, query_vector=None) -> list[tuple[str, float]]:
+        """Retorna las k amenazas más similares al texto como (frase, score)."""
+        if query_vector is None:
+            query_vector = embed_query(text)
+        return [(phrase, score) for phrase, _, score in self.index.top_k(query_vector, k)]
+
+    def check_semantic_similarity(self, text: str, query_vector=None) -> tuple[bool, str, float]:
         """
         Verifica si el texto es semánticamente similar a alguna amenaza conocida.
+        Si se pasa query_vector (embedding del turno), no se vuelve a calcular.
         Returns: (is_blocked, frase_detectada, score)
         """
-        text_vector = self.embeddings.embed_query(text)
-        
-        vec_a = np.array(text_vector)
-        norm_a = np.linalg.norm(vec_a)
-        if norm_a == 0:
-            return False, "", 0.0
-            
-        for i, forbidden_vec in enumerate(self.forbidden_vectors):
-            vec_b = np.array(forbidden_vec)
-            norm_b = np.linalg.norm(vec_b)
-            
-            if norm_b == 0:
-                continue
-                
-            cosine_sim = np.dot(vec_a, vec_b) / (norm_a * norm_b)
-            
-            if cosine_sim > self.threshold:
-                detected_term = self.threat_text_list[i]
-                return True, detected_term, float(cosine_sim)
+        matches = self.top_matches(text, k=1, query_vector=query_vector)
+        if matches and matches[0][1] > self.threshold:
+            detected_term, score = matches[0]
+            return True, detected_term, score
                 
         return False, "", 0.0
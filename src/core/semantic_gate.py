@@ -0,0 +1,62 @@
+from dataclasses import dataclass
+from src.core.exemplars import ExemplarIndex
+from src.core.security import SemanticSecurity
+from src.core.chitchat import SemanticRouter
+
+THREAT_PREFIX = "threat:"
+INTENT_PREFIX = "intent:"
+
+
+@dataclass
+class GateDecision:
+    """Resultado del filtro semántico de un mensaje."""
+    is_blocked: bool = False
+    threat_phrase: str = ""
+    threat_score: float = 0.0
+    intent: str | None = None
+    intent_score: float = 0.0
+
+
+class SemanticGate:
+    """
+    Guardrail de seguridad + router de chitchat sobre un índice combinado de ejemplos.
+
+    Con el embedding del turno se calculan ambos resultados en un único producto
+    matriz-vector, en lugar de un embedding y un scoring por componente.
+    """
+
+    def __init__(self, security: SemanticSecurity = None, router: SemanticRouter = None):
+        self.security = security or SemanticSecurity()
+        self.router = router or SemanticRouter()
+        self.index = ExemplarIndex.concat(
+            [self.security.index, self.router.index],
+            prefixes=[THREAT_PREFIX, INTENT_PREFIX]
+        )
+        self._n_threats = len(self.security.index.texts)
+
+    def evaluate(self, query_vector) -> GateDecision:
+        """Evalúa el embedding de la consulta contra amenazas e intenciones a la vez."""
+        scores = self.index.scores(query_vector)
+        decision = GateDecision()
+        if scores.size == 0:
+            return decision
+
+        threat_scores = scores[:self._n_threats]
+        if threat_scores.size:
+            best = int(threat_scores.argmax())
+            if threat_scores[best] > self.security.threshold:
+                decision.is_blocked = True
+                decision.threat_phrase = self.index.texts[best]
+                decision.threat_score = float(threat_scores[best])
+                return decision
+
+        intent_scores = scores[self._n_threats:]
+        if intent_scores.size:
+            best = int(intent_scores.argmax())
+            if intent_scores[best] >= self.router.threshold:
+                decision.intent = self.index.labels[self._n_threats + best].removeprefix(INTENT_PREFIX)
+                decision.intent_score = float(intent_scores[best])
+        return decision
+
+    def get_response(self, intent: str) -> str:
+        return self.router.get_response(intent)
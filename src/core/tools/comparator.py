@@ -1,44 +1,26 @@
-from langchain.tools import tool
+import json
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.tools import StructuredTool
 from pydantic import BaseModel, Field
-from typing import List, Optional
-from langchain_openai import ChatOpenAI
+from typing import List
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
-from src.core.database import get_vectorstore
-import json
-
-
-class ComparisonInput(BaseModel):
-    feature: str = Field(description="La característica a comparar (ej: 'Cobertura de robo', 'Deducible').")
-    insurers: List[str] = Field(description="Lista de aseguradoras a comparar (ej: ['RIMAC', 'MAPFRE']).")
-
-
-@tool("compare_policies", args_schema=ComparisonInput)
-def compare_policies(feature: str, insurers: List[str]):
-    """
-    Compara una característica específica entre varias aseguradoras.
-    Devuelve un JSON con la comparación detallada.
-    """
-    vectorstore = get_vectorstore()
-    results = {}
-
-    # 1. Búsqueda por cada aseguradora
-    for insurer in insurers:
-        insurer_key = insurer.upper()
+from src.core.database import get_vectorstore, get_index_generation, COVERAGE_FACTS_PATH
+from src.core.resources import registry, get_llm
+from src.core.query_context import embed_query, aembed_query
+from src.core.comparison_cache import ComparisonCache
+from src.core.lexical import strip_accents
+from src.core.coverage_facts import CoverageFacts
+from src.core.tools.rag_tool import (emit_sources, search_with_scores, asearch_with_scores,
+                                     lexical_search, alexical_search, fuse_rankings)
 
-        docs = vectorstore.similarity_search(
-            feature,
-            k=5,
-            filter={"insurer": insurer_key}
-        )
+# Fragmentos por aseguradora (vectorial y BM25 antes de fusionar, y tras la fusión)
+COMPARE_K = 5
+# Hilos para las búsquedas por aseguradora en la versión síncrona
+SEARCH_WORKERS = 8
 
-        context = "\n".join([d.page_content for d in docs])
-        results[insurer_key] = context
-
-    # 2. Generación del comparativo con LLM
-    llm = ChatOpenAI(model_name="gpt-4o-mini", temperature=0)
-
-    prompt_template = """
+COMPARISON_TEMPLATE = """
     Eres un experto en seguros. Tu tarea es extraer y comparar la característica '{feature}' para las siguientes aseguradoras basándote en su contexto.
 
     {context_json}
@@ -60,16 +42,258 @@ def compare_policies(feature: str, insurers: List[str]):
     Si no encuentras información para una aseguradora, pon "No especificado" en value.
     """
 
-    # Preparar contexto para el prompt
+
+class ComparisonInput(BaseModel):
+    feature: str = Field(description="La característica a comparar (ej: 'Cobertura de robo', 'Deducible').")
+    insurers: List[str] = Field(description="Lista de aseguradoras a comparar (ej: ['RIMAC', 'MAPFRE']).")
+
+
+def _comparison_chain():
+    llm = get_llm("gpt-4o-mini", temperature=0)
+    prompt = PromptTemplate(template=COMPARISON_TEMPLATE, input_variables=["feature", "context_json"])
+    return prompt | llm | JsonOutputParser()
+
+
+def _context_str(results: dict) -> str:
+    """Prepara el contexto por aseguradora para el prompt."""
     context_str = ""
     for ins, txt in results.items():
         context_str += f"--- CONTEXTO {ins} ---\n{txt}\n\n"
+    return context_str
+
+
+def _insurer_docs(vectorstore, feature, query_vector, insurer_key):
+    """Fragmentos de una aseguradora: búsqueda vectorial + BM25 fusionadas por RRF."""
+    insurer_filter = {"insurer": insurer_key}
+    vector_docs, _ = search_with_scores(vectorstore, query_vector, k=COMPARE_K, filter=insurer_filter)
+    lexical_docs = lexical_search(feature, k=COMPARE_K, filter=insurer_filter)
+    docs, _ = fuse_rankings(vector_docs, lexical_docs, limit=COMPARE_K)
+    return docs
+
+
+async def _ainsurer_docs(vectorstore, feature, query_vector, insurer_key):
+    """Versión asíncrona de _insurer_docs (ambas búsquedas en paralelo)."""
+    insurer_filter = {"insurer": insurer_key}
+    (vector_docs, _), lexical_docs = await asyncio.gather(
+        asearch_with_scores(vectorstore, query_vector, k=COMPARE_K, filter=insurer_filter),
+        alexical_search(feature, k=COMPARE_K, filter=insurer_filter),
+    )
+    docs, _ = fuse_rankings(vector_docs, lexical_docs, limit=COMPARE_K)
+    return docs
+
 
-    prompt = PromptTemplate(template=prompt_template, input_variables=["feature", "context_json"])
-    chain = prompt | llm | JsonOutputParser()
+def _search_pool() -> ThreadPoolExecutor:
+    return registry.get("compare_search_pool", lambda: ThreadPoolExecutor(
+        max_workers=SEARCH_WORKERS, thread_name_prefix="compare-search"
+    ))
 
+
+def insurer_keys(insurers: List[str]) -> List[str]:
+    """Nombres de aseguradora normalizados como en la metadata ('rimac' -> 'RIMAC'), sin duplicados."""
+    return list(dict.fromkeys(insurer.strip().upper() for insurer in insurers if insurer.strip()))
+
+
+def retrieve_by_insurer(feature: str, keys: List[str]) -> dict:
+    """
+    Fragmentos de cada aseguradora para la característica.
+
+    La característica se embebe una sola vez y las búsquedas por aseguradora corren en
+    paralelo por vector (un único query con filtro $in no garantiza k fragmentos por aseguradora).
+    """
+    vectorstore = get_vectorstore()
+    query_vector = embed_query(feature)
+    futures = [
+        _search_pool().submit(_insurer_docs, vectorstore, feature, query_vector, insurer_key)
+        for insurer_key in keys
+    ]
+    return {insurer_key: future.result() for insurer_key, future in zip(keys, futures)}
+
+
+async def aretrieve_by_insurer(feature: str, keys: List[str]) -> dict:
+    """Versión asíncrona de retrieve_by_insurer."""
+    vectorstore = get_vectorstore()
+    query_vector = await aembed_query(feature)
+    all_docs = await asyncio.gather(*(
+        _ainsurer_docs(vectorstore, feature, query_vector, insurer_key)
+        for insurer_key in keys
+    ))
+    return dict(zip(keys, all_docs))
+
+
+def _contexts(docs_by_insurer: dict) -> dict:
+    return {insurer_key: "\n".join([d.page_content for d in docs])
+            for insurer_key, docs in docs_by_insurer.items()}
+
+
+def get_comparison_cache() -> ComparisonCache:
+    """Caché de extracciones por aseguradora de compare_policies (una por proceso)."""
+    return registry.get("comparison_cache", ComparisonCache)
+
+
+def _match_entries(output, keys: List[str]) -> dict:
+    """
+    Asocia cada elemento de output['comparison'] con su aseguradora ({aseguradora: entrada}).
+
+    Si el LLM escribió el nombre de otra forma ('Rímac Seguros') se busca por inclusión, sin
+    tildes. Una entrada cuyo nombre no corresponde a ninguna aseguradora se descarta (no se
+    asigna por posición): esas aseguradoras quedan como 'No especificado' y no se cachean.
+    """
+    comparison = output.get("comparison") if isinstance(output, dict) else None
+    if not isinstance(comparison, list):
+        return {}
+    matched = {}
+    for entry in comparison:
+        if not isinstance(entry, dict):
+            continue
+        name = strip_accents(str(entry.get("insurer", ""))).upper()
+        for insurer_key in keys:
+            key = strip_accents(insurer_key)
+            if insurer_key not in matched and (name == key or key in name):
+                matched[insurer_key] = entry
+                break
+    return matched
+
+
+def _assemble(feature: str, keys: List[str], entries: dict) -> dict:
+    """Comparativo final en el orden pedido, con 'No especificado' si falta alguna aseguradora."""
+    return {
+        "feature": feature,
+        "comparison": [
+            entries.get(insurer_key) or {"insurer": insurer_key, "value": "No especificado",
+                                         "details": "", "source": ""}
+            for insurer_key in keys
+        ],
+    }
+
+
+def get_coverage_facts() -> CoverageFacts:
+    """Matriz precalculada característica × aseguradora (una conexión por proceso)."""
+    return registry.get("coverage_facts", lambda: CoverageFacts(COVERAGE_FACTS_PATH))
+
+
+def known_entries(feature: str, keys: List[str], generation: int) -> tuple[dict, dict]:
+    """
+    Extracciones ya disponibles sin búsquedas ni LLM.
+
+    Returns:
+        ({aseguradora: entrada}, {aseguradora: origen}) con origen 'precomputed' (matriz
+        offline) o 'cache' (comparativos recientes).
+    """
+    entries = get_coverage_facts().lookup(feature, keys, generation)
+    origins = {insurer_key: "precomputed" for insurer_key in entries}
+    pending = [insurer_key for insurer_key in keys if insurer_key not in entries]
+    if pending:
+        cached = get_comparison_cache().get_many(feature, pending, generation)
+        entries.update(cached)
+        origins.update({insurer_key: "cache" for insurer_key in cached})
+    return entries, origins
+
+
+def extract_entries(feature: str, keys: List[str]) -> tuple[dict, object]:
+    """
+    Extracción en vivo: búsqueda por aseguradora + comparativo con LLM.
+
+    Returns:
+        ({aseguradora: entrada}, salida cruda del LLM).
+    """
+    results = _contexts(retrieve_by_insurer(feature, keys))
+    output = _comparison_chain().invoke({"feature": feature, "context_json": _context_str(results)})
+    return _match_entries(output, keys), output
+
+
+async def aextract_entries(feature: str, keys: List[str]) -> tuple[dict, object]:
+    """Versión asíncrona de extract_entries (publica las fuentes recuperadas)."""
+    docs_by_insurer = await aretrieve_by_insurer(feature, keys)
+    await emit_sources("compare_policies", [d for docs in docs_by_insurer.values() for d in docs])
+    results = _contexts(docs_by_insurer)
+    output = await _comparison_chain().ainvoke({"feature": feature, "context_json": _context_str(results)})
+    return _match_entries(output, keys), output
+
+
+def _tool_output(result: dict):
+    """(contenido para el LLM, dict para quien consume el resultado) — response_format content_and_artifact."""
+    return json.dumps(result, ensure_ascii=False), result
+
+
+def _compare(feature: str, insurers: List[str]) -> dict:
+    """Comparativo síncrono como dict (ver acompare para la versión asíncrona con orígenes)."""
+    keys = insurer_keys(insurers)
+    generation = get_index_generation()
+
+    # 0. Matriz precalculada y comparativos recientes
+    entries, _ = known_entries(feature, keys, generation)
+    missing = [insurer_key for insurer_key in keys if insurer_key not in entries]
+    if not missing:
+        return _assemble(feature, keys, entries)
+
+    # 1-2. Búsqueda y extracción con LLM solo de las aseguradoras faltantes
+    try:
+        computed, _ = extract_entries(feature, missing)
+    except Exception as e:
+        if not entries:
+            return {"error": str(e)}
+        # Se sirve lo ya conocido; las faltantes quedan como 'No especificado'
+        print(f"⚠️  Extracción en vivo fallida para {missing}: {e}")
+        computed = {}
+
+    if computed:
+        get_comparison_cache().put_many(feature, computed, generation)
+    return _assemble(feature, keys, {**entries, **computed})
+
+
+async def acompare(feature: str, insurers: List[str]) -> tuple[dict, dict]:
+    """
+    Comparativo con el origen de cada aseguradora ('precomputed', 'cache' o 'live').
+
+    Returns:
+        (resultado, {aseguradora: origen}); las aseguradoras sin extracción quedan como
+        'No especificado' y sin origen. Si falla la extracción y no hay nada conocido,
+        ({'error': ...}, {}).
+    """
+    keys = insurer_keys(insurers)
+    generation = get_index_generation()
+
+    # 0. Matriz precalculada y comparativos recientes
+    entries, origins = known_entries(feature, keys, generation)
+    missing = [insurer_key for insurer_key in keys if insurer_key not in entries]
+    if not missing:
+        return _assemble(feature, keys, entries), origins
+
+    # 1-2. Búsqueda y extracción con LLM solo de las aseguradoras faltantes
     try:
-        response = chain.invoke({"feature": feature, "context_json": context_str})
-        return response
+        computed, _ = await aextract_entries(feature, missing)
     except Exception as e:
-        return {"error": str(e)}
+        if not entries:
+            return {"error": str(e)}, {}
+        # Se sirve lo ya conocido; las faltantes quedan como 'No especificado'
+        print(f"⚠️  Extracción en vivo fallida para {missing}: {e}")
+        computed = {}
+
+    if computed:
+        get_comparison_cache().put_many(feature, computed, generation)
+        origins.update({insurer_key: "live" for insurer_key in computed})
+    return _assemble(feature, keys, {**entries, **computed}), origins
+
+
+def _compare_policies(feature: str, insurers: List[str]):
+    """
+    Compara una característica específica entre varias aseguradoras.
+    Devuelve un JSON con la comparación detallada.
+    """
+    return _tool_output(_compare(feature, insurers))
+
+
+async def _acompare_policies(feature: str, insurers: List[str]):
+    """Versión asíncrona de compare_policies: las búsquedas por aseguradora se lanzan en paralelo."""
+    result, _ = await acompare(feature, insurers)
+    return _tool_output(result)
+
+
+compare_policies = StructuredTool.from_function(
+    func=_compare_policies,
+    coroutine=_acompare_policies,
+    name="compare_policies",
+    args_schema=ComparisonInput,
+    # El dict completo queda en ToolMessage.artifact (ver agent.structured_output)
+    response_format="content_and_artifact",
+)
@@ -1,9 +1,50 @@
-from langchain.tools import tool
-from langchain_openai import ChatOpenAI
+import os
+import asyncio
+import sqlite3
+from langchain_core.tools import StructuredTool
+from langchain_core.callbacks import adispatch_custom_event
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
-from src.core.database import get_vectorstore
+from src.core.database import get_vectorstore, get_lexical_index, get_index_generation
+from src.core.resources import registry, get_llm
+from src.core.answer_cache import SemanticAnswerCache, append_query_log, load_query_log
+from src.core.query_context import embed_query, aembed_query
+from src.core.reranker import get_reranker
+
+INITIAL_K = 10      # candidatos vectoriales
+LEXICAL_K = 10      # candidatos BM25 (se fusionan con los vectoriales por RRF)
+TOP_N = 5
+RRF_K = 60          # constante de Reciprocal Rank Fusion
+
+# Profundidad adaptativa de recuperación
+FAST_N = 3          # fragmentos usados cuando los primeros resultados son claramente mejores
+WIDE_K = 30         # candidatos cuando los scores son planos (consulta ambigua)
+# Ventaja mínima del score medio de los FAST_N primeros sobre el resto para omitir el reranking
+CONFIDENT_MARGIN = float(os.getenv("RETRIEVAL_MARGIN", 0.08))
+# Diferencia máxima entre el primer y el último candidato para considerar los scores planos
+FLAT_SPREAD = float(os.getenv("RETRIEVAL_FLAT_SPREAD", 0.03))
+
+NO_RESULTS_MESSAGE = "No se ha encontrado información relevante sobre tu consulta en la documentación disponible."
+
+ANSWER_TEMPLATE = """Eres un asistente experto en seguros. Genera una respuesta estructurada basándote ÚNICAMENTE en el contexto proporcionado.
+
+    Usa el siguiente formato Markdown para tu respuesta:
+
+    ### 📋 Resumen
+    (Una síntesis directa de la respuesta en 2-4 frases)
+
+    ### 📝 Detalles
+    (Explicación completa utilizando viñetas para coberturas, condiciones o exclusiones)
+
+    ### 📂 Fuentes Referenciadas
+    (Lista explícita de los documentos y páginas citados, ej: 'Rimac Vehicular (Pág 12)')
+
+    ---
+    Contexto:
+    {context}
+
+    Pregunta: {question}
+    """
 
 
 def format_docs(docs):
@@ -15,66 +56,272 @@ def format_docs(docs):
     return "\n\n".join(formatted)
 
 
-@tool("consult_policy")
-def consult_policy(query: str):
+def doc_sources(docs):
+    """Referencias (aseguradora, documento, página) de los fragmentos recuperados."""
+    return [
+        {
+            "insurer": doc.metadata.get("insurer"),
+            "source": doc.metadata.get("source"),
+            "page": doc.metadata.get("page"),
+        }
+        for doc in docs
+    ]
+
+
+async def emit_sources(tool_name, docs=None, sources=None):
     """
-    Responde consultas generales sobre pólizas de seguros buscando en toda la base de conocimiento.
-    Úsalo para preguntas como '¿Qué es el deducible?', '¿Cubre daños por lluvia?', etc.
+    Publica las fuentes recuperadas como evento 'sources' (visible en astream_events).
+
+    Acepta los documentos o, si ya se tienen (p. ej. desde una caché), sus referencias.
     """
-    vectorstore = get_vectorstore()
-    
-    # 1. Recuperación inicial
-    initial_docs = vectorstore.similarity_search(query, k=15)
-    
-    if not initial_docs:
-        return "No se ha encontrado información relevante sobre tu consulta en la documentación disponible."
-    
-    # 2. Reranking Estrategia
-    llm = ChatOpenAI(model_name="gpt-4o-mini", temperature=0)
-    
-    rerank_template = """
-    Como experto en seguros, evalúa la relevancia de los siguientes fragmentos para responder a la pregunta: "{question}"
-    
-    Devuelve ÚNICAMENTE los índices de los 5 fragmentos más útiles, separados por comas (ej: 0,3,4,1,2).
-    
-    Fragmentos:
-    {fragments}
+    if sources is None:
+        sources = doc_sources(docs)
+    try:
+        await adispatch_custom_event("sources", {"tool": tool_name, "sources": sources})
+    except RuntimeError:
+        # Invocación fuera de un runnable (sin run padre): no hay a quién notificar
+        pass
+
+
+def search_with_scores(vectorstore, query_vector, k, filter=None):
+    """
+    Búsqueda vectorial que retorna (docs, relevancias), con relevancia mayor = más similar.
+
+    Chroma devuelve distancias; se convierten con la función de relevancia de la colección.
     """
-    
-    fragments_str = "\n".join([f"[{i}] {d.page_content[:200]}..." for i, d in enumerate(initial_docs)])
-    rerank_prompt = rerank_template.format(question=query, fragments=fragments_str)
-    
+    results = vectorstore.similarity_search_by_vector_with_relevance_scores(query_vector, k=k, filter=filter)
     try:
-        rerank_response = llm.invoke(rerank_prompt).content
-        indices = [int(i.strip()) for i in rerank_response.split(",") if i.strip().isdigit()]
-        reranked_docs = [initial_docs[i] for i in indices if i < len(initial_docs)][:5]
-    except:
-        reranked_docs = initial_docs[:5]
+        to_relevance = vectorstore._select_relevance_score_fn()
+    except ValueError:
+        to_relevance = lambda distance: -distance
+    return [doc for doc, _ in results], [to_relevance(distance) for _, distance in results]
 
-    template = """Eres un asistente experto en seguros. Genera una respuesta estructurada basándote ÚNICAMENTE en el contexto proporcionado.
 
-    Usa el siguiente formato Markdown para tu respuesta:
+async def asearch_with_scores(vectorstore, query_vector, k, filter=None):
+    """Versión asíncrona de search_with_scores (la consulta a Chroma corre en un hilo)."""
+    return await asyncio.to_thread(search_with_scores, vectorstore, query_vector, k, filter)
 
-    ### 📋 Resumen
-    (Una síntesis directa de la respuesta en 2-4 frases)
 
-    ### 📝 Detalles
-    (Explicación completa utilizando viñetas para coberturas, condiciones o exclusiones)
+def lexical_search(query, k, filter=None):
+    """Fragmentos con mejor BM25 (lista vacía si el índice léxico no está disponible)."""
+    try:
+        return [doc for doc, _ in get_lexical_index().search(query, k=k, filter=filter)]
+    except sqlite3.Error as e:
+        print(f"⚠️  Índice léxico no disponible: {e}")
+        return []
 
-    ### 📂 Fuentes Referenciadas
-    (Lista explícita de los documentos y páginas citados, ej: 'Rimac Vehicular (Pág 12)')
 
-    ---
-    Contexto:
-    {context}
+async def alexical_search(query, k, filter=None):
+    """Versión asíncrona de lexical_search."""
+    return await asyncio.to_thread(lexical_search, query, k, filter)
 
-    Pregunta: {question}
+
+def _doc_key(doc):
+    return doc.id or doc.page_content
+
+
+def vector_relevance(docs, vector_docs, vector_scores):
+    """Relevancia vectorial de cada fragmento de `docs` (0 si solo lo encontró BM25)."""
+    relevance = {_doc_key(doc): score for doc, score in zip(vector_docs, vector_scores)}
+    return [relevance.get(_doc_key(doc), 0.0) for doc in docs]
+
+
+def fuse_rankings(*rankings, limit=None):
     """
-    prompt = ChatPromptTemplate.from_template(template)
-
-    context_text = format_docs(reranked_docs)
-    
-    chain = prompt | llm | StrOutputParser()
-    result = chain.invoke({"context": context_text, "question": query})
-    
-    return result
+    Reciprocal Rank Fusion: combina varias listas ordenadas de fragmentos en una sola.
+
+    Cada fragmento suma 1 / (RRF_K + posición) por cada lista en la que aparece, así un
+    fragmento bien ubicado en la búsqueda vectorial y en BM25 sube al principio.
+
+    Returns:
+        (docs, scores) ordenados por score fusionado, sin duplicados.
+    """
+    fused, docs = {}, {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            key = _doc_key(doc)
+            fused[key] = fused.get(key, 0.0) + 1.0 / (RRF_K + rank + 1)
+            docs.setdefault(key, doc)
+    order = sorted(fused, key=fused.get, reverse=True)[:limit]
+    return [docs[key] for key in order], [fused[key] for key in order]
+
+
+def _answer_chain():
+    prompt = ChatPromptTemplate.from_template(ANSWER_TEMPLATE)
+    return prompt | get_llm("gpt-4o-mini", temperature=0) | StrOutputParser()
+
+
+def retrieval_path(scores) -> str:
+    """
+    Elige el camino de recuperación según la forma de los scores (ordenados de mayor a menor).
+
+    - "fast": los FAST_N primeros superan al resto por CONFIDENT_MARGIN; se usan sin reranking.
+    - "wide": scores planos; se amplía a WIDE_K candidatos y se rerankea.
+    - "rerank": caso general, reranking de los INITIAL_K candidatos.
+    """
+    if len(scores) > FAST_N:
+        head = sum(scores[:FAST_N]) / FAST_N
+        tail = sum(scores[FAST_N:]) / (len(scores) - FAST_N)
+        if head - tail >= CONFIDENT_MARGIN:
+            return "fast"
+    if len(scores) >= INITIAL_K and scores[0] - scores[-1] < FLAT_SPREAD:
+        return "wide"
+    return "rerank"
+
+
+def _retrieval_metadata(path, initial_scores, docs, k):
+    """Metadatos del camino tomado (artefacto de la herramienta, visible en el ToolMessage)."""
+    return {
+        "retrieval_path": path,
+        "k": k,
+        "top_score": initial_scores[0] if initial_scores else None,
+        "score_spread": initial_scores[0] - initial_scores[-1] if initial_scores else None,
+        "context_docs": len(docs),
+        "sources": doc_sources(docs),
+    }
+
+
+def get_answer_cache() -> SemanticAnswerCache:
+    """Caché semántica de respuestas de consult_policy (una por proceso)."""
+    return registry.get("answer_cache", SemanticAnswerCache)
+
+
+def _cached_answer(query_vector, generation):
+    """Respuesta cacheada para una consulta similar, con sus metadatos, o None."""
+    hit = get_answer_cache().lookup(query_vector, generation)
+    if hit is None:
+        return None
+    answer, metadata, cached_query, score = hit
+    return answer, {**metadata, "cache": "hit", "cached_query": cached_query, "cache_score": score}
+
+
+def _answer_policy(query: str):
+    """Recupera, rerankea y genera la respuesta de consult_policy (con caché semántica)."""
+    vectorstore = get_vectorstore()
+
+    # 1. Recuperación inicial (reutiliza el embedding del turno si es la misma consulta)
+    query_vector = embed_query(query)
+    generation = get_index_generation()
+    cached = _cached_answer(query_vector, generation)
+    if cached is not None:
+        return cached
+
+    initial_docs, initial_scores = search_with_scores(vectorstore, query_vector, k=INITIAL_K)
+
+    if not initial_docs:
+        return NO_RESULTS_MESSAGE, {"retrieval_path": "empty", "k": INITIAL_K}
+
+    # 2. Profundidad adaptativa: si los primeros resultados vectoriales son claramente mejores,
+    #    se usan tal cual (sin BM25 ni reranking)
+    path, k = retrieval_path(initial_scores), INITIAL_K
+    if path == "fast":
+        selected_docs = initial_docs[:FAST_N]
+    else:
+        vector_docs, vector_scores = initial_docs, initial_scores
+        if path == "wide":
+            k = WIDE_K
+            vector_docs, vector_scores = search_with_scores(vectorstore, query_vector, k=WIDE_K)
+
+        # 3. Fusión con BM25 (códigos de producto, artículos, nombres exactos) + reranking
+        #    (local por defecto; ver src/core/reranker.py) con la relevancia vectorial de cada fragmento
+        docs, _ = fuse_rankings(vector_docs, lexical_search(query, k=max(k, LEXICAL_K)))
+        scores = vector_relevance(docs, vector_docs, vector_scores)
+        selected_docs = get_reranker().rerank(query, docs, scores, top_n=TOP_N)
+
+    # 4. Generación
+    answer = _answer_chain().invoke({"context": format_docs(selected_docs), "question": query})
+    metadata = _retrieval_metadata(path, initial_scores, selected_docs, k)
+    get_answer_cache().store(query, query_vector, answer, metadata, generation)
+    return answer, {**metadata, "cache": "miss"}
+
+
+async def _aanswer_policy(query: str):
+    """Versión asíncrona de _answer_policy (no bloquea el event loop del servidor)."""
+    vectorstore = get_vectorstore()
+
+    # 1. Recuperación inicial (reutiliza el embedding del turno si es la misma consulta)
+    query_vector = await aembed_query(query)
+    generation = get_index_generation()
+    cached = _cached_answer(query_vector, generation)
+    if cached is not None:
+        await emit_sources("consult_policy", sources=cached[1]["sources"])
+        return cached
+
+    initial_docs, initial_scores = await asearch_with_scores(vectorstore, query_vector, k=INITIAL_K)
+
+    if not initial_docs:
+        return NO_RESULTS_MESSAGE, {"retrieval_path": "empty", "k": INITIAL_K}
+
+    # 2. Profundidad adaptativa: si los primeros resultados vectoriales son claramente mejores,
+    #    se usan tal cual (sin BM25 ni reranking)
+    path, k = retrieval_path(initial_scores), INITIAL_K
+    if path == "fast":
+        selected_docs = initial_docs[:FAST_N]
+    else:
+        if path == "wide":
+            k = WIDE_K
+            (vector_docs, vector_scores), lexical_docs = await asyncio.gather(
+                asearch_with_scores(vectorstore, query_vector, k=WIDE_K),
+                alexical_search(query, k=WIDE_K),
+            )
+        else:
+            vector_docs, vector_scores = initial_docs, initial_scores
+            lexical_docs = await alexical_search(query, k=LEXICAL_K)
+
+        # 3. Fusión con BM25 (códigos de producto, artículos, nombres exactos) + reranking
+        #    (local por defecto; ver src/core/reranker.py) con la relevancia vectorial de cada fragmento
+        docs, _ = fuse_rankings(vector_docs, lexical_docs)
+        scores = vector_relevance(docs, vector_docs, vector_scores)
+        selected_docs = await get_reranker().arerank(query, docs, scores, top_n=TOP_N)
+
+    await emit_sources("consult_policy", selected_docs)
+
+    # 4. Generación
+    answer = await _answer_chain().ainvoke({"context": format_docs(selected_docs), "question": query})
+    metadata = _retrieval_metadata(path, initial_scores, selected_docs, k)
+    get_answer_cache().store(query, query_vector, answer, metadata, generation)
+    return answer, {**metadata, "cache": "miss"}
+
+
+# Solo las consultas reales (las del agente) entran al registro; el pre-calentamiento no
+# las vuelve a registrar para que el registro siga reflejando el tráfico
+def _consult_policy(query: str):
+    """
+    Responde consultas generales sobre pólizas de seguros buscando en toda la base de conocimiento.
+    Úsalo para preguntas como '¿Qué es el deducible?', '¿Cubre daños por lluvia?', etc.
+    """
+    append_query_log(query)
+    return _answer_policy(query)
+
+
+async def _aconsult_policy(query: str):
+    """Versión asíncrona de consult_policy (no bloquea el event loop del servidor)."""
+    append_query_log(query)
+    return await _aanswer_policy(query)
+
+
+async def awarm_answer_cache(log_path: str, limit: int, concurrency: int = 4) -> int:
+    """
+    Pre-calienta la caché respondiendo las `limit` consultas más frecuentes del registro.
+
+    Returns:
+        Número de consultas respondidas sin error.
+    """
+    queries = load_query_log(log_path, limit)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def warm(query):
+        async with semaphore:
+            await _aanswer_policy(query)
+
+    results = await asyncio.gather(*(warm(q) for q in queries), return_exceptions=True)
+    return sum(1 for result in results if not isinstance(result, Exception))
+
+
+consult_policy = StructuredTool.from_function(
+    func=_consult_policy,
+    coroutine=_aconsult_policy,
+    name="consult_policy",
+    # La respuesta va al LLM; los metadatos de recuperación quedan en ToolMessage.artifact
+    response_format="content_and_artifact",
+)
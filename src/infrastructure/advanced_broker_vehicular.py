@@ -1,5 +1,13 @@
 import os
+import re
 import sys
+import json
+import time
+import shutil
+import hashlib
+from pathlib import Path
+
+import faiss
 from dotenv import load_dotenv
 
 # Importaciones de LangChain
@@ -11,6 +19,10 @@ from langchain_classic.chains import RetrievalQA
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+from src.core.resources import get_llm
+from src.infrastructure.intent_classifier import get_intent_classifier
+
 # --- 1. CONFIGURACIÓN ---
 load_dotenv()
 load_dotenv()
@@ -27,44 +39,135 @@ else:
 
 # --- 2. PREPARACIÓN DE LA BASE DE CONOCIMIENTO (RAG) ---
 # Esta parte es igual, carga los PDFs de seguros para cuando sea necesario comparar
-def preparar_rag():
-    # Define base path relative to this file or project root
-    # Assuming 'data' needs to be found relative to the project root
-    # We will try to locate the 'data' directory
-    current_dir = os.path.dirname(os.path.abspath(__file__)) # src/infrastructure
-    project_root = os.path.dirname(os.path.dirname(current_dir)) # underwriting_insurance
-    data_dir = os.path.join(project_root, "data")
-    
+CHUNK_SIZE = 1500
+CHUNK_OVERLAP = 200
+
+# El índice FAISS se guarda en <FAISS_INDEX_DIR>/<huella>/ y se reutiliza mientras la huella no cambie
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../'))
+FAISS_INDEX_DIR = os.getenv("BROKER_FAISS_DIR", os.path.join(PROJECT_ROOT, "data", "faiss_broker"))
+FAISS_INDEX_VERSION = 1
+
+
+def archivos_polizas(data_dir=None):
+    """PDFs del broker: las pólizas vehiculares de data/ o, si no están, los PDFs de data/<aseguradora>/."""
+    data_dir = data_dir or os.path.join(PROJECT_ROOT, "data")
     if not os.path.exists(data_dir):
-         # Fallback for docker or other structures if needed
-         data_dir = "data"
+        # Fallback for docker or other structures if needed
+        data_dir = "data"
 
-    archivos_polizas = [
+    archivos = [
         os.path.join(data_dir, "Interseguro Vehicular.pdf"),
         os.path.join(data_dir, "La Positiva Vehicular.pdf"),
         os.path.join(data_dir, "Mapfre Vehicular.pdf"),
         os.path.join(data_dir, "Pacifico Vehicular.pdf"),
         os.path.join(data_dir, "Rimac Vehicular.pdf"),
     ]
+    archivos = [archivo for archivo in archivos if os.path.exists(archivo)]
+    return archivos or [str(p) for p in sorted(Path(data_dir).glob("*/*.pdf"))]
+
+
+def huella_indice(archivos, embeddings):
+    """SHA-256 del contenido de los PDFs, la configuración del splitter y el modelo de embeddings."""
+    sha = hashlib.sha256()
+    config = {
+        "version": FAISS_INDEX_VERSION,
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "splitter": "RecursiveCharacterTextSplitter",
+        "embeddings": getattr(embeddings, "model", type(embeddings).__name__),
+    }
+    sha.update(json.dumps(config, sort_keys=True).encode())
+    for archivo in archivos:
+        sha.update(os.path.basename(archivo).encode())
+        with open(archivo, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha.update(block)
+    return sha.hexdigest()[:16]
+
+
+# Nombre de los directorios de índice completos (huella_indice); los temporales llevan sufijo .tmp-<pid>
+HUELLA_RE = re.compile(r"[0-9a-f]{16}")
+
+
+def limpiar_indices_anteriores(index_dir, huella):
+    """
+    Elimina los índices completos de huellas anteriores.
 
+    Solo toca directorios con nombre de huella y con index.faiss: los temporales que otro
+    proceso esté escribiendo en ese momento y cualquier otro archivo se dejan intactos.
+    """
+    for entry in os.listdir(index_dir):
+        path = os.path.join(index_dir, entry)
+        if (entry != huella and HUELLA_RE.fullmatch(entry)
+                and os.path.isfile(os.path.join(path, "index.faiss"))):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def construir_indice(archivos, embeddings):
+    """Carga y fragmenta los PDFs y los embebe en un índice FAISS (None si no hay documentos)."""
     docs = []
-    print("\n⚙️  Inicializando sistema: Cargando pólizas...")
-    for archivo in archivos_polizas:
-        if os.path.exists(archivo):
-            loader = PyPDFLoader(archivo)
-            d = loader.load()
-            for doc in d:
-                doc.metadata["source"] = os.path.basename(archivo).replace(".pdf", "")
-            docs.extend(d)
+    for archivo in archivos:
+        loader = PyPDFLoader(archivo)
+        d = loader.load()
+        for doc in d:
+            doc.metadata["source"] = os.path.basename(archivo).replace(".pdf", "")
+        docs.extend(d)
 
     if not docs:
         return None
 
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1500, chunk_overlap=200)
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
     chunks = text_splitter.split_documents(docs)
+    return FAISS.from_documents(chunks, embeddings)
 
-    embeddings = OpenAIEmbeddings()
-    vectorstore = FAISS.from_documents(chunks, embeddings)
+
+def _cargar_indice(path, embeddings):
+    # El pickle del docstore lo escribe cargar_o_construir_indice, no proviene de terceros
+    try:
+        return FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True,
+                                io_flags=faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError:
+        # Versiones de faiss sin mmap para índices planos
+        return FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
+
+
+def cargar_o_construir_indice(archivos, embeddings, index_dir=FAISS_INDEX_DIR):
+    """
+    Índice FAISS de los PDFs, reutilizando el guardado en disco si la huella coincide.
+
+    El índice se abre con mmap (los vectores no se copian a memoria al iniciar). Si la huella
+    cambió, se reconstruye, se guarda en un directorio temporal que se renombra al terminar
+    y se eliminan los índices de huellas anteriores.
+    """
+    huella = huella_indice(archivos, embeddings)
+    path = os.path.join(index_dir, huella)
+
+    if os.path.exists(os.path.join(path, "index.faiss")):
+        try:
+            return _cargar_indice(path, embeddings)
+        except Exception as e:
+            print(f"⚠️  Índice FAISS ilegible, se reconstruye: {e}")
+
+    vectorstore = construir_indice(archivos, embeddings)
+    if vectorstore is None:
+        return None
+
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    vectorstore.save_local(tmp_path)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    limpiar_indices_anteriores(index_dir, huella)
+    return vectorstore
+
+
+def preparar_rag():
+    archivos = archivos_polizas()
+    print("\n⚙️  Inicializando sistema: Cargando pólizas...")
+    start = time.perf_counter()
+    vectorstore = cargar_o_construir_indice(archivos, OpenAIEmbeddings())
+    if vectorstore is None:
+        return None
+    print(f"⏱️  Índice listo en {time.perf_counter() - start:.2f}s ({vectorstore.index.ntotal} fragmentos)")
 
     # Prompt específico para cuando el experto es el "Comparador"
     template_rag = """
@@ -89,7 +192,12 @@ def preparar_rag():
 
 # --- 3. EL CLASIFICADOR DE INTENCIONES (ROUTER) ---
 def clasificar_intencion(pregunta):
-    llm = ChatOpenAI(model_name="gpt-3.5-turbo", temperature=0)
+    """Clasificador local (intent_classifier.py); el LLM solo se consulta si la confianza es baja."""
+    return get_intent_classifier().route(pregunta, clasificar_intencion_llm)
+
+
+def clasificar_intencion_llm(pregunta):
+    llm = get_llm("gpt-3.5-turbo")
 
     template_router = """
     Tu única tarea es clasificar la intención del usuario en una de estas categorías:
@@ -1,7 +1,12 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, status
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 import sqlite3
+import asyncio
+import json
 import sys
+import uuid
 
 import os
 from dotenv import load_dotenv
@@ -10,13 +15,41 @@ load_dotenv()
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 
-from src.core.agent import get_agent_executor
+from src.core.agent import get_agent_executor, structured_output
 from src.core.auth import create_user, DB_PATH
+from src.core.query_context import query_turn
+from src.core.database import get_embeddings, get_vectorstore
+from src.core.answer_cache import QUERY_LOG_PATH, ANSWER_CACHE_WARM
+from src.core.tools.rag_tool import get_answer_cache, awarm_answer_cache, asearch_with_scores
+from src.core.tools.comparator import get_comparison_cache, acompare
+from src.core.resources import registry
+from src.infrastructure.chatbot_rules import ServidorReglas, RULES_FLOWS_PATH
+
+
+async def _warm_answer_cache():
+    try:
+        warmed = await awarm_answer_cache(QUERY_LOG_PATH, ANSWER_CACHE_WARM)
+        print(f"🔥 Caché de respuestas pre-calentada con {warmed} consultas.")
+    except Exception as e:
+        print(f"⚠️  No se pudo pre-calentar la caché de respuestas: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pre-calentar en segundo plano: el servidor atiende mientras tanto
+    warm_task = None
+    if ANSWER_CACHE_WARM > 0 and QUERY_LOG_PATH and os.path.exists(QUERY_LOG_PATH):
+        warm_task = asyncio.create_task(_warm_answer_cache())
+    yield
+    if warm_task is not None:
+        warm_task.cancel()
+
 
 app = FastAPI(
     title="Insurance Copilot API",
     description="API for the AI-powered Insurance Copilot. Supports complex comparisons and RAG.",
-    version="0.2.0"
+    version="0.2.0",
+    lifespan=lifespan,
 )
 
 
@@ -36,6 +69,53 @@ class ChatResponse(BaseModel):
     data: dict = {}
 
 
+class SearchRequest(BaseModel):
+    query: str
+    insurer: str | None = None
+    source: str | None = None
+    k: int = Field(10, ge=1, le=50)
+    offset: int = Field(0, ge=0, le=200)
+
+
+class SearchHit(BaseModel):
+    id: str | None = None
+    content: str
+    insurer: str | None = None
+    source: str | None = None
+    page: int | None = None
+    score: float
+
+
+class SearchResponse(BaseModel):
+    query: str
+    results: list[SearchHit]
+    offset: int
+    has_more: bool
+
+
+class BatchSearchRequest(BaseModel):
+    queries: list[SearchRequest] = Field(..., min_length=1, max_length=100)
+
+
+class RulesChatRequest(BaseModel):
+    message: str
+    session_id: str | None = None
+
+
+class RulesChatResponse(BaseModel):
+    session_id: str
+    response: str
+    last_intent: str | None = None
+    flow: str | None = None
+    end: bool = False
+
+
+class CoverageResponse(BaseModel):
+    feature: str
+    comparison: list[dict]
+    origins: dict = {}
+
+
 @app.post("/users", status_code=status.HTTP_201_CREATED, summary="Crear un nuevo usuario")
 async def create_user_endpoint(request: CreateUserRequest):
     try:
@@ -59,21 +139,217 @@ async def create_user_endpoint(request: CreateUserRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _build_chat_response(result: dict) -> ChatResponse:
+    """Convierte el estado final del agente en un ChatResponse."""
+    # Herramientas estructuradas con retorno directo: el dict llega sin pasar por el LLM
+    data = structured_output(result["messages"])
+    if data is None:
+        return ChatResponse(response=str(result["messages"][-1].content))
+    if "error" in data:
+        return ChatResponse(response=f"No se pudo generar el comparativo: {data['error']}")
+    return ChatResponse(response="Comparativo generado exitosamente.", data=data)
+
+
 @app.post("/chat", response_model=ChatResponse, summary="Procesar consulta del usuario con el Agente")
 async def chat_endpoint(request: ChatRequest):
     try:
         agent = get_agent_executor()
-        result = agent.invoke({"messages": [{"role": "user", "content": request.query}]})
-        output = result["messages"][-1].content
+        with query_turn(request.query):
+            result = await agent.ainvoke({"messages": [{"role": "user", "content": request.query}]})
+        return _build_chat_response(result)
 
-        data = {}
-        if isinstance(output, dict):
-            data = output
-            response_text = "Comparativo generado exitosamente."
-        else:
-            response_text = str(output)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _sse(event: str, data: dict) -> str:
+    """Formatea un evento Server-Sent Events."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+async def _stream_agent_events(query: str):
+    """
+    Traduce los eventos del agente (astream_events v2) a SSE:
+    tool_start / tool_end, sources (fragmentos recuperados), token (respuesta del agente)
+    y un evento final con la forma de ChatResponse.
+    """
+    agent = get_agent_executor()
+    final_state = None
+
+    try:
+        # Igual que /chat: el turno comparte el embedding de la consulta con las herramientas
+        with query_turn(query):
+            async for event in agent.astream_events(
+                {"messages": [{"role": "user", "content": query}]},
+                version="v2"
+            ):
+                kind = event["event"]
+
+                if kind == "on_chat_model_stream":
+                    # Solo los tokens del nodo del agente, no los LLM internos de las herramientas
+                    if event.get("metadata", {}).get("langgraph_node") != "agent":
+                        continue
+                    content = event["data"]["chunk"].content
+                    if isinstance(content, str) and content:
+                        yield _sse("token", {"content": content})
+
+                elif kind == "on_tool_start":
+                    yield _sse("tool_start", {"tool": event["name"], "input": event["data"].get("input")})
 
-        return ChatResponse(response=response_text, data=data)
+                elif kind == "on_tool_end":
+                    output = event["data"].get("output")
+                    yield _sse("tool_end", {
+                        "tool": event["name"],
+                        "output": getattr(output, "content", output),
+                        "metadata": getattr(output, "artifact", None),
+                    })
 
+                elif kind == "on_custom_event" and event["name"] == "sources":
+                    yield _sse("sources", event["data"])
+
+                elif kind == "on_chain_end" and not event.get("parent_ids"):
+                    final_state = event["data"].get("output")
+
+        if final_state is None:
+            raise RuntimeError("El agente terminó sin estado final.")
+
+        yield _sse("final", _build_chat_response(final_state).model_dump())
+
+    except Exception as e:
+        yield _sse("error", {"detail": str(e)})
+
+
+@app.post("/chat/stream", summary="Procesar consulta con el Agente transmitiendo eventos (SSE)")
+async def chat_stream_endpoint(request: ChatRequest):
+    return StreamingResponse(
+        _stream_agent_events(request.query),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/metrics/cache", summary="Métricas de las cachés de embeddings y respuestas")
+async def cache_metrics_endpoint():
+    embeddings = get_embeddings()
+    return {
+        "answers": get_answer_cache().stats(),
+        "comparisons": get_comparison_cache().stats(),
+        "query_embeddings": embeddings.stats() if hasattr(embeddings, "stats") else {},
+    }
+
+
+@app.get("/coverage", response_model=CoverageResponse, summary="Comparativo de una característica entre aseguradoras")
+async def coverage_endpoint(feature: str, insurers: str):
+    """
+    Sirve la matriz precalculada (ver build_coverage_facts.py) y extrae en vivo solo las
+    aseguradoras o características que no estén precalculadas. `insurers` separadas por comas.
+    """
+    insurer_list = [insurer for insurer in insurers.split(",") if insurer.strip()]
+    if not insurer_list:
+        raise HTTPException(status_code=422, detail="Indica al menos una aseguradora")
+
+    result, origins = await acompare(feature, insurer_list)
+    if "error" in result or "comparison" not in result:
+        raise HTTPException(status_code=500, detail=str(result.get("error", result)))
+    return CoverageResponse(feature=result["feature"], comparison=result["comparison"], origins=origins)
+
+
+def _search_filter(request: SearchRequest):
+    """Filtro de metadata de Chroma a partir de los filtros opcionales de la búsqueda."""
+    conditions = []
+    if request.insurer:
+        conditions.append({"insurer": request.insurer.strip().upper()})
+    if request.source:
+        conditions.append({"source": request.source})
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+async def _search(request: SearchRequest, query_vector) -> SearchResponse:
+    # Se pide un fragmento extra para saber si hay otra página
+    docs, scores = await asearch_with_scores(
+        get_vectorstore(), query_vector, k=request.offset + request.k + 1, filter=_search_filter(request)
+    )
+    page = list(zip(docs, scores))[request.offset:request.offset + request.k]
+    return SearchResponse(
+        query=request.query,
+        offset=request.offset,
+        has_more=len(docs) > request.offset + request.k,
+        results=[
+            SearchHit(
+                id=doc.id,
+                content=doc.page_content,
+                insurer=doc.metadata.get("insurer"),
+                source=doc.metadata.get("source"),
+                page=doc.metadata.get("page"),
+                score=score,
+            )
+            for doc, score in page
+        ],
+    )
+
+
+@app.post("/search", response_model=SearchResponse, summary="Fragmentos relevantes sin generación (solo recuperación)")
+async def search_endpoint(request: SearchRequest):
+    try:
+        query_vector = await get_embeddings().aembed_query(request.query)
+        return await _search(request, query_vector)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/search/batch", response_model=list[SearchResponse], summary="Varias búsquedas en una petición")
+async def search_batch_endpoint(request: BatchSearchRequest):
+    try:
+        embeddings = get_embeddings()
+        texts = [search.query for search in request.queries]
+        # Las consultas sin caché se embeben en una sola llamada
+        if hasattr(embeddings, "aembed_queries"):
+            vectors = await embeddings.aembed_queries(texts)
+        else:
+            vectors = await embeddings.aembed_documents(texts)
+        return await asyncio.gather(*(
+            _search(search, vector) for search, vector in zip(request.queries, vectors)
+        ))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def get_rules_server() -> ServidorReglas:
+    """Chatbot de reglas compartido por todas las sesiones del proceso."""
+    return registry.get("rules_server", lambda: ServidorReglas(RULES_FLOWS_PATH))
+
+
+def _rules_server_or_503() -> ServidorReglas:
+    try:
+        return get_rules_server()
+    except (OSError, json.JSONDecodeError, KeyError) as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail=f"Flujos del chatbot de reglas no disponibles: {e}")
+
+
+# Endpoints síncronos: el emparejamiento es CPU y corre en el pool de hilos de FastAPI
+@app.post("/rules/chat", response_model=RulesChatResponse, summary="Chatbot de reglas con sesiones")
+def rules_chat_endpoint(request: RulesChatRequest):
+    server = _rules_server_or_503()
+    session_id = request.session_id or uuid.uuid4().hex
+    result = server.responder(session_id, request.message)
+    return RulesChatResponse(
+        session_id=session_id,
+        response=result["respuesta"],
+        last_intent=result["ultima_intencion"],
+        flow=result["flujo_actual"],
+        end=result["terminar"],
+    )
+
+
+@app.post("/rules/reload", summary="Recarga los flujos del chatbot de reglas si el archivo cambió")
+def rules_reload_endpoint():
+    server = _rules_server_or_503()
+    return {"reloaded": server.recargar(), **server.stats()}
+
+
+@app.get("/rules/stats", summary="Sesiones activas, vencidas y desalojadas del chatbot de reglas")
+def rules_stats_endpoint():
+    return _rules_server_or_503().stats()
@@ -0,0 +1,86 @@
+import os
+import sys
+import time
+import asyncio
+from pathlib import Path
+from dotenv import load_dotenv
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+from src.core.database import get_index_generation
+from src.core.coverage_facts import DEFAULT_FEATURES
+from src.core.tools.comparator import aextract_entries, get_coverage_facts
+
+load_dotenv()
+
+# Características extraídas en paralelo (cada una lanza una llamada al LLM)
+DEFAULT_CONCURRENCY = int(os.getenv("COVERAGE_FACTS_CONCURRENCY", 4))
+
+
+def insurer_folders(data_dir: Path) -> list[str]:
+    """Aseguradoras con al menos un PDF en data/<aseguradora>/, como aparecen en la metadata."""
+    return sorted(
+        folder.name.upper() for folder in data_dir.iterdir()
+        if folder.is_dir() and any(folder.glob("*.pdf"))
+    )
+
+
+def load_features(path: str) -> list[str]:
+    """Lee una característica por línea (se ignoran líneas vacías y comentarios '#')."""
+    with open(path, "r", encoding="utf-8") as f:
+        lines = [line.strip() for line in f]
+    return [line for line in lines if line and not line.startswith("#")]
+
+
+def build_coverage_facts(features: list[str] = None, insurers: list[str] = None,
+                         concurrency: int = DEFAULT_CONCURRENCY) -> dict:
+    """
+    Precalcula la matriz característica × aseguradora con la extracción de compare_policies.
+
+    Las filas se guardan con la generación actual del índice; tras una nueva ingesta hay que
+    volver a ejecutar el job (mientras tanto, compare_policies extrae en vivo).
+
+    Returns:
+        {característica: número de aseguradoras guardadas}
+    """
+    project_root = Path(__file__).parent.parent.parent
+    features = features or DEFAULT_FEATURES
+    insurers = insurers or insurer_folders(project_root / "data")
+    generation = get_index_generation()
+    facts = get_coverage_facts()
+
+    print(f"🧮 Precalculando {len(features)} características × {len(insurers)} aseguradoras "
+          f"(generación {generation})...")
+
+    async def run():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def extract(feature):
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    entries, _ = await aextract_entries(feature, insurers)
+                except Exception as e:
+                    print(f"❌ {feature}: {e}")
+                    return feature, 0
+                facts.upsert(feature, entries, generation)
+                print(f"✅ {feature}: {len(entries)}/{len(insurers)} aseguradoras "
+                      f"({time.perf_counter() - start:.1f}s)")
+                return feature, len(entries)
+
+        return dict(await asyncio.gather(*(extract(feature) for feature in features)))
+
+    return asyncio.run(run())
+
+
+if __name__ == "__main__":
+    # Características: --features "deducible,robo total" o --features-file ruta.txt
+    selected_features = None
+    if "--features" in sys.argv:
+        selected_features = [f.strip() for f in sys.argv[sys.argv.index("--features") + 1].split(",") if f.strip()]
+    if "--features-file" in sys.argv:
+        selected_features = load_features(sys.argv[sys.argv.index("--features-file") + 1])
+    # Extracciones en paralelo: --concurrency N (por defecto COVERAGE_FACTS_CONCURRENCY o 4)
+    extract_concurrency = DEFAULT_CONCURRENCY
+    if "--concurrency" in sys.argv:
+        extract_concurrency = int(sys.argv[sys.argv.index("--concurrency") + 1])
+    build_coverage_facts(features=selected_features, concurrency=extract_concurrency)
@@ -8,41 +8,288 @@ Este chatbot funciona mediante coincidencia de patrones y reglas predefinidas.
 Los mensajes y flujos están en el archivo flujos_conversacion.json
 """
 
+import os
 import json
 import re
+import copy
+import time
+import threading
 import difflib
 import random
 import unicodedata
+from collections import defaultdict, deque, OrderedDict
+from contextlib import contextmanager
 from pathlib import Path
 
+import numpy as np
+
+# Sesiones simultáneas como máximo, inactividad (s) tras la que se descarta una sesión
+# y mensajes que se conservan en el historial de cada una
+RULES_SESSIONS_MAX = int(os.getenv("RULES_SESSIONS_MAX", 10000))
+RULES_SESSION_TTL = float(os.getenv("RULES_SESSION_TTL", 1800))
+RULES_HISTORY_MAX = int(os.getenv("RULES_HISTORY_MAX", 20))
+# Archivo de flujos que sirve el API (relativo a src/infrastructure)
+RULES_FLOWS_PATH = os.getenv("RULES_FLOWS_PATH", "instructions.json")
+# Segundos entre comprobaciones de cambios en el archivo de flujos (recarga en caliente)
+RULES_RELOAD_INTERVAL = float(os.getenv("RULES_RELOAD_INTERVAL", 2))
+
+
+def normalizar_texto(texto):
+    """Minúsculas, sin tildes, sin puntuación extra y con espacios normalizados."""
+    # Convertir a minúsculas
+    texto = texto.lower()
+
+    # Eliminar tildes
+    texto = ''.join(
+        c for c in unicodedata.normalize('NFD', texto)
+        if unicodedata.category(c) != 'Mn'
+    )
+
+    # Remover puntuación excesiva pero mantener espacios
+    texto = re.sub(r'[^\w\s]', '', texto)
+
+    # Normalizar espacios
+    texto = ' '.join(texto.split())
+
+    return texto
+
+
+class IndicePatrones:
+    """
+    Patrones de todos los flujos normalizados una sola vez, con índices invertidos.
+
+    Reproduce exactamente el puntaje de buscar_mejor_intencion (difflib + bonus de 0.8 por
+    patrón contenido y 0.85 por palabras contenidas, primer patrón en caso de empate) sin
+    recorrer todos los patrones en Python:
+
+    - Los bonus salen de índices invertidos por palabra y por trigrama de caracteres.
+    - Para difflib se usa la cota de quick_ratio (multiconjunto de caracteres), calculada
+      para todos los patrones con una sola operación de numpy; los patrones cuya cota supera
+      al mejor puntaje encontrado se recorren de mayor a menor cota, se descartan los que no
+      pasan la cota por LCS y solo en el resto se evalúa ratio().
+    - Cada patrón guarda su SequenceMatcher con el índice de caracteres (b2j) precalculado.
+    """
+
+    def __init__(self, flujos, normalizar):
+        self.patrones = []      # (patrón normalizado, intención, nombre del flujo)
+        self.matchers = []
+        self.mascaras = []      # {carácter: bits de sus posiciones en el patrón}, para la LCS
+        por_palabra = defaultdict(list)
+        por_trigrama = defaultdict(list)
+        palabras_por_patron = []
+        trigramas_por_patron = []
+        self.cortos = []        # patrones de menos de 3 caracteres (sin trigramas)
+
+        for nombre_flujo, flujo in flujos.items():
+            for intencion in flujo['intenciones']:
+                for patron in intencion['patrones']:
+                    i = len(self.patrones)
+                    normalizado = normalizar(patron)
+                    self.patrones.append((normalizado, intencion, nombre_flujo))
+                    self.matchers.append(difflib.SequenceMatcher(None, '', normalizado))
+                    mascaras = defaultdict(int)
+                    for j, c in enumerate(normalizado):
+                        mascaras[c] |= 1 << j
+                    self.mascaras.append(dict(mascaras))
+
+                    palabras = set(normalizado.split())
+                    trigramas = {normalizado[j:j + 3] for j in range(len(normalizado) - 2)}
+                    for palabra in palabras:
+                        por_palabra[palabra].append(i)
+                    for trigrama in trigramas:
+                        por_trigrama[trigrama].append(i)
+                    if not trigramas:
+                        self.cortos.append(i)
+                    palabras_por_patron.append(len(palabras))
+                    trigramas_por_patron.append(len(trigramas))
+
+        self.por_palabra = {k: np.array(v, dtype=np.int32) for k, v in por_palabra.items()}
+        self.por_trigrama = {k: np.array(v, dtype=np.int32) for k, v in por_trigrama.items()}
+        self.n_palabras = np.array(palabras_por_patron, dtype=np.int32)
+        self.n_trigramas = np.array(trigramas_por_patron, dtype=np.int32)
+        self.longitudes = np.array([len(p) for p, _, _ in self.patrones], dtype=np.int64)
+
+        # Conteo de cada carácter por patrón, para la cota de quick_ratio
+        self.alfabeto = {c: j for j, c in enumerate(sorted({c for p, _, _ in self.patrones for c in p}))}
+        self.conteos = np.zeros((len(self.patrones), len(self.alfabeto)), dtype=np.int32)
+        for i, (normalizado, _, _) in enumerate(self.patrones):
+            for c in normalizado:
+                self.conteos[i, self.alfabeto[c]] += 1
+
+    def __len__(self):
+        return len(self.patrones)
+
+    def _coincidencias(self, indice, claves):
+        """Cuántas claves distintas del mensaje aparecen en cada patrón."""
+        listas = [indice[k] for k in claves if k in indice]
+        if not listas:
+            return np.zeros(len(self.patrones), dtype=np.int64)
+        return np.bincount(np.concatenate(listas), minlength=len(self.patrones))
+
+    def _bonus(self, mensaje):
+        """Puntaje mínimo de cada patrón por las reglas de contención (0, 0.8 o 0.85)."""
+        bonus = np.zeros(len(self.patrones))
+
+        # Patrón contenido en el mensaje: todos sus trigramas están en el mensaje (se verifica con `in`)
+        trigramas = {mensaje[j:j + 3] for j in range(len(mensaje) - 2)}
+        completos = (self._coincidencias(self.por_trigrama, trigramas) == self.n_trigramas) & (self.n_trigramas > 0)
+        for i in [*np.flatnonzero(completos), *self.cortos]:
+            if self.patrones[i][0] in mensaje:
+                bonus[i] = 0.8
+
+        # Todas las palabras del patrón están en el mensaje
+        palabras = set(mensaje.split())
+        bonus[self._coincidencias(self.por_palabra, palabras) == self.n_palabras] = 0.85
+        return bonus
+
+    def _cotas(self, mensaje):
+        """Cota superior de SequenceMatcher.ratio() (quick_ratio) para todos los patrones."""
+        conteo = np.zeros(len(self.alfabeto), dtype=np.int32)
+        for c in mensaje:
+            j = self.alfabeto.get(c)
+            if j is not None:
+                conteo[j] += 1
+        comunes = np.minimum(self.conteos, conteo).sum(axis=1)
+        total = self.longitudes + len(mensaje)
+        return np.divide(2.0 * comunes, total, out=np.ones(len(self.patrones)), where=total > 0)
+
+    def cota_lcs(self, i, mensaje):
+        """
+        Cota de ratio() por la subsecuencia común más larga (LCS), más ajustada que quick_ratio.
+
+        Los bloques de SequenceMatcher no se cruzan, así que suman como máximo la LCS; se calcula
+        con el algoritmo bit-paralelo sobre las máscaras de posiciones del patrón.
+        """
+        mascaras = self.mascaras[i]
+        m = len(self.patrones[i][0])
+        total = m + len(mensaje)
+        if total == 0:
+            return 1.0
+        v = (1 << m) - 1
+        for c in mensaje:
+            u = v & mascaras.get(c, 0)
+            v = (v + u) | (v - u)
+        lcs = m - (v & ((1 << m) - 1)).bit_count()
+        return 2.0 * lcs / total
+
+    def ratio(self, i, mensaje):
+        """difflib.SequenceMatcher(None, mensaje, patrón).ratio() reutilizando el b2j del patrón."""
+        matcher = copy.copy(self.matchers[i])
+        matcher.set_seq1(mensaje)
+        return matcher.ratio()
+
+    def buscar(self, mensaje, minimo=0.0):
+        """
+        Mejor patrón para el mensaje normalizado.
+
+        Args:
+            mensaje: Mensaje del usuario ya normalizado
+            minimo: Puntaje por debajo del cual no interesa el resultado exacto (p. ej. el umbral
+                de similitud); los patrones que no pueden alcanzarlo no se evalúan
+
+        Returns:
+            Tupla (intencion, score, flujo_nombre) o (None, 0, None)
+        """
+        if not self.patrones:
+            return None, 0, None
+
+        bonus = self._bonus(mensaje)
+        mejor_i = int(bonus.argmax())
+        mejor = float(bonus[mejor_i])
+        if mejor <= 0:
+            mejor_i = None
+
+        cotas = self._cotas(mensaje)
+        # Solo puede mejorar un patrón cuya cota supere su propio bonus y al mejor puntaje
+        candidatos = np.flatnonzero((cotas > bonus) & (cotas >= max(mejor, minimo)))
+        for i in candidatos[np.argsort(-cotas[candidatos], kind='stable')]:
+            cota = cotas[i]
+            if cota < mejor or cota < minimo:
+                break
+            if cota == mejor and (mejor_i is None or i > mejor_i):
+                continue
+            cota_lcs = self.cota_lcs(i, mensaje)
+            if cota_lcs < max(mejor, minimo) or cota_lcs <= bonus[i]:
+                continue
+            if cota_lcs == mejor and mejor_i is not None and i > mejor_i:
+                continue
+            score = max(self.ratio(i, mensaje), bonus[i])
+            if score > mejor or (score == mejor and score > 0 and (mejor_i is None or i < mejor_i)):
+                mejor, mejor_i = score, int(i)
+
+        if mejor_i is None:
+            return None, 0, None
+        _, intencion, flujo = self.patrones[mejor_i]
+        return intencion, mejor, flujo
+
+
+class FlujosCompilados:
+    """
+    Configuración, flujos e índice de patrones de un archivo de flujos.
+
+    No se modifica después de crearse: varias sesiones (e hilos) lo comparten, y una recarga
+    crea uno nuevo en lugar de alterar el vigente.
+    """
+
+    def __init__(self, config, flujos, indice, mtime=None):
+        self.config = config
+        self.flujos = flujos
+        self.indice = indice
+        self.mtime = mtime
+
+
+def compilar_flujos(ruta):
+    """
+    Lee y compila el archivo de flujos.
+
+    Raises:
+        FileNotFoundError, json.JSONDecodeError o KeyError si el archivo falta o es inválido.
+    """
+    ruta = Path(__file__).parent / ruta
+    mtime = os.stat(ruta).st_mtime_ns
+    with open(ruta, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    flujos = data['flujos']
+    return FlujosCompilados(data['configuracion'], flujos, IndicePatrones(flujos, normalizar_texto), mtime)
+
+
+def nuevo_contexto(max_historial=None):
+    """Contexto de una conversación (historial acotado a `max_historial` mensajes si se indica)."""
+    return {
+        'nombre_usuario': None,
+        'flujo_actual': None,
+        'ultima_intencion': None,
+        'historial': deque(maxlen=max_historial) if max_historial else []
+    }
+
 
 class ChatbotReglas:
     """Chatbot basado en reglas con dos flujos de conversación"""
-    def __init__(self, archivo_flujos='instructions.json'):
+    def __init__(self, archivo_flujos='instructions.json', compilados=None):
         """
         Inicializa el chatbot cargando los flujos desde JSON
 
         Args:
             archivo_flujos: Ruta al archivo JSON con los flujos
+            compilados: FlujosCompilados ya cargados (no se lee el archivo)
         """
         self.archivo_flujos = archivo_flujos
-        self.cargar_flujos()
-        self.contexto = {
-            'nombre_usuario': None,
-            'flujo_actual': None,
-            'ultima_intencion': None,
-            'historial': []
-        }
+        if compilados is None:
+            self.cargar_flujos()
+        else:
+            self._usar(compilados)
+        self.contexto = nuevo_contexto()
+
+    def _usar(self, compilados):
+        self.compilados = compilados
+        self.config = compilados.config
+        self.flujos = compilados.flujos
+        self.indice = compilados.indice
 
     def cargar_flujos(self):
         """Carga los flujos de conversación desde el archivo JSON"""
         try:
-            ruta = Path(__file__).parent / self.archivo_flujos
-            with open(ruta, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-
-            self.config = data['configuracion']
-            self.flujos = data['flujos']
+            self._usar(compilar_flujos(self.archivo_flujos))
             print("✓ Flujos de conversación cargados correctamente\n")
 
         except FileNotFoundError:
@@ -62,22 +309,7 @@ class ChatbotReglas:
         Returns:
             Texto normalizado (minúsculas, sin tildes, sin puntuación extra)
         """
-        # Convertir a minúsculas
-        texto = texto.lower()
-
-        # Eliminar tildes
-        texto = ''.join(
-            c for c in unicodedata.normalize('NFD', texto)
-            if unicodedata.category(c) != 'Mn'
-        )
-
-        # Remover puntuación excesiva pero mantener espacios
-        texto = re.sub(r'[^\w\s]', '', texto)
-
-        # Normalizar espacios
-        texto = ' '.join(texto.split())
-
-        return texto
+        return normalizar_texto(texto)
 
     def calcular_similitud(self, texto1, texto2):
         """
@@ -92,46 +324,21 @@ class ChatbotReglas:
         """
         return difflib.SequenceMatcher(None, texto1, texto2).ratio()
 
-    def buscar_mejor_intencion(self, mensaje_usuario):
+    def buscar_mejor_intencion(self, mensaje_usuario, minimo=0.0):
         """
         Busca la mejor intención que coincida con el mensaje del usuario
 
+        Usa el índice de patrones compilado en cargar_flujos (ver IndicePatrones); el
+        resultado es el mismo que comparar el mensaje con cada patrón de cada flujo.
+
         Args:
             mensaje_usuario: Mensaje del usuario (ya normalizado)
+            minimo: Puntaje mínimo que interesa (los patrones que no pueden alcanzarlo se omiten)
 
         Returns:
             Tupla (intencion, score, flujo_nombre) o (None, 0, None)
         """
-        mejor_intencion = None
-        mejor_score = 0
-        mejor_flujo = None
-
-        # Buscar en todos los flujos
-        for nombre_flujo, flujo in self.flujos.items():
-            for intencion in flujo['intenciones']:
-                # Calcular similitud con cada patrón
-                for patron in intencion['patrones']:
-                    patron_normalizado = self.normalizar_texto(patron)
-
-                    # Similitud general
-                    score = self.calcular_similitud(mensaje_usuario, patron_normalizado)
-
-                    # Bonus si la palabra clave está contenida exactamente
-                    if patron_normalizado in mensaje_usuario:
-                        score = max(score, 0.8)
-
-                    # Bonus si todas las palabras del patrón están en el mensaje
-                    palabras_patron = patron_normalizado.split()
-                    palabras_mensaje = mensaje_usuario.split()
-                    if all(palabra in palabras_mensaje for palabra in palabras_patron):
-                        score = max(score, 0.85)
-
-                    if score > mejor_score:
-                        mejor_score = score
-                        mejor_intencion = intencion
-                        mejor_flujo = nombre_flujo
-
-        return mejor_intencion, mejor_score, mejor_flujo
+        return self.indice.buscar(mensaje_usuario, minimo)
 
     def seleccionar_respuesta(self, intencion):
         """
@@ -152,30 +359,35 @@ class ChatbotReglas:
 
         return respuesta
 
-    def procesar_mensaje(self, mensaje_usuario):
+    def procesar_mensaje(self, mensaje_usuario, contexto=None):
         """
         Procesa el mensaje del usuario y genera una respuesta
 
         Args:
             mensaje_usuario: Mensaje del usuario
+            contexto: Contexto de la conversación (por defecto el del propio chatbot)
 
         Returns:
-            Respuesta del bot, o None si debe terminar
+            Tupla (respuesta, debe_terminar)
         """
+        contexto = self.contexto if contexto is None else contexto
+
         # Normalizar mensaje
         mensaje_normalizado = self.normalizar_texto(mensaje_usuario)
 
         # Guardar en historial
-        self.contexto['historial'].append(mensaje_usuario)
+        contexto['historial'].append(mensaje_usuario)
 
         # Buscar mejor intención
-        intencion, score, flujo = self.buscar_mejor_intencion(mensaje_normalizado)
+        intencion, score, flujo = self.buscar_mejor_intencion(
+            mensaje_normalizado, self.config['umbral_similitud']
+        )
 
         # Decidir respuesta
         if score >= self.config['umbral_similitud']:
             # Actualizar contexto
-            self.contexto['ultima_intencion'] = intencion['id']
-            self.contexto['flujo_actual'] = flujo
+            contexto['ultima_intencion'] = intencion['id']
+            contexto['flujo_actual'] = flujo
 
             # Verificar acciones especiales
             if 'accion_especial' in intencion:
@@ -239,6 +451,188 @@ class ChatbotReglas:
         print(f"  - Última intención: {self.contexto['ultima_intencion']}")
 
 
+class AlmacenSesiones:
+    """
+    Contextos por sesión con tope de sesiones (LRU) y vencimiento por inactividad (TTL).
+
+    El historial de cada sesión conserva solo los últimos `max_historial` mensajes. Cada sesión
+    tiene su propio lock (ver `sesion`) para procesar sus mensajes de uno en uno.
+    """
+
+    def __init__(self, max_sesiones=RULES_SESSIONS_MAX, ttl=RULES_SESSION_TTL, max_historial=RULES_HISTORY_MAX):
+        self.max_sesiones = max_sesiones
+        self.ttl = ttl
+        self.max_historial = max_historial
+        self._sesiones = OrderedDict()     # session_id -> (contexto, último acceso, lock de la sesión)
+        self._lock = threading.Lock()
+        self.creadas = 0
+        self.vencidas = 0
+        self.desalojadas = 0
+
+    def _entrada(self, session_id):
+        """(contexto, lock) de la sesión, creándola si no existe o venció."""
+        ahora = time.monotonic()
+        with self._lock:
+            guardada = self._sesiones.get(session_id)
+            if guardada is not None and ahora - guardada[1] > self.ttl:
+                self.vencidas += 1
+                guardada = None
+            if guardada is None:
+                contexto, lock = nuevo_contexto(self.max_historial), threading.Lock()
+                self.creadas += 1
+            else:
+                contexto, _, lock = guardada
+            self._sesiones[session_id] = (contexto, ahora, lock)
+            self._sesiones.move_to_end(session_id)
+            while len(self._sesiones) > self.max_sesiones:
+                self._sesiones.popitem(last=False)
+                self.desalojadas += 1
+            return contexto, lock
+
+    def obtener(self, session_id):
+        """Contexto de la sesión (uno nuevo si no existe o venció)."""
+        return self._entrada(session_id)[0]
+
+    @contextmanager
+    def sesion(self, session_id):
+        """
+        Contexto de la sesión con el lock de la sesión tomado.
+
+        Dos mensajes de la misma sesión se procesan uno tras otro; sesiones distintas siguen en
+        paralelo. Si mientras se esperaba la sesión terminó o se descartó, se abre una nueva.
+        """
+        while True:
+            contexto, lock = self._entrada(session_id)
+            with lock:
+                with self._lock:
+                    guardada = self._sesiones.get(session_id)
+                    vigente = guardada is not None and guardada[2] is lock
+                if vigente:
+                    yield contexto
+                    return
+
+    def eliminar(self, session_id):
+        with self._lock:
+            self._sesiones.pop(session_id, None)
+
+    def purgar(self):
+        """Descarta las sesiones vencidas (las más antiguas están al inicio)."""
+        limite = time.monotonic() - self.ttl
+        with self._lock:
+            while self._sesiones:
+                session_id, (_, ultimo_acceso, _) = next(iter(self._sesiones.items()))
+                if ultimo_acceso >= limite:
+                    break
+                del self._sesiones[session_id]
+                self.vencidas += 1
+
+    def __len__(self):
+        return len(self._sesiones)
+
+    def stats(self):
+        return {
+            "sesiones": len(self._sesiones),
+            "creadas": self.creadas,
+            "vencidas": self.vencidas,
+            "desalojadas": self.desalojadas,
+        }
+
+
+class ServidorReglas:
+    """
+    Chatbot de reglas para muchas sesiones simultáneas.
+
+    Todas las sesiones comparten un ChatbotReglas construido sobre FlujosCompilados inmutables;
+    cada sesión solo aporta su contexto. Si el archivo de flujos cambia, se compila el nuevo
+    en un hilo aparte (sin bloquear ninguna petición) y se reemplaza con una sola asignación: cada
+    mensaje se resuelve completo con la versión vigente al empezar. Si el archivo nuevo no es
+    válido, se mantiene la versión anterior.
+    """
+
+    def __init__(self, archivo_flujos='instructions.json', sesiones=None,
+                 intervalo_recarga=RULES_RELOAD_INTERVAL):
+        self.archivo_flujos = archivo_flujos
+        self.sesiones = sesiones if sesiones is not None else AlmacenSesiones()
+        self.intervalo_recarga = intervalo_recarga
+        self.bot = ChatbotReglas(archivo_flujos, compilados=compilar_flujos(archivo_flujos))
+        self.recargas = 0
+        self._proxima_revision = time.monotonic() + intervalo_recarga
+        self._recargando = threading.Lock()
+        self._hilo_recarga = None
+
+    def _recargar(self):
+        # Requiere tener tomado self._recargando
+        try:
+            compilados = compilar_flujos(self.archivo_flujos)
+        except (OSError, json.JSONDecodeError, KeyError) as e:
+            print(f"⚠️  No se pudo recargar {self.archivo_flujos}, se mantiene la versión anterior: {e}")
+            return False
+        if compilados.mtime == self.bot.compilados.mtime:
+            return False
+        self.bot = ChatbotReglas(self.archivo_flujos, compilados=compilados)
+        self.recargas += 1
+        print(f"🔄 Flujos recargados ({len(compilados.indice)} patrones)")
+        return True
+
+    def recargar(self):
+        """Compila el archivo de flujos y lo pone en servicio. Retorna True si cambió la versión."""
+        with self._recargando:
+            return self._recargar()
+
+    def _recargar_en_segundo_plano(self):
+        try:
+            self._recargar()
+        finally:
+            self._recargando.release()
+
+    def recargar_si_cambio(self):
+        """
+        Revisa el archivo (y purga sesiones vencidas) como máximo una vez por intervalo.
+
+        Si cambió, la compilación corre en un hilo aparte: la petición que lo detecta no
+        espera y, como las demás, se responde con la versión vigente hasta el reemplazo.
+        """
+        ahora = time.monotonic()
+        if ahora < self._proxima_revision:
+            return
+        self._proxima_revision = ahora + self.intervalo_recarga
+        self.sesiones.purgar()
+        try:
+            cambiado = os.stat(Path(__file__).parent / self.archivo_flujos).st_mtime_ns != self.bot.compilados.mtime
+        except OSError:
+            return
+        # Si ya hay una recarga en curso, no se lanza otra
+        if cambiado and self._recargando.acquire(blocking=False):
+            self._hilo_recarga = threading.Thread(
+                target=self._recargar_en_segundo_plano, name="rules-reload", daemon=True
+            )
+            self._hilo_recarga.start()
+
+    def responder(self, session_id, mensaje):
+        """
+        Procesa un mensaje de una sesión.
+
+        Returns:
+            dict con la respuesta, la última intención reconocida y el flujo de la sesión,
+            y si la conversación terminó (en ese caso la sesión se descarta)
+        """
+        self.recargar_si_cambio()
+        bot = self.bot
+        with self.sesiones.sesion(session_id) as contexto:
+            respuesta, debe_terminar = bot.procesar_mensaje(mensaje, contexto)
+            if debe_terminar:
+                self.sesiones.eliminar(session_id)
+            return {
+                "respuesta": respuesta,
+                "ultima_intencion": contexto['ultima_intencion'],
+                "flujo_actual": contexto['flujo_actual'],
+                "terminar": debe_terminar,
+            }
+
+    def stats(self):
+        return {**self.sesiones.stats(), "patrones": len(self.bot.indice), "recargas": self.recargas}
+
+
 def main():
     """Función principal"""
     # Crear instancia del chatbot
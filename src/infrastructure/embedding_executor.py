@@ -0,0 +1,220 @@
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+
+import openai
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimación rápida de tokens (~4 caracteres por token) sin descargar el tokenizador."""
+    return max(1, len(text) // 4)
+
+
+def is_rate_limit_error(exc: Exception) -> bool:
+    """True si la excepción corresponde a un HTTP 429."""
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status == 429
+
+
+def is_retryable_error(exc: Exception) -> bool:
+    """Errores transitorios: rate limit, 5xx, timeouts y fallos de conexión."""
+    if is_rate_limit_error(exc):
+        return True
+    status = getattr(exc, "status_code", None)
+    if isinstance(status, int) and status >= 500:
+        return True
+    return isinstance(exc, (openai.APIConnectionError, openai.APITimeoutError, asyncio.TimeoutError, ConnectionError))
+
+
+def retry_after_seconds(exc: Exception):
+    """Lee la cabecera Retry-After de la respuesta, si existe."""
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class EmbeddingStats:
+    """Contadores del ejecutor de embeddings."""
+    requests: int = 0
+    texts: int = 0
+    tokens: int = 0
+    retries: int = 0
+    rate_limited: int = 0
+    failures: int = 0
+    max_in_flight: int = 0
+    # Del primer envío a la última respuesta: no cuenta el parseo ni los upserts previos/posteriores
+    started_at: float = None
+    finished_at: float = None
+
+    def snapshot(self, concurrency: int) -> dict:
+        if self.started_at is None:
+            elapsed = 1e-9
+        else:
+            elapsed = max((self.finished_at or time.perf_counter()) - self.started_at, 1e-9)
+        return {
+            "requests": self.requests,
+            "texts": self.texts,
+            "tokens": self.tokens,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "failures": self.failures,
+            "max_in_flight": self.max_in_flight,
+            "concurrency": concurrency,
+            "elapsed_s": elapsed,
+            "requests_per_sec": self.requests / elapsed,
+            "tokens_per_sec": self.tokens / elapsed,
+        }
+
+
+class AsyncEmbeddingExecutor:
+    """
+    Envía varios lotes de embeddings en paralelo adaptando la concurrencia (AIMD).
+
+    - Cada respuesta exitosa y rápida suma capacidad (+1 tras `limit` éxitos seguidos).
+    - Una respuesta lenta (por encima de target_latency) resta 1.
+    - Un 429 reduce la concurrencia a la mitad y pausa todos los envíos con backoff
+      exponencial (o lo que indique Retry-After).
+    """
+
+    def __init__(self, embeddings, max_concurrency: int = 8, min_concurrency: int = 1,
+                 initial_concurrency: int = None, target_latency: float = None,
+                 max_retries: int = 6, base_backoff: float = 1.0, max_backoff: float = 30.0):
+        """
+        Args:
+            embeddings: Objeto con `aembed_documents` (p. ej. OpenAIEmbeddings con max_retries=0,
+                para que los 429 lleguen a este ejecutor en lugar de reintentarse internamente).
+            max_concurrency / min_concurrency: Límites de lotes en vuelo.
+            initial_concurrency: Concurrencia inicial (por defecto la mitad del máximo).
+            target_latency: Latencia objetivo por lote en segundos (None = no se usa).
+            max_retries: Reintentos por lote ante errores transitorios.
+            base_backoff / max_backoff: Rango del backoff exponencial en segundos.
+        """
+        self.embeddings = embeddings
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.limit = initial_concurrency or max(min_concurrency, max_concurrency // 2)
+        self.target_latency = target_latency
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.stats = EmbeddingStats()
+
+        self._active = 0
+        self._successes = 0
+        self._pause_until = 0.0
+        self._condition = None
+        self._loop = None
+
+    # --- Control de concurrencia ---
+    async def _acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._active < self.limit)
+            self._active += 1
+            self.stats.max_in_flight = max(self.stats.max_in_flight, self._active)
+
+    async def _release(self):
+        async with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+    async def _wait_pause(self):
+        while (delay := self._pause_until - time.monotonic()) > 0:
+            await asyncio.sleep(delay)
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.max_backoff, self.base_backoff * 2 ** attempt)
+        return delay + random.uniform(0, delay / 2)
+
+    def _on_success(self, latency: float):
+        if self.target_latency is not None and latency > self.target_latency:
+            self.limit = max(self.min_concurrency, self.limit - 1)
+            self._successes = 0
+            return
+        self._successes += 1
+        if self._successes >= self.limit:
+            self.limit = min(self.max_concurrency, self.limit + 1)
+            self._successes = 0
+
+    def _on_rate_limit(self, exc: Exception, attempt: int) -> float:
+        self.limit = max(self.min_concurrency, self.limit // 2)
+        self._successes = 0
+        delay = retry_after_seconds(exc)
+        if delay is None:
+            delay = self._backoff(attempt)
+        self._pause_until = max(self._pause_until, time.monotonic() + delay)
+        return delay
+
+    # --- Ejecución ---
+    async def _embed_one(self, texts: list[str]) -> list[list[float]]:
+        attempt = 0
+        while True:
+            await self._wait_pause()
+            await self._acquire()
+            start = time.perf_counter()
+            if self.stats.started_at is None:
+                self.stats.started_at = start
+            error = None
+            try:
+                vectors = await self.embeddings.aembed_documents(texts)
+            except Exception as e:
+                error = e
+            finally:
+                await self._release()
+
+            if error is None:
+                self._on_success(time.perf_counter() - start)
+                self.stats.requests += 1
+                self.stats.texts += len(texts)
+                self.stats.tokens += sum(estimate_tokens(t) for t in texts)
+                self.stats.finished_at = time.perf_counter()
+                return vectors
+
+            if not is_retryable_error(error) or attempt >= self.max_retries:
+                self.stats.failures += 1
+                raise error
+
+            self.stats.retries += 1
+            if is_rate_limit_error(error):
+                self.stats.rate_limited += 1
+                self._on_rate_limit(error, attempt)
+            else:
+                await asyncio.sleep(self._backoff(attempt))
+            attempt += 1
+
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._condition = asyncio.Condition()
+            self._loop = loop
+
+    async def embed(self, texts: list[str]) -> list[list[float]]:
+        """
+        Embeddings de un lote, respetando la concurrencia adaptativa.
+
+        Permite alimentar el ejecutor de forma continua (una tarea por lote) sin esperar a
+        que termine un grupo de lotes para enviar el siguiente.
+        """
+        self._bind_loop()
+        return await self._embed_one(texts)
+
+    async def embed_batches(self, batches: list[list[str]], return_exceptions: bool = False):
+        """
+        Calcula los embeddings de varios lotes con concurrencia adaptativa.
+
+        Returns:
+            Lista de resultados en el mismo orden que `batches` (un vector por texto).
+            Con return_exceptions=True, los lotes fallidos contienen la excepción.
+        """
+        self._bind_loop()
+        return await asyncio.gather(*(self._embed_one(batch) for batch in batches),
+                                    return_exceptions=return_exceptions)
+
+    def metrics(self) -> dict:
+        """Contadores actuales (incluye requests/s y tokens/s)."""
+        return self.stats.snapshot(self.limit)
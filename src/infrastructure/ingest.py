@@ -1,88 +1,431 @@
 import os
 import sys
+import json
+import time
+import asyncio
+import hashlib
+from collections import deque
+from itertools import batched
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_openai import OpenAIEmbeddings
-from langchain_chroma import Chroma
 from dotenv import load_dotenv
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
-from src.core.database import get_vectorstore, PERSIST_DIRECTORY
+from src.core.database import (get_vectorstore, reconcile_lexical_index, reset_vectorstore,
+                               bump_index_generation, PERSIST_DIRECTORY, EMBEDDING_MODEL)
+from src.infrastructure.embedding_executor import AsyncEmbeddingExecutor
 
 load_dotenv()
 
-def ingest_documents(reprocess=False):
+CHUNK_SIZE = 1200
+CHUNK_OVERLAP = 200
+
+# Procesos para la extracción de texto de PDFs (CPU-bound)
+DEFAULT_PARSE_WORKERS = int(os.getenv("INGEST_WORKERS", os.cpu_count() or 1))
+
+# Fragmentos por lote de embedding + upsert (cada lote es un punto de control)
+DEFAULT_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 64))
+
+# Lotes de embedding en vuelo como máximo (el ejecutor la ajusta según 429/latencia)
+DEFAULT_EMBED_CONCURRENCY = int(os.getenv("INGEST_EMBED_CONCURRENCY", 4))
+
+# Manifiesto por archivo: hash de contenido, configuración usada e IDs de fragmentos en Chroma
+MANIFEST_PATH = os.path.join(PERSIST_DIRECTORY, "ingest_manifest.json")
+MANIFEST_VERSION = 1
+
+
+def ingest_settings() -> dict:
+    """Configuración que, si cambia, obliga a reindexar un archivo."""
+    return {
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "embedding_model": EMBEDDING_MODEL,
+    }
+
+
+def file_hash(path) -> str:
+    """SHA-256 del contenido del archivo."""
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def chunk_id(rel_path: str, content_hash: str, index: int) -> str:
+    """ID determinista de un fragmento: mismo archivo, contenido y posición => mismo ID."""
+    settings = json.dumps(ingest_settings(), sort_keys=True)
+    return hashlib.sha256(f"{rel_path}|{content_hash}|{settings}|{index}".encode()).hexdigest()[:32]
+
+
+def load_manifest() -> dict:
+    """Carga el manifiesto de ingesta o retorna uno vacío."""
+    if os.path.exists(MANIFEST_PATH):
+        try:
+            with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("version") == MANIFEST_VERSION:
+                return manifest
+            print("⚠️  Versión de manifiesto distinta, se reconstruirá.")
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️  No se pudo leer el manifiesto de ingesta: {e}")
+    return {"version": MANIFEST_VERSION, "files": {}}
+
+
+def save_manifest(manifest: dict):
+    """Guarda el manifiesto de forma atómica (escritura temporal + rename)."""
+    os.makedirs(PERSIST_DIRECTORY, exist_ok=True)
+    tmp_path = MANIFEST_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+def scan_documents(data_dir: Path) -> dict:
+    """Retorna {ruta_relativa: Path} de los PDFs bajo data/ (ignorando chroma_db)."""
+    found = {}
+    for pdf_path in sorted(data_dir.rglob("*.pdf")):
+        if "chroma_db" in str(pdf_path):
+            continue
+        found[pdf_path.relative_to(data_dir).as_posix()] = pdf_path
+    return found
+
+
+def plan_ingest(current_hashes: dict, manifest: dict, settings: dict, reprocess: bool = False):
+    """
+    Compara los archivos actuales contra el manifiesto.
+
+    Args:
+        current_hashes: {ruta_relativa: sha256} de los archivos en disco.
+        manifest: Manifiesto de la última ingesta.
+        settings: Configuración actual (ver ingest_settings).
+        reprocess: Si es True, reindexa todos los archivos.
+
+    Returns:
+        Tupla (to_index, to_remove) con rutas relativas ordenadas.
+    """
+    indexed = manifest.get("files", {})
+
+    to_index = []
+    for rel_path, content_hash in current_hashes.items():
+        entry = indexed.get(rel_path)
+        if (reprocess or entry is None
+                or entry.get("status", "complete") != "complete"
+                or entry.get("sha256") != content_hash
+                or entry.get("settings") != settings):
+            to_index.append(rel_path)
+
+    to_remove = [rel_path for rel_path in indexed if rel_path not in current_hashes]
+    return sorted(to_index), sorted(to_remove)
+
+
+def resume_offset(entry: dict, content_hash: str, settings: dict) -> int:
+    """Fragmentos ya confirmados de una ingesta interrumpida de la misma versión del archivo."""
+    if (entry and entry.get("status") == "partial"
+            and entry.get("sha256") == content_hash
+            and entry.get("settings") == settings):
+        return entry.get("committed", 0)
+    return 0
+
+
+def parse_pdf(pdf_path: Path):
+    """
+    Extrae las páginas de un PDF agregando la metadata que usan los retrievers.
+
+    Se ejecuta en un proceso del pool, por lo que debe ser una función de módulo.
+
+    Returns:
+        Tupla (docs, segundos_de_parseo).
+    """
+    start = time.perf_counter()
+    docs = PyPDFLoader(str(pdf_path)).load()
+    insurer_name = pdf_path.parent.name.upper()
+    for doc in docs:
+        doc.metadata["insurer"] = insurer_name
+        doc.metadata["source"] = pdf_path.name
+    return docs, time.perf_counter() - start
+
+
+def parse_documents(files: dict, workers: int = DEFAULT_PARSE_WORKERS):
+    """
+    Parsea varios PDFs en paralelo con un pool de procesos.
+
+    Args:
+        files: {ruta_relativa: Path} de los PDFs a parsear.
+        workers: Número de procesos. Con 1 se parsea en el proceso actual.
+
+    Yields:
+        Tuplas (ruta_relativa, docs, segundos, error) en el orden en que terminan.
+        Como máximo hay 2 * workers PDFs en vuelo.
+        Si el parseo falla, docs es None y error contiene la excepción.
+    """
+    if workers <= 1 or len(files) <= 1:
+        for rel_path, pdf_path in files.items():
+            try:
+                docs, elapsed = parse_pdf(pdf_path)
+                yield rel_path, docs, elapsed, None
+            except Exception as e:
+                yield rel_path, None, 0.0, e
+        return
+
+    # Ventana acotada de PDFs en vuelo para no acumular páginas en memoria
+    pending = iter(files.items())
+    in_flight = {}
+    executor = ProcessPoolExecutor(max_workers=min(workers, len(files)))
+
+    def submit_next():
+        item = next(pending, None)
+        if item is not None:
+            rel_path, pdf_path = item
+            in_flight[executor.submit(parse_pdf, pdf_path)] = rel_path
+
+    try:
+        for _ in range(workers * 2):
+            submit_next()
+
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                rel_path = in_flight.pop(future)
+                submit_next()
+                try:
+                    docs, elapsed = future.result()
+                    yield rel_path, docs, elapsed, None
+                except Exception as e:
+                    yield rel_path, None, 0.0, e
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _delete_file_chunks(vectorstore, manifest: dict, rel_path: str, pdf_path: Path = None, lexical_index=None):
+    """Elimina de Chroma (y del índice léxico) los fragmentos de un archivo, por IDs del manifiesto o por metadata."""
+    entry = manifest["files"].pop(rel_path, None)
+    ids = entry.get("ids", []) if entry else []
+
+    # Colecciones creadas antes del manifiesto: buscar por metadata
+    if entry is None and pdf_path is not None:
+        legacy = vectorstore.get(
+            where={"$and": [{"source": pdf_path.name}, {"insurer": pdf_path.parent.name.upper()}]},
+            include=[]
+        )
+        ids = legacy["ids"]
+
+    if ids:
+        vectorstore.delete(ids=ids)
+        if lexical_index is not None:
+            lexical_index.delete(ids)
+    return len(ids)
+
+
+def _commit_batch(manifest: dict, batch):
+    """Registra en el manifiesto los fragmentos de un lote ya guardado en Chroma."""
+    for rel_path, ident, _ in batch:
+        entry = manifest["files"][rel_path]
+        entry["ids"].append(ident)
+        entry["committed"] = len(entry["ids"])
+        if entry["committed"] >= entry["chunks"]:
+            entry["status"] = "complete"
+
+
+def _upsert_batch(vectorstore, batch, vectors, lexical_index=None):
+    """Guarda un lote con embeddings ya calculados (upsert por ID) en Chroma y en el índice léxico."""
+    ids = [ident for _, ident, _ in batch]
+    documents = [chunk.page_content for _, _, chunk in batch]
+    metadatas = [chunk.metadata for _, _, chunk in batch]
+    # El wrapper de LangChain no expone un add con embeddings precalculados
+    vectorstore._collection.upsert(ids=ids, embeddings=vectors, documents=documents, metadatas=metadatas)
+    if lexical_index is not None:
+        lexical_index.upsert(ids, documents, metadatas)
+
+
+def ingest_documents(reprocess=False, workers=DEFAULT_PARSE_WORKERS, batch_size=DEFAULT_BATCH_SIZE,
+                     concurrency=DEFAULT_EMBED_CONCURRENCY, embeddings=None):
     """
-    Escanea la carpeta data/ buscando PDFs en subcarpetas, los fragmenta y los guarda en ChromaDB.
+    Escanea la carpeta data/ buscando PDFs en subcarpetas y sincroniza ChromaDB de forma incremental.
+
+    Solo se procesan los PDFs nuevos o modificados (según el manifiesto); los fragmentos de
+    archivos eliminados o reemplazados se borran por ID. Con reprocess=True se reindexan
+    todos los archivos sin borrar la base de datos completa.
+
+    El pipeline es un flujo de generadores: parseo en `workers` procesos -> fragmentación por
+    archivo -> embedding y upsert en lotes de `batch_size` fragmentos con IDs deterministas.
+    Hasta `concurrency` lotes se envían en paralelo al API de embeddings (ver
+    AsyncEmbeddingExecutor). Cada lote confirmado se registra en el manifiesto, por lo que
+    si la ejecución se interrumpe, la siguiente continúa desde el último lote guardado.
+
+    `embeddings` permite inyectar otro cliente; por defecto se usa OpenAI sin reintentos
+    internos para que el ejecutor gestione los 429.
     """
     # Configuración de rutas
     project_root = Path(__file__).parent.parent.parent
     data_dir = project_root / "data"
-    
-    # Obtener vectorstore
-    vectorstore = get_vectorstore()
-    
-    # Verificar si ya hay documentos (evitar duplicados)
-    if not reprocess:
-        existing_count = len(vectorstore.get()['ids'])
-        if existing_count > 0:
-            print(f"ℹ️  La base de datos ya contiene {existing_count} fragmentos. Saltando ingesta.")
-            return vectorstore
 
-    if reprocess:
-        print("⚠️  Reprocesando: Limpiando base de datos vectorial...")
-        # Si PERSIST_DIRECTORY existe, borramos los archivos
-        if os.path.exists(PERSIST_DIRECTORY):
-            print(f"🗑️  Borrando persistencia en {PERSIST_DIRECTORY}")
-            import shutil
-            shutil.rmtree(PERSIST_DIRECTORY)
-            os.makedirs(PERSIST_DIRECTORY)
-        # Re-instanciar después de borrar
-        vectorstore = get_vectorstore()
+    # Obtener vectorstore, índice léxico y manifiesto
+    vectorstore = get_vectorstore()
+    lexical_index = reconcile_lexical_index()
+    manifest = load_manifest()
+    settings = ingest_settings()
 
     # Escaneo recursivo
-    all_docs = []
     print(f"📂 Escaneando documentos en {data_dir}...")
-    
-    # Extensiones a buscar
-    for pdf_path in data_dir.rglob("*.pdf"):
-        # Ignorar si está en chroma_db
-        if "chroma_db" in str(pdf_path):
-            continue
-            
-        insurer_name = pdf_path.parent.name.upper()
-        print(f"📄 Cargando: {pdf_path.name} (Aseguradora: {insurer_name})")
-        
-        try:
-            loader = PyPDFLoader(str(pdf_path))
-            docs = loader.load()
-            
-            for doc in docs:
-                doc.metadata["insurer"] = insurer_name
-                doc.metadata["source"] = pdf_path.name
-                
-            all_docs.extend(docs)
-        except Exception as e:
-            print(f"❌ Error cargando {pdf_path.name}: {e}")
-
-    if not all_docs:
-        print("⚠️  No se encontraron nuevos documentos para indexar.")
+    files = scan_documents(data_dir)
+    current_hashes = {rel_path: file_hash(path) for rel_path, path in files.items()}
+
+    to_index, to_remove = plan_ingest(current_hashes, manifest, settings, reprocess)
+
+    if not to_index and not to_remove:
+        print(f"ℹ️  Índice al día ({len(files)} documentos). No hay cambios que procesar.")
         return vectorstore
 
-    # Fragmentación
-    print(f"✂️  Fragmentando {len(all_docs)} páginas...")
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1200, chunk_overlap=200)
-    chunks = text_splitter.split_documents(all_docs)
+    if reprocess:
+        print("⚠️  Reprocesando: se reindexarán todos los documentos.")
+
+    # Archivos eliminados de data/
+    for rel_path in to_remove:
+        removed = _delete_file_chunks(vectorstore, manifest, rel_path, lexical_index=lexical_index)
+        print(f"🗑️  Eliminado: {rel_path} ({removed} fragmentos)")
+        save_manifest(manifest)
+
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    pending = {rel_path: files[rel_path] for rel_path in to_index}
+    parse_times = {}
+    print(f"⚙️  Parseando {len(pending)} PDFs con {min(workers, len(pending))} procesos...")
+
+    def pending_chunks():
+        """Genera (ruta_relativa, id, fragmento) de los fragmentos aún no confirmados."""
+        for rel_path, docs, elapsed, error in parse_documents(pending, workers):
+            pdf_path = files[rel_path]
+            content_hash = current_hashes[rel_path]
+
+            if error is not None:
+                print(f"❌ Error cargando {pdf_path.name}: {error}")
+                continue
+
+            parse_times[rel_path] = elapsed
+            print(f"📄 Cargado: {pdf_path.name} (Aseguradora: {pdf_path.parent.name.upper()}, "
+                  f"{len(docs)} págs, {elapsed:.2f}s)")
+
+            # Reanudar una ingesta interrumpida o reemplazar la versión anterior
+            offset = 0 if reprocess else resume_offset(manifest["files"].get(rel_path), content_hash, settings)
+            if offset:
+                print(f"↩️  Reanudando {pdf_path.name} desde el fragmento {offset}")
+            else:
+                _delete_file_chunks(vectorstore, manifest, rel_path, pdf_path, lexical_index)
+
+            page_count = len(docs)
+            chunks = text_splitter.split_documents(docs)
+            del docs
+
+            manifest["files"][rel_path] = {
+                "sha256": content_hash,
+                "insurer": pdf_path.parent.name.upper(),
+                "settings": settings,
+                "pages": page_count,
+                "chunks": len(chunks),
+                "committed": offset,
+                "status": "complete" if offset >= len(chunks) else "partial",
+                "ids": [chunk_id(rel_path, content_hash, i) for i in range(offset)],
+            }
+            save_manifest(manifest)
+
+            for index in range(offset, len(chunks)):
+                yield rel_path, chunk_id(rel_path, content_hash, index), chunks[index]
+
+    # Embedding concurrente + upsert por lotes (en orden, para poder reanudar)
+    if embeddings is None:
+        embeddings = OpenAIEmbeddings(model=EMBEDDING_MODEL, max_retries=0)
+    executor = AsyncEmbeddingExecutor(embeddings, max_concurrency=concurrency)
+
+    async def embed_and_upsert():
+        """
+        Flujo continuo: hasta 2 * concurrency lotes encargados al ejecutor (que limita cuántos
+        van en vuelo según 429/latencia) mientras los ya embebidos se guardan en orden.
+        """
+        total = 0
+        batch_number = 0
+        batches = batched(pending_chunks(), batch_size)
+        queued = deque()
+
+        def fill():
+            while len(queued) < 2 * concurrency:
+                batch = next(batches, None)
+                if batch is None:
+                    return
+                texts = [chunk.page_content for _, _, chunk in batch]
+                queued.append((batch, asyncio.create_task(executor.embed(texts))))
+
+        try:
+            fill()
+            while queued:
+                batch, task = queued.popleft()
+                batch_number += 1
+                try:
+                    vectors = await task
+                except Exception as e:
+                    print(f"❌ Error guardando el lote {batch_number}: {e}")
+                    print("   El progreso confirmado quedó en el manifiesto; vuelve a ejecutar la ingesta para reanudar.")
+                    raise
+
+                # Los lotes siguientes se encargan antes del upsert, que corre en un hilo
+                # para que el event loop siga atendiendo las respuestas en vuelo
+                fill()
+                await asyncio.to_thread(_upsert_batch, vectorstore, batch, vectors, lexical_index)
+                _commit_batch(manifest, batch)
+                save_manifest(manifest)
+                total += len(batch)
+                print(f"💾 Lote {batch_number}: {len(batch)} fragmentos guardados ({total} en total).")
+        finally:
+            for _, task in queued:
+                task.cancel()
+            await asyncio.gather(*(task for _, task in queued), return_exceptions=True)
+        return total
+
+    try:
+        total_chunks = asyncio.run(embed_and_upsert())
+    except BaseException:
+        # Parte del índice ya cambió: las respuestas cacheadas dejan de ser válidas
+        bump_index_generation()
+        raise
+
+    metrics = executor.metrics()
+    print(f"📈 Embeddings: {metrics['requests']} requests, {metrics['requests_per_sec']:.2f} req/s, "
+          f"{metrics['tokens_per_sec']:.0f} tokens/s (estimado), {metrics['rate_limited']} respuestas 429, "
+          f"concurrencia final {metrics['concurrency']}.")
+
+    if parse_times:
+        slowest = sorted(parse_times.items(), key=lambda item: item[1], reverse=True)[:5]
+        print(f"⏱️  Parseo: {sum(parse_times.values()):.2f}s acumulados. Más lentos:")
+        for rel_path, elapsed in slowest:
+            print(f"   - {rel_path}: {elapsed:.2f}s")
+
+    indexed_count = sum(1 for rel_path in to_index
+                        if manifest["files"].get(rel_path, {}).get("status") == "complete")
+    print(f"✅ Ingesta completada: {indexed_count} archivos indexados ({total_chunks} fragmentos), "
+          f"{len(to_remove)} eliminados.")
 
-    # Almacenamiento
-    print(f"💾 Guardando {len(chunks)} fragmentos en ChromaDB...")
-    vectorstore.add_documents(chunks)
-    
-    print("✅ Ingesta completada exitosamente.")
-    return vectorstore
+    # Índice reconstruido: invalidar respuestas cacheadas y descartar recursos del proceso
+    generation = bump_index_generation()
+    print(f"🔁 Generación del índice: {generation}")
+    reset_vectorstore()
+    return get_vectorstore()
 
 if __name__ == "__main__":
     # Reprocesar enviar --reprocess
     force_reprocess = "--reprocess" in sys.argv
-    ingest_documents(reprocess=force_reprocess)
+    # Procesos de parseo: --workers N (por defecto INGEST_WORKERS o núm. de CPUs)
+    parse_workers = DEFAULT_PARSE_WORKERS
+    if "--workers" in sys.argv:
+        parse_workers = int(sys.argv[sys.argv.index("--workers") + 1])
+    # Tamaño de lote de embedding: --batch-size N (por defecto INGEST_BATCH_SIZE o 64)
+    embed_batch_size = DEFAULT_BATCH_SIZE
+    if "--batch-size" in sys.argv:
+        embed_batch_size = int(sys.argv[sys.argv.index("--batch-size") + 1])
+    # Lotes de embedding en paralelo: --concurrency N (por defecto INGEST_EMBED_CONCURRENCY o 4)
+    embed_concurrency = DEFAULT_EMBED_CONCURRENCY
+    if "--concurrency" in sys.argv:
+        embed_concurrency = int(sys.argv[sys.argv.index("--concurrency") + 1])
+    ingest_documents(reprocess=force_reprocess, workers=parse_workers, batch_size=embed_batch_size,
+                     concurrency=embed_concurrency)
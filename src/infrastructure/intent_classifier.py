@@ -0,0 +1,186 @@
+import os
+import sys
+import time
+import math
+from collections import Counter
+from functools import lru_cache
+
+import joblib
+import numpy as np
+from sklearn.pipeline import Pipeline, FeatureUnion
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.calibration import CalibratedClassifierCV
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+from src.core.resources import registry
+from src.core.embedding_cache import normalize_query
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../'))
+# Pipeline entrenado (TF-IDF + regresión logística calibrada); se entrena y guarda si no existe
+INTENT_MODEL_PATH = os.getenv("INTENT_MODEL_PATH", os.path.join(PROJECT_ROOT, "data", "intent_router.joblib"))
+# Probabilidad mínima para aceptar la intención local; por debajo se consulta al LLM
+INTENT_CONFIDENCE = float(os.getenv("INTENT_CONFIDENCE", 0.8))
+# Se incrementa al cambiar el dataset o el pipeline para que los modelos guardados se reentrenen
+MODEL_VERSION = 1
+
+
+def build_pipeline() -> Pipeline:
+    """TF-IDF de palabras y de n-gramas de caracteres (tolera typos) + regresión logística calibrada."""
+    features = FeatureUnion([
+        ("words", TfidfVectorizer(strip_accents="unicode", ngram_range=(1, 2), sublinear_tf=True)),
+        ("chars", TfidfVectorizer(strip_accents="unicode", analyzer="char_wb", ngram_range=(2, 4), sublinear_tf=True)),
+    ])
+    classifier = CalibratedClassifierCV(
+        LogisticRegression(C=10, class_weight="balanced", max_iter=1000),
+        method="sigmoid", cv=5,
+    )
+    return Pipeline([("features", features), ("classifier", classifier)])
+
+
+def train_intent_classifier(path: str = INTENT_MODEL_PATH, seed: int = 42) -> Pipeline:
+    """Entrena el router con el dataset sintético de rules.py y lo guarda con joblib."""
+    from src.infrastructure.rules import crear_dataset_router
+
+    start = time.perf_counter()
+    df = crear_dataset_router(seed=seed)
+    pipeline = build_pipeline().fit(df["text"].map(normalize_query), df["label"])
+    print(f"🧠 Clasificador de intenciones entrenado con {len(df)} frases ({time.perf_counter() - start:.1f}s)")
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        joblib.dump({"version": MODEL_VERSION, "pipeline": pipeline}, path)
+    except OSError as e:
+        print(f"⚠️  No se pudo guardar el clasificador de intenciones: {e}")
+    return pipeline
+
+
+class CompiledScorer:
+    """
+    predict_proba de build_pipeline() para un solo texto, sin el overhead por llamada de sklearn.
+
+    Replica TF-IDF (analizador, tf sublineal, idf y norma L2 de cada vectorizador), la función de
+    decisión de la regresión logística de cada fold y su calibración sigmoide, y promedia los folds
+    igual que CalibratedClassifierCV. Todos los folds se evalúan con un único producto matricial.
+    """
+
+    def __init__(self, pipeline: Pipeline):
+        features = pipeline.named_steps["features"]
+        calibrated = pipeline.named_steps["classifier"].calibrated_classifiers_
+        self.vectorizers = []
+        offset = 0
+        for _, vectorizer in features.transformer_list:
+            self.vectorizers.append((vectorizer.build_analyzer(), vectorizer.vocabulary_, vectorizer.idf_, offset))
+            offset += len(vectorizer.vocabulary_)
+        # (folds × clases, n_features) por columnas: se indexa por los términos presentes en el texto
+        self.weights = np.vstack([fold.estimator.coef_ for fold in calibrated]).T.copy()
+        self.intercepts = np.concatenate([fold.estimator.intercept_ for fold in calibrated])
+        self.a = np.array([c.a_ for fold in calibrated for c in fold.calibrators])
+        self.b = np.array([c.b_ for fold in calibrated for c in fold.calibrators])
+        self.n_folds = len(calibrated)
+
+    @classmethod
+    def compile(cls, pipeline: Pipeline):
+        """Scorer compilado, o None si el pipeline no tiene la forma de build_pipeline()."""
+        try:
+            classes = pipeline.classes_
+            calibrated = pipeline.named_steps["classifier"].calibrated_classifiers_
+            if len(classes) < 3 or any(
+                fold.method != "sigmoid" or list(fold.estimator.classes_) != list(classes) for fold in calibrated
+            ):
+                return None
+            return cls(pipeline)
+        except (AttributeError, KeyError):
+            return None
+
+    def predict_proba(self, text: str) -> np.ndarray:
+        columns, values = [], []
+        for analyzer, vocabulary, idf, offset in self.vectorizers:
+            counts = Counter(term for term in analyzer(text) if term in vocabulary)
+            weights = [(1 + math.log(count)) * idf[vocabulary[term]] for term, count in counts.items()]
+            norm = math.sqrt(sum(w * w for w in weights)) or 1.0
+            columns.extend(offset + vocabulary[term] for term in counts)
+            values.extend(w / norm for w in weights)
+        decision = np.asarray(values) @ self.weights[columns] + self.intercepts
+        proba = (1.0 / (1.0 + np.exp(self.a * decision + self.b))).reshape(self.n_folds, -1)
+        totals = proba.sum(axis=1, keepdims=True)
+        proba = np.divide(proba, totals, out=np.full_like(proba, 1 / proba.shape[1]), where=totals != 0)
+        return proba.mean(axis=0)
+
+
+class IntentClassifier:
+    """
+    Router local SALUDO / EMERGENCIA / CONSULTA con probabilidades calibradas.
+
+    `route` acepta la intención del modelo si su probabilidad alcanza `threshold` y, si no,
+    delega en `fallback` (el LLM). Cada consulta se puntúa con CompiledScorer y las repetidas
+    se resuelven desde una caché LRU; `predict` usa el pipeline de sklearn para lotes.
+    """
+
+    def __init__(self, pipeline: Pipeline, threshold: float = INTENT_CONFIDENCE, cache_size: int = 4096):
+        self.pipeline = pipeline
+        self.threshold = threshold
+        self.labels = list(pipeline.classes_)
+        self.scorer = CompiledScorer.compile(pipeline)
+        self._classify = lru_cache(maxsize=cache_size)(self._predict_one)
+        self.local = 0
+        self.fallbacks = 0
+
+    @classmethod
+    def load_or_train(cls, path: str = INTENT_MODEL_PATH, threshold: float = INTENT_CONFIDENCE):
+        """Carga el pipeline guardado; lo reentrena si no existe, no se puede leer o es de otra versión."""
+        try:
+            saved = joblib.load(path)
+            if saved.get("version") == MODEL_VERSION:
+                return cls(saved["pipeline"], threshold)
+            print("🔄 Clasificador de intenciones desactualizado, reentrenando...")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"⚠️  No se pudo cargar el clasificador de intenciones: {e}")
+        return cls(train_intent_classifier(path), threshold)
+
+    def predict(self, texts: list[str]) -> tuple[list[str], np.ndarray]:
+        """Intención más probable y su probabilidad para cada texto (en lote)."""
+        probabilities = self.pipeline.predict_proba([normalize_query(text) for text in texts])
+        best = probabilities.argmax(axis=1)
+        return [self.labels[i] for i in best], probabilities[np.arange(len(texts)), best]
+
+    def _predict_one(self, key: str) -> tuple[str, float]:
+        if self.scorer is not None:
+            probabilities = self.scorer.predict_proba(key)
+        else:
+            probabilities = self.pipeline.predict_proba([key])[0]
+        best = int(probabilities.argmax())
+        return self.labels[best], float(probabilities[best])
+
+    def classify(self, text: str) -> tuple[str, float]:
+        """(intención, probabilidad) de un texto."""
+        return self._classify(normalize_query(text))
+
+    def route(self, text: str, fallback) -> str:
+        """Intención local si es confiable; en otro caso la que devuelva `fallback(text)`."""
+        label, confidence = self.classify(text)
+        if confidence >= self.threshold:
+            self.local += 1
+            return label
+        self.fallbacks += 1
+        return fallback(text)
+
+    def stats(self) -> dict:
+        """Decisiones locales, derivaciones al LLM y tasa de derivación."""
+        total = self.local + self.fallbacks
+        return {
+            "local": self.local,
+            "fallbacks": self.fallbacks,
+            "fallback_rate": self.fallbacks / total if total else 0.0,
+        }
+
+
+def get_intent_classifier() -> IntentClassifier:
+    """Clasificador compartido por proceso (se carga una sola vez)."""
+    return registry.get("intent_classifier", lambda: IntentClassifier.load_or_train())
+
+
+if __name__ == "__main__":
+    # Reentrena y guarda el pipeline: python src/infrastructure/intent_classifier.py [ruta]
+    train_intent_classifier(sys.argv[1] if len(sys.argv) > 1 else INTENT_MODEL_PATH)
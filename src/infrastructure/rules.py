@@ -1,4 +1,6 @@
 import os 
+import sys
+import time
 import joblib
 import pandas as pd
 import numpy as np
@@ -8,63 +10,68 @@ from sklearn.ensemble import RandomForestClassifier
 from sklearn.model_selection import train_test_split
 from sklearn.linear_model import LogisticRegression
 from sklearn.pipeline import Pipeline
-from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.feature_extraction.text import TfidfVectorizer, HashingVectorizer
+from sklearn.linear_model import SGDClassifier
 from sklearn.metrics import classification_report, confusion_matrix,ConfusionMatrixDisplay
 from sklearn.utils.class_weight import compute_class_weight
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+from src.core.lexical import strip_accents
+
 
 use_sample = True
 
+# Define intents and their templates
+INTENTS = {
+    "consultar_poliza": [
+        "quiero ver mi poliza", "consultar informacion de poliza", "estado de mi seguro",
+        "que cubre mi poliza", "detalles de la poliza de auto", "mostrar mis seguros activos",
+        "tengo seguro de vida?", "vigencia de la poliza", "numero de poliza", "cobertura del seguro","saldre del pais"
+    ],
+    "reportar_emergencia": [
+        "ayuda emergencia", "reportar choque", "tuve un accidente", "necesito una ambulancia",
+        "numero de emergencia", "siniestro de auto", "robo de vehiculo", "asistencia vial urgente",
+        "grua por favor", "me chocaron","me robaron mi auto",
+    ],
+    "pagos": [
+        "donde pago mi seguro", "cuanto debo", "fecha de pago", "pagar en linea",
+        "historial de pagos", "tengo pagos atrasados?", "metodos de pago", "factura del seguro",
+        "costo de la prima", "vencimiento de pago"
+    ],
+    "cotizar": [
+        "quiero un nuevo seguro", "precio de seguro de auto", "cotizar seguro de vida",
+        "contratar poliza nueva", "cuanto cuesta un seguro", "ofertas de seguros",
+        "asegurar mi casa", "cotizacion rapida", "planes disponibles", "comprar seguro"
+    ],
+    "inspeccion_vehicular": [
+        "agendar inspeccion", "coordinar revision de auto", "cita para inspeccion",
+        "revision vehicular", "donde llevo mi auto a revisar", "inspeccion de siniestro",
+        "programar cita de revision", "verificar daños de auto", "cuando puedo llevar mi carro"
+    ],
+    "gestion_reclamos": [
+        "estado de mi reclamo", "como va mi solicitud", "seguimiento de siniestro",
+        "consultar reclamo", "estatus de queja", "reclamo abierto", "resultado de reclamo",
+        "gestion de siniestros", "revisar caso"
+    ],
+    "consultar_banco": [
+        "horario de atencion del banco", "telefono del banco", "contactar al banco",
+        "pagina web del banco", "donde queda el banco", "canales de atencion bancaria",
+        "llamar al banco", "servicio al cliente banco"
+    ]
+}
+
+
 def crear_dataset_rules(n_pos_clas=1000, seed=42):
     random.seed(seed)
     np.random.seed(seed)
 
     print(f"Creating rules dataset with {n_pos_clas} samples per class and seed {seed}")
 
-    # Define intents and their templates
-    intents = {
-    "consultar_poliza": [
-            "quiero ver mi poliza", "consultar informacion de poliza", "estado de mi seguro",
-            "que cubre mi poliza", "detalles de la poliza de auto", "mostrar mis seguros activos",
-            "tengo seguro de vida?", "vigencia de la poliza", "numero de poliza", "cobertura del seguro","saldre del pais"
-        ],
-        "reportar_emergencia": [
-            "ayuda emergencia", "reportar choque", "tuve un accidente", "necesito una ambulancia",
-            "numero de emergencia", "siniestro de auto", "robo de vehiculo", "asistencia vial urgente",
-            "grua por favor", "me chocaron","me robaron mi auto",
-        ],
-        "pagos": [
-            "donde pago mi seguro", "cuanto debo", "fecha de pago", "pagar en linea",
-            "historial de pagos", "tengo pagos atrasados?", "metodos de pago", "factura del seguro",
-            "costo de la prima", "vencimiento de pago"
-        ],
-        "cotizar": [
-            "quiero un nuevo seguro", "precio de seguro de auto", "cotizar seguro de vida",
-            "contratar poliza nueva", "cuanto cuesta un seguro", "ofertas de seguros",
-            "asegurar mi casa", "cotizacion rapida", "planes disponibles", "comprar seguro"
-        ],
-        "inspeccion_vehicular": [
-            "agendar inspeccion", "coordinar revision de auto", "cita para inspeccion",
-            "revision vehicular", "donde llevo mi auto a revisar", "inspeccion de siniestro",
-            "programar cita de revision", "verificar daños de auto", "cuando puedo llevar mi carro"
-        ],
-        "gestion_reclamos": [
-            "estado de mi reclamo", "como va mi solicitud", "seguimiento de siniestro",
-            "consultar reclamo", "estatus de queja", "reclamo abierto", "resultado de reclamo",
-            "gestion de siniestros", "revisar caso"
-        ],
-        "consultar_banco": [
-            "horario de atencion del banco", "telefono del banco", "contactar al banco",
-            "pagina web del banco", "donde queda el banco", "canales de atencion bancaria",
-            "llamar al banco", "servicio al cliente banco"
-        ]
-    }
-
     data = []
     labels = []
 
     # Generate synthetic data
-    for label, templates in intents.items():
+    for label, templates in INTENTS.items():
         # Generate n_pos_clas samples for each class
         # We'll sample with replacement from templates to reach n_pos_clas if needed,
         # but for diversity we might want to augment. For now, simple repetition/sampling.
@@ -82,4 +89,218 @@ def crear_dataset_rules(n_pos_clas=1000, seed=42):
     # Shuffle the dataset
     df = df.sample(frac=1, random_state=seed).reset_index(drop=True)
     
-    return df
\ No newline at end of file
+    return df
+
+
+# Router intents used by advanced_broker_vehicular (SALUDO / EMERGENCIA / CONSULTA).
+# EMERGENCIA and CONSULTA reuse the rules templates and add broker-specific questions.
+ROUTER_INTENTS = {
+    "SALUDO": [
+        "hola", "buenos dias", "buenas tardes", "buenas noches", "que tal", "hola como estas",
+        "gracias", "muchas gracias", "gracias por la ayuda", "te agradezco", "adios", "chau",
+        "hasta luego", "nos vemos", "hasta pronto", "saludos", "hola buen dia", "listo gracias",
+        "eso es todo", "perfecto muchas gracias",
+    ],
+    "EMERGENCIA": INTENTS["reportar_emergencia"] + [
+        "choque mi auto", "acabo de chocar", "me estrelle contra un poste", "me robaron el carro",
+        "se robaron mi camioneta", "mi auto no arranca necesito auxilio mecanico", "se me pincho la llanta",
+        "necesito una grua ahora", "hay heridos en el accidente", "atropelle a alguien",
+        "me quede varado en la carretera", "se incendio mi vehiculo", "me chocaron por detras",
+        "tuve un siniestro ahora mismo", "estoy en un accidente que hago",
+    ],
+    "CONSULTA": INTENTS["consultar_poliza"] + INTENTS["cotizar"] + INTENTS["pagos"] + [
+        "compara {aseguradora} y {otra}", "cual es el deducible de {aseguradora}",
+        "que cubre el seguro vehicular de {aseguradora}", "cuanto cuesta el seguro de {aseguradora}",
+        "la poliza de {aseguradora} cubre robo total", "que exclusiones tiene {aseguradora}",
+        "diferencias entre {aseguradora} y {otra}", "cual es mejor {aseguradora} o {otra}",
+        "cobertura de responsabilidad civil de {aseguradora}", "tiene auxilio mecanico {aseguradora}",
+        "clausulas de la poliza de {aseguradora}", "deducible por robo parcial",
+        "que pasa si choco fuera del pais", "la poliza cubre danos a terceros",
+        "cubre desastres naturales", "cuanto es el deducible por choque",
+    ],
+}
+
+ASEGURADORAS = ["rimac", "pacifico", "mapfre", "la positiva", "interseguro"]
+ROUTER_PREFIXES = ["", "hola ", "oye ", "por favor ", "disculpa ", "una consulta "]
+ROUTER_SUFFIXES = ["", " por favor", " gracias", "?"]
+
+
+def crear_dataset_router(seed=42):
+    """Unique router phrases (template x insurer x prefix/suffix) with their SALUDO/EMERGENCIA/CONSULTA label."""
+    random.seed(seed)
+    rows = {}
+    for label, templates in ROUTER_INTENTS.items():
+        for template in templates:
+            for aseguradora in ASEGURADORAS:
+                otra = random.choice([a for a in ASEGURADORAS if a != aseguradora])
+                text = template.format(aseguradora=aseguradora, otra=otra)
+                for prefix in ROUTER_PREFIXES:
+                    for suffix in ROUTER_SUFFIXES:
+                        # Greetings are not prefixed with another greeting
+                        if label == "SALUDO" and prefix.strip() in ("hola", "una consulta"):
+                            continue
+                        rows.setdefault(prefix + text + suffix, label)
+
+    print(f"Creating router dataset with {len(rows)} unique phrases and seed {seed}")
+
+    df = pd.DataFrame({"text": list(rows), "label": list(rows.values())})
+    return df.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+
+# --- Streaming dataset + out-of-core training ---
+
+VEHICULOS = ["auto", "carro", "camioneta", "moto", "vehículo", "minivan", "taxi", "camión"]
+
+# Templates with paraphrase slots ({aseguradora}, {vehiculo}), added to the INTENTS templates
+SLOT_TEMPLATES = {
+    "consultar_poliza": [
+        "qué cubre mi póliza de {aseguradora}", "mi seguro de {aseguradora} cubre el {vehiculo}?",
+        "vigencia de la póliza del {vehiculo}", "coberturas de {aseguradora} para mi {vehiculo}",
+    ],
+    "reportar_emergencia": [
+        "choqué mi {vehiculo}", "me robaron el {vehiculo}", "necesito grúa para mi {vehiculo}",
+        "accidente con el {vehiculo}, llamen a {aseguradora}", "se malogró mi {vehiculo} en la carretera",
+    ],
+    "pagos": [
+        "cómo pago mi seguro de {aseguradora}", "cuánto debo a {aseguradora}",
+        "fecha de pago del seguro del {vehiculo}", "pagar la prima de {aseguradora} en línea",
+    ],
+    "cotizar": [
+        "cotizar seguro para mi {vehiculo}", "cuánto cuesta asegurar un {vehiculo} con {aseguradora}",
+        "precio del seguro vehicular de {aseguradora}", "quiero asegurar mi {vehiculo}",
+    ],
+    "inspeccion_vehicular": [
+        "agendar inspección del {vehiculo}", "cita de revisión con {aseguradora}",
+        "dónde llevo mi {vehiculo} a inspeccionar", "inspección del {vehiculo} por siniestro",
+    ],
+    "gestion_reclamos": [
+        "estado de mi reclamo con {aseguradora}", "seguimiento del siniestro de mi {vehiculo}",
+        "cómo va mi reclamo del {vehiculo}", "{aseguradora} no responde mi reclamo",
+    ],
+    "consultar_banco": [
+        "teléfono del banco para pagar {aseguradora}", "horario del banco",
+        "canales del banco para el seguro del {vehiculo}", "contactar al banco por mi seguro",
+    ],
+}
+
+TYPO_RATE = 0.15        # fraction of rows with one typo
+ACCENT_STRIP_RATE = 0.5  # fraction of rows written without accents
+
+
+def _typo(text, rng):
+    """One random keyboard slip: swap, drop or duplicate a character."""
+    if len(text) < 4:
+        return text
+    i = int(rng.integers(1, len(text) - 1))
+    op = rng.integers(3)
+    if op == 0:
+        return text[:i - 1] + text[i] + text[i - 1] + text[i + 1:]
+    if op == 1:
+        return text[:i] + text[i + 1:]
+    return text[:i] + text[i] + text[i:]
+
+
+def iter_dataset_rules(n_rows=1_000_000, chunk_size=50_000, seed=42):
+    """
+    Yield the augmented rules dataset as DataFrame chunks (text, label) without holding it in memory.
+
+    Each row picks a class uniformly, one of its templates (INTENTS + SLOT_TEMPLATES), fills the
+    insurer/vehicle slots and randomly strips accents, changes casing and adds a typo.
+    The stream is deterministic for a given seed.
+    """
+    rng = np.random.default_rng(seed)
+    labels = list(INTENTS)
+    templates = [INTENTS[label] + SLOT_TEMPLATES.get(label, []) for label in labels]
+
+    for start in range(0, n_rows, chunk_size):
+        size = min(chunk_size, n_rows - start)
+        label_idx = rng.integers(len(labels), size=size)
+        template_pick = rng.random(size)
+        aseguradoras = rng.integers(len(ASEGURADORAS), size=size)
+        vehiculos = rng.integers(len(VEHICULOS), size=size)
+        strip = rng.random(size) < ACCENT_STRIP_RATE
+        typo = rng.random(size) < TYPO_RATE
+        upper = rng.random(size) < 0.1
+
+        texts = []
+        for j in range(size):
+            options = templates[label_idx[j]]
+            text = options[int(template_pick[j] * len(options))].format(
+                aseguradora=ASEGURADORAS[aseguradoras[j]], vehiculo=VEHICULOS[vehiculos[j]]
+            )
+            if strip[j]:
+                text = strip_accents(text)
+            if typo[j]:
+                text = _typo(text, rng)
+            if upper[j]:
+                text = text.upper()
+            texts.append(text)
+
+        yield pd.DataFrame({"text": texts, "label": [labels[i] for i in label_idx]})
+
+
+def peak_rss_mb():
+    """
+    Peak resident memory of this process in MB (ru_maxrss is KB on Linux, bytes on macOS).
+
+    Returns None where the `resource` module is unavailable (Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def build_hashing_vectorizer(n_features=2**20):
+    """Stateless features: word 1-2 grams hashed into a fixed space (no vocabulary to keep)."""
+    return HashingVectorizer(
+        n_features=n_features, ngram_range=(1, 2), strip_accents="unicode",
+        alternate_sign=False, norm="l2",
+    )
+
+
+def entrenar_rules_streaming(n_rows=1_000_000, chunk_size=50_000, seed=42, n_features=2**20,
+                             eval_rows=20_000, model_path=None):
+    """
+    Out-of-core training: HashingVectorizer + SGDClassifier.partial_fit over the streamed dataset.
+
+    Memory stays flat in n_rows (one chunk at a time, fixed feature space). The model is evaluated
+    on a stream with a different seed and optionally saved with joblib as {"vectorizer", "classifier"}.
+    """
+    vectorizer = build_hashing_vectorizer(n_features)
+    classifier = SGDClassifier(loss="log_loss", alpha=1e-6, random_state=seed)
+    classes = np.array(list(INTENTS))
+
+    print(f"Training rules model on {n_rows} streamed rows (chunks of {chunk_size}, {n_features} features)")
+    start = time.perf_counter()
+    seen = 0
+    for chunk in iter_dataset_rules(n_rows, chunk_size, seed):
+        classifier.partial_fit(vectorizer.transform(chunk["text"]), chunk["label"], classes=classes)
+        seen += len(chunk)
+    elapsed = time.perf_counter() - start
+
+    holdout = pd.concat(iter_dataset_rules(eval_rows, chunk_size, seed + 1))
+    accuracy = float((classifier.predict(vectorizer.transform(holdout["text"])) == holdout["label"]).mean())
+
+    stats = {
+        "rows": seen,
+        "seconds": elapsed,
+        "samples_per_sec": seen / elapsed if elapsed else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+        "holdout_accuracy": accuracy,
+    }
+    peak = "n/a" if stats["peak_rss_mb"] is None else f"{stats['peak_rss_mb']:.0f} MB"
+    print(f"Trained in {elapsed:.1f}s ({stats['samples_per_sec']:,.0f} samples/s), "
+          f"peak RSS {peak}, holdout accuracy {accuracy:.3f}")
+
+    if model_path:
+        joblib.dump({"vectorizer": vectorizer, "classifier": classifier}, model_path)
+    return vectorizer, classifier, stats
+
+
+if __name__ == "__main__":
+    # python src/infrastructure/rules.py [n_rows] [model_path]
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    entrenar_rules_streaming(rows, model_path=sys.argv[2] if len(sys.argv) > 2 else None)
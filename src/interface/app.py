@@ -4,15 +4,15 @@ import os
 import json
 import pandas as pd
 from dotenv import load_dotenv
-import re
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 
 from src.core.auth import verify_user, init_db, create_user
-from src.core.agent import get_agent_executor
+from src.core.agent import get_agent_executor, structured_output
 from src.core.prompts import INSURANCE_COPILOT_PROMPT
-from src.core.security import check_input, check_output, get_random_response, SemanticSecurity
-from src.core.chitchat import SemanticRouter
+from src.core.security import check_input, check_output, get_random_response
+from src.core.semantic_gate import SemanticGate
+from src.core.query_context import query_turn
 
 load_dotenv()
 
@@ -238,80 +238,72 @@ def main_page():
                 st.session_state.messages.append({"role": "assistant", "content": response_text})
 
             else:
-                # --- SEGURIDAD INPUT ---
-                # Validacion por palabras clave
-                is_blocked, phrase = check_input(prompt)
+                # Un solo embedding de la consulta por turno: lo comparten la seguridad
+                # semántica, el chitchat y la primera búsqueda vectorial
+                with query_turn(prompt) as turn:
+                    # --- SEGURIDAD INPUT ---
+                    # Validacion por palabras clave
+                    is_blocked, phrase = check_input(prompt)
+
+                    # Validacion semantica + Interacciones comunes (una sola pasada)
+                    chitchat_response = None
+                    if not is_blocked:
+                        if "semantic_gate" not in st.session_state:
+                             with st.spinner("Inicializando seguridad..."):
+                                st.session_state.semantic_gate = SemanticGate()
+
+                        decision = st.session_state.semantic_gate.evaluate(turn.vector)
+                        is_blocked, phrase = decision.is_blocked, decision.threat_phrase
+                        if decision.intent:
+                            chitchat_response = st.session_state.semantic_gate.get_response(decision.intent)
+
+                    if is_blocked:
+                         response_text = get_random_response()
+                         st.warning(f"Consulta bloqueada por seguridad. Tema detectado: {phrase}")
+                         st.session_state.messages.append({"role": "assistant", "content": response_text})
+                         st.markdown(response_text)
                 
-                # Validacion semantica
-                if not is_blocked:
-                    if "semantic_security" not in st.session_state:
-                         with st.spinner("Inicializando seguridad..."):
-                            st.session_state.semantic_security = SemanticSecurity()
-                    
-                    is_blocked, phrase, score = st.session_state.semantic_security.check_semantic_similarity(prompt)
-                
-                #Interacciones comunes
-                chitchat_response = None
-                if not is_blocked:
-                    if "semantic_chitchat" not in st.session_state:
-                        st.session_state.semantic_chitchat = SemanticRouter()
-                    
-                    intent, score = st.session_state.semantic_chitchat.detect_intent(prompt)
-                    if intent:
-                        chitchat_response = st.session_state.semantic_chitchat.get_response(intent)
-
-                if is_blocked:
-                     response_text = get_random_response()
-                     st.warning(f"Consulta bloqueada por seguridad. Tema detectado: {phrase}")
-                     st.session_state.messages.append({"role": "assistant", "content": response_text})
-                     st.markdown(response_text)
-                
-                elif chitchat_response:
-                    st.session_state.messages.append({"role": "assistant", "content": chitchat_response})
-                    st.markdown(chitchat_response)
-
-                else:
-                    with st.spinner("Analizando..."):
-                        try:
-                            agent = get_agent_executor()
-                            system_prompt = INSURANCE_COPILOT_PROMPT
-                            langchain_messages = [system_prompt]
-                            
-                            for m in st.session_state.messages[-4:]:
-                                content = json.dumps(m["content"]) if isinstance(m["content"], dict) else m["content"]
-                                langchain_messages.append((m["role"], content))
-
-                            response = agent.invoke({"messages": langchain_messages})
-                            output = response['messages'][-1].content
+                    elif chitchat_response:
+                        st.session_state.messages.append({"role": "assistant", "content": chitchat_response})
+                        st.markdown(chitchat_response)
+
+                    else:
+                        with st.spinner("Analizando..."):
+                            try:
+                                agent = get_agent_executor()
+                                system_prompt = INSURANCE_COPILOT_PROMPT
+                                langchain_messages = [system_prompt]
                             
-                            # --- SEGURIDAD OUTPUT ---
-                            is_blocked_out, phrase_out = check_output(output)
-                            if is_blocked_out:
-                                final_output = get_random_response()
-                                st.warning(f"Respuesta bloqueada. Contenido no permitido detectado.")
-                            else:
-                                final_output = output
-
-                            is_json = False
-                            if not is_blocked_out:
-                                try:
-                                    json_match = re.search(r'\{[\s\S]*\}', final_output)
-                                    if json_match:
-                                        parsed = json.loads(json_match.group(0))
-                                        if "comparison" in parsed:
-                                            final_output = parsed
-                                            is_json = True
-                                except: pass
-
-                            if is_json:
-                                render_comparison(final_output)
-                            else:
-                                st.markdown(str(final_output))
-
-                            st.session_state.messages.append({"role": "assistant", "content": final_output})
-
-                        except Exception as e:
-                            st.error(f"Error: {e}")
+                                for m in st.session_state.messages[-4:]:
+                                    content = json.dumps(m["content"]) if isinstance(m["content"], dict) else m["content"]
+                                    langchain_messages.append((m["role"], content))
+
+                                response = agent.invoke({"messages": langchain_messages})
+                                # compare_policies retorna su dict directamente (sin pasada final del LLM)
+                                data = structured_output(response['messages'])
+                                output = json.dumps(data, ensure_ascii=False) if data else response['messages'][-1].content
+
+                                # --- SEGURIDAD OUTPUT ---
+                                is_blocked_out, phrase_out = check_output(output)
+                                if is_blocked_out:
+                                    final_output = get_random_response()
+                                    st.warning(f"Respuesta bloqueada. Contenido no permitido detectado.")
+                                elif data and "comparison" in data:
+                                    final_output = data
+                                elif data:
+                                    final_output = f"No se pudo generar el comparativo: {data.get('error', '')}"
+                                else:
+                                    final_output = output
+
+                                if isinstance(final_output, dict):
+                                    render_comparison(final_output)
+                                else:
+                                    st.markdown(str(final_output))
+
+                                st.session_state.messages.append({"role": "assistant", "content": final_output})
+
+                            except Exception as e:
+                                st.error(f"Error: {e}")
 
 def render_comparison(data):
     feature = data.get("feature", "Comparativo")
@@ -0,0 +1,346 @@
+import sys
+import os
+import time
+import asyncio
+import threading
+from itertools import cycle
+from unittest.mock import patch
+
+import httpx
+from langchain_core.messages import AIMessage
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langgraph.prebuilt import create_react_agent
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.infrastructure.api import api
+
+LLM_LATENCY = 0.3
+
+
+class SlowFakeChatModel(GenericFakeChatModel):
+    """LLM simulado con latencia fija y soporte mínimo de herramientas para el agente ReAct."""
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _generate(self, *args, **kwargs):
+        time.sleep(LLM_LATENCY)
+        return super()._generate(*args, **kwargs)
+
+    async def _agenerate(self, *args, **kwargs):
+        await asyncio.sleep(LLM_LATENCY)
+        return GenericFakeChatModel._generate(self, *args, **kwargs)
+
+
+def _stub_agent():
+    llm = SlowFakeChatModel(messages=cycle([AIMessage(content="Respuesta simulada")]))
+    return create_react_agent(llm, [])
+
+
+async def _post_many(n):
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await asyncio.gather(*(
+            client.post("/chat", json={"query": f"consulta {i}"}) for i in range(n)
+        ))
+
+
+@patch.object(api, "get_agent_executor")
+def test_chat_no_bloquea_el_event_loop(mock_get_agent):
+    mock_get_agent.return_value = _stub_agent()
+    n_requests = 8
+
+    start = time.perf_counter()
+    responses = asyncio.run(_post_many(n_requests))
+    elapsed = time.perf_counter() - start
+
+    assert all(r.status_code == 200 for r in responses)
+    assert all(r.json()["response"] == "Respuesta simulada" for r in responses)
+    # En paralelo: ~1x la latencia del LLM, no n_requests x
+    assert elapsed < LLM_LATENCY * 3
+
+
+class Overlap:
+    """Registra las esperas simuladas (E/S) y cuántas coinciden en el tiempo."""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.active = self.peak = self.count = 0
+        self._lock = threading.Lock()
+
+    def _enter(self):
+        with self._lock:
+            self.active += 1
+            self.count += 1
+            self.peak = max(self.peak, self.active)
+
+    def _exit(self):
+        with self._lock:
+            self.active -= 1
+
+    def sleep(self):
+        self._enter()
+        try:
+            time.sleep(self.delay)
+        finally:
+            self._exit()
+
+    async def asleep(self):
+        self._enter()
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self._exit()
+
+
+@patch.object(api, "get_agent_executor")
+def test_chat_ejecuta_herramientas_async_en_paralelo(mock_get_agent, monkeypatch, tmp_path):
+    from langchain_core.documents import Document
+    from langchain_core.runnables import RunnableLambda
+    from src.core.tools import rag_tool, comparator
+    from src.core.answer_cache import SemanticAnswerCache
+    from src.core.comparison_cache import ComparisonCache
+    from src.core.coverage_facts import CoverageFacts
+
+    io = Overlap(delay=0.2)
+
+    class SlowVectorStore:
+        def similarity_search_by_vector_with_relevance_scores(self, vector, k, filter=None):
+            io.sleep()
+            return [(Document(page_content=f"fragmento {i}", metadata={"insurer": "RIMAC"}), 0.2 + 0.01 * i)
+                    for i in range(k)]
+
+        def _select_relevance_score_fn(self):
+            return lambda distance: 1 - distance
+
+    async def aembed(text):
+        await io.asleep()
+        return [1.0, 0.0]
+
+    def lexical(query, k, filter=None):
+        io.sleep()
+        return []
+
+    async def answer(inputs):
+        await io.asleep()
+        return {"feature": inputs["feature"], "comparison": []} if "feature" in inputs else "respuesta"
+
+    store = SlowVectorStore()
+    for module in (rag_tool, comparator):
+        monkeypatch.setattr(module, "get_vectorstore", lambda: store)
+        monkeypatch.setattr(module, "aembed_query", aembed)
+        monkeypatch.setattr(module, "get_index_generation", lambda: 0)
+    monkeypatch.setattr(rag_tool, "lexical_search", lexical)
+    monkeypatch.setattr(rag_tool, "append_query_log", lambda query: None)
+    monkeypatch.setattr(rag_tool, "get_answer_cache", lambda: SemanticAnswerCache())
+    monkeypatch.setattr(rag_tool, "_answer_chain", lambda: RunnableLambda(answer))
+    monkeypatch.setattr(comparator, "_comparison_chain", lambda: RunnableLambda(answer))
+    monkeypatch.setattr(comparator, "get_comparison_cache", lambda: ComparisonCache())
+    monkeypatch.setattr(comparator, "get_coverage_facts", lambda: CoverageFacts(str(tmp_path / "facts.sqlite")))
+
+    # El LLM pide ambas herramientas en la misma respuesta; el ToolNode las corre a la vez
+    tool_calls = AIMessage(content="", tool_calls=[
+        {"name": "consult_policy", "args": {"query": "deducible"}, "id": "c1"},
+        {"name": "compare_policies", "args": {"feature": "deducible", "insurers": ["RIMAC", "MAPFRE"]}, "id": "c2"},
+    ])
+    llm = SlowFakeChatModel(messages=iter([tool_calls, AIMessage(content="listo")]), disable_streaming=True)
+    mock_get_agent.return_value = create_react_agent(llm, [rag_tool.consult_policy, comparator.compare_policies])
+
+    start = time.perf_counter()
+    responses = asyncio.run(_post_many(1))
+    elapsed = time.perf_counter() - start - 2 * LLM_LATENCY
+
+    assert responses[0].status_code == 200
+    # consult_policy: embed, vector, BM25, respuesta; compare_policies: embed, 2 x (vector + BM25), LLM
+    assert io.count == 10
+    assert io.peak >= 3
+    # En serie serían 10 esperas; con las herramientas y las búsquedas superpuestas, ~4
+    assert elapsed < io.count * io.delay / 2
+
+async def _stream(query):
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.post("/chat/stream", json={"query": query})
+        return response.headers["content-type"], response.text
+
+
+@patch.object(api, "get_agent_executor")
+def test_chat_stream_emite_tokens_y_evento_final(mock_get_agent):
+    mock_get_agent.return_value = _stub_agent()
+
+    content_type, body = asyncio.run(_stream("hola"))
+
+    events = [block.split("\n")[0].removeprefix("event: ") for block in body.strip().split("\n\n")]
+    assert content_type.startswith("text/event-stream")
+    assert "token" in events
+    assert events[-1] == "final"
+    assert '"response": "Respuesta simulada"' in body.strip().split("\n\n")[-1]
+
+
+
+@patch.object(api, "get_agent_executor")
+def test_chat_stream_comparte_el_embedding_del_turno(mock_get_agent):
+    from langchain_core.tools import StructuredTool
+    from src.core.query_context import current_query_embedding
+
+    turnos = []
+
+    def consult_policy(query: str) -> str:
+        turnos.append(current_query_embedding())
+        return "ok"
+
+    tool = StructuredTool.from_function(func=consult_policy, name="consult_policy",
+                                        description="Consulta pólizas.", return_direct=True)
+    tool_call = AIMessage(content="", tool_calls=[{"name": "consult_policy", "args": {"query": "deducible"}, "id": "c1"}])
+    llm = SlowFakeChatModel(messages=iter([tool_call]), disable_streaming=True)
+    mock_get_agent.return_value = create_react_agent(llm, [tool])
+
+    asyncio.run(_stream("¿Cuál es el deducible?"))
+
+    assert len(turnos) == 1 and turnos[0] is not None
+    assert turnos[0].text == "¿Cuál es el deducible?"
+
+def test_coverage_sirve_matriz_precalculada(monkeypatch, tmp_path):
+    from src.core.tools import comparator
+    from src.core.coverage_facts import CoverageFacts
+    from src.core.comparison_cache import ComparisonCache
+
+    facts = CoverageFacts(str(tmp_path / "facts.sqlite"))
+    facts.upsert("deducible", {"RIMAC": {"value": "10%", "details": "", "source": "Pág 3"}}, generation=0)
+    monkeypatch.setattr(comparator, "get_coverage_facts", lambda: facts)
+    monkeypatch.setattr(comparator, "get_comparison_cache", lambda: ComparisonCache())
+    monkeypatch.setattr(comparator, "get_index_generation", lambda: 0)
+
+    async def get():
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/coverage", params={"feature": "Deducible", "insurers": "rimac"})
+
+    response = asyncio.run(get())
+
+    assert response.status_code == 200
+    assert response.json()["comparison"][0]["value"] == "10%"
+    assert response.json()["origins"] == {"RIMAC": "precomputed"}
+
+
+@patch.object(api, "get_agent_executor")
+def test_chat_devuelve_el_comparativo_sin_pasada_final_del_llm(mock_get_agent):
+    from langchain_core.tools import StructuredTool
+
+    comparison = {"feature": "deducible", "comparison": [{"insurer": "RIMAC", "value": "10%"}]}
+    tool = StructuredTool.from_function(
+        func=lambda feature, insurers: ("{}", comparison),
+        name="compare_policies",
+        description="Compara pólizas.",
+        response_format="content_and_artifact",
+        return_direct=True,
+    )
+    tool_call = AIMessage(content="", tool_calls=[{
+        "name": "compare_policies", "args": {"feature": "deducible", "insurers": ["RIMAC"]}, "id": "c1"
+    }])
+    llm = SlowFakeChatModel(messages=iter([tool_call]), disable_streaming=True)
+    mock_get_agent.return_value = create_react_agent(llm, [tool])
+
+    async def post():
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/chat", json={"query": "compara el deducible"})
+
+    response = asyncio.run(post())
+
+    # Una sola llamada al LLM (la que elige la herramienta); el iterador no tiene una segunda
+    assert response.status_code == 200
+    assert response.json()["data"] == comparison
+
+
+
+def test_structured_output_busca_el_comparativo_en_el_turno_actual():
+    from langchain_core.messages import HumanMessage, ToolMessage
+    from src.core.agent import structured_output
+
+    comparison = {"feature": "deducible", "comparison": []}
+    calls = AIMessage(content="", tool_calls=[
+        {"name": "compare_policies", "args": {}, "id": "c1"},
+        {"name": "consult_policy", "args": {}, "id": "c2"},
+    ])
+    compare = ToolMessage(content="{}", name="compare_policies", tool_call_id="c1", artifact=comparison)
+    consult = ToolMessage(content="texto", name="consult_policy", tool_call_id="c2", artifact={"k": 5})
+
+    # Llamadas en paralelo: el comparativo no es el último mensaje
+    assert structured_output([HumanMessage("compara"), calls, compare, consult]) == comparison
+    # Sin retorno directo el turno termina con la respuesta del LLM
+    assert structured_output([HumanMessage("compara"), calls, compare, consult, AIMessage("listo")]) == comparison
+    # Un comparativo de un turno anterior no se reutiliza
+    assert structured_output([HumanMessage("compara"), calls, compare, AIMessage("listo"),
+                              HumanMessage("gracias"), AIMessage("de nada")]) is None
+
+def test_search_filtra_pagina_y_atiende_lotes(monkeypatch, tmp_path):
+    from langchain_chroma import Chroma
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from src.core.embedding_cache import CachedEmbeddings
+
+    fake = DeterministicFakeEmbedding(size=16)
+    store = Chroma(collection_name="test_search", embedding_function=fake, persist_directory=str(tmp_path))
+    texts = [f"{insurer} cláusula {i}" for insurer in ("RIMAC", "MAPFRE") for i in range(4)]
+    store.add_texts(texts, metadatas=[
+        {"insurer": text.split()[0], "source": "poliza.pdf", "page": i} for i, text in enumerate(texts)
+    ])
+    embeddings = CachedEmbeddings(fake, model="fake", dimensions=16)
+    monkeypatch.setattr(api, "get_vectorstore", lambda: store)
+    monkeypatch.setattr(api, "get_embeddings", lambda: embeddings)
+
+    async def post():
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            single = await client.post("/search", json={"query": "cláusula", "insurer": "rimac", "k": 3})
+            batch = await client.post("/search/batch", json={"queries": [
+                {"query": "cláusula", "insurer": "rimac", "k": 3, "offset": 3},
+                {"query": "otra consulta", "source": "poliza.pdf", "k": 2},
+            ]})
+            return single, batch
+
+    single, batch = asyncio.run(post())
+
+    assert single.status_code == 200
+    hits = single.json()["results"]
+    assert len(hits) == 3 and single.json()["has_more"]
+    assert {hit["insurer"] for hit in hits} == {"RIMAC"}
+    assert hits[0]["source"] == "poliza.pdf" and hits[0]["page"] is not None
+
+    assert batch.status_code == 200
+    first, second = batch.json()
+    assert len(first["results"]) == 1 and not first["has_more"]
+    assert len(second["results"]) == 2
+    # "cláusula" ya estaba en caché; solo "otra consulta" se embebió
+    assert embeddings.stats()["misses"] == 2
+
+
+def test_rules_chat_mantiene_sesiones(monkeypatch, tmp_path):
+    import json
+    from src.infrastructure.chatbot_rules import ServidorReglas
+
+    path = tmp_path / "flujos.json"
+    path.write_text(json.dumps({
+        "configuracion": {"umbral_similitud": 0.6, "mensaje_no_entendido": "No entendí",
+                          "mensaje_bienvenida": "", "mensaje_despedida": ""},
+        "flujos": {"general": {"intenciones": [
+            {"id": "saludo", "patrones": ["hola"], "respuestas": ["¡Hola!"]},
+            {"id": "despedida", "patrones": ["adios"], "respuestas": ["Chau"], "accion_especial": "terminar"},
+        ]}},
+    }), encoding="utf-8")
+    server = ServidorReglas(str(path))
+    monkeypatch.setattr(api, "get_rules_server", lambda: server)
+
+    async def post():
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            first = (await client.post("/rules/chat", json={"message": "Hola!"})).json()
+            second = (await client.post("/rules/chat", json={"message": "adiós", "session_id": first["session_id"]})).json()
+            return first, second
+
+    first, second = asyncio.run(post())
+
+    assert first["response"] == "¡Hola!" and first["last_intent"] == "saludo" and not first["end"]
+    assert second["session_id"] == first["session_id"] and second["end"]
+    assert server.stats()["sesiones"] == 0
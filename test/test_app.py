@@ -64,3 +64,42 @@ def test_simple_math():
 def test_import_success():
     assert clasificar_intencion is not None
 
+
+
+def test_indice_faiss_persistido_por_huella(tmp_path):
+    import shutil
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from advanced_broker_vehicular import cargar_o_construir_indice
+
+    class CountingEmbeddings(DeterministicFakeEmbedding):
+        calls: int = 0
+
+        def embed_documents(self, texts):
+            self.calls += 1
+            return super().embed_documents(texts)
+
+    pdf = tmp_path / "poliza.pdf"
+    shutil.copy(os.path.join(os.path.dirname(__file__), "../data/rimac/0005000059_cag_r01.pdf"), pdf)
+    index_dir = tmp_path / "faiss"
+    embeddings = CountingEmbeddings(size=16)
+
+    built = cargar_o_construir_indice([str(pdf)], embeddings, index_dir=str(index_dir))
+    loaded = cargar_o_construir_indice([str(pdf)], embeddings, index_dir=str(index_dir))
+
+    # La segunda carga sale del disco sin volver a embeber
+    assert embeddings.calls == 1
+    assert loaded.index.ntotal == built.index.ntotal > 0
+    assert loaded.similarity_search("cobertura", k=1)
+
+    # Cambia el contenido: nueva huella, se reconstruye y se elimina el índice anterior,
+    # pero no el temporal que otro proceso está guardando ni archivos ajenos
+    anterior = os.listdir(index_dir)[0]
+    os.makedirs(index_dir / "0123456789abcdef.tmp-99999")
+    (index_dir / "notas.txt").write_text("x")
+    with open(pdf, "ab") as f:
+        f.write(b"\n%")
+    cargar_o_construir_indice([str(pdf)], embeddings, index_dir=str(index_dir))
+    assert embeddings.calls == 2
+    entries = os.listdir(index_dir)
+    assert anterior not in entries and len(entries) == 3
+    assert {"0123456789abcdef.tmp-99999", "notas.txt"} <= set(entries)
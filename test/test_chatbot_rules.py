@@ -0,0 +1,159 @@
+import sys
+import os
+import json
+import random
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.infrastructure.chatbot_rules import ChatbotReglas, AlmacenSesiones, ServidorReglas
+
+PALABRAS = ["hola", "seguro", "poliza", "auto", "choque", "pago", "cuota", "robo", "grua", "precio",
+            "cobertura", "deducible", "quiero", "mi", "de", "el", "ayuda", "gracias", "adios", "rimac"]
+
+
+def escribir_flujos(path, n_intenciones=40, seed=0):
+    rng = random.Random(seed)
+    intenciones = [
+        {
+            "id": f"i{n}",
+            "patrones": [" ".join(rng.sample(PALABRAS, rng.randint(1, 4))) for _ in range(5)] + ["¿Qué tal?", "ok"],
+            "respuestas": [f"respuesta {n}"],
+        }
+        for n in range(n_intenciones)
+    ]
+    data = {
+        "configuracion": {"umbral_similitud": 0.6, "mensaje_no_entendido": "?",
+                          "mensaje_bienvenida": "", "mensaje_despedida": ""},
+        "flujos": {"a": {"intenciones": intenciones[:20]}, "b": {"intenciones": intenciones[20:]}},
+    }
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+
+
+def busqueda_lineal(bot, mensaje):
+    """Algoritmo original: compara el mensaje con cada patrón de cada flujo."""
+    mejor = (None, 0, None)
+    for nombre_flujo, flujo in bot.flujos.items():
+        for intencion in flujo['intenciones']:
+            for patron in intencion['patrones']:
+                patron_normalizado = bot.normalizar_texto(patron)
+                score = bot.calcular_similitud(mensaje, patron_normalizado)
+                if patron_normalizado in mensaje:
+                    score = max(score, 0.8)
+                if all(palabra in mensaje.split() for palabra in patron_normalizado.split()):
+                    score = max(score, 0.85)
+                if score > mejor[1]:
+                    mejor = (intencion, score, nombre_flujo)
+    return mejor
+
+
+def test_indice_reproduce_la_busqueda_lineal(tmp_path):
+    path = tmp_path / "flujos.json"
+    escribir_flujos(path)
+    bot = ChatbotReglas(archivo_flujos=str(path))
+    rng = random.Random(1)
+
+    mensajes = ["", "ok", "hola que tal", "me robaron el auto, ayuda", "cuanto es el deducible de rimac"]
+    mensajes += [" ".join(rng.choices(PALABRAS + ["xyz", "carro", "chocaron"], k=rng.randint(1, 6))) for _ in range(200)]
+    for mensaje in mensajes:
+        mensaje = bot.normalizar_texto(mensaje)
+        esperado = busqueda_lineal(bot, mensaje)
+        intencion, score, flujo = bot.buscar_mejor_intencion(mensaje)
+        assert (intencion and intencion['id'], score, flujo) == (esperado[0] and esperado[0]['id'], esperado[1], esperado[2])
+
+
+def test_sesiones_acotadas_por_lru_ttl_e_historial(monkeypatch):
+    from src.infrastructure import chatbot_rules
+
+    reloj = [0.0]
+    monkeypatch.setattr(chatbot_rules.time, "monotonic", lambda: reloj[0])
+    sesiones = AlmacenSesiones(max_sesiones=2, ttl=10, max_historial=3)
+
+    contexto = sesiones.obtener("a")
+    contexto["historial"].extend(["1", "2", "3", "4"])
+    assert list(sesiones.obtener("a")["historial"]) == ["2", "3", "4"]
+
+    sesiones.obtener("b")
+    sesiones.obtener("a")
+    sesiones.obtener("c")           # desaloja "b", la menos usada
+    assert sesiones.stats()["desalojadas"] == 1
+    assert sesiones.obtener("a") is contexto
+
+    reloj[0] = 11
+    assert sesiones.obtener("a") is not contexto
+    assert sesiones.stats()["vencidas"] == 1
+
+
+def test_servidor_sesiones_independientes_y_recarga_en_caliente(tmp_path, monkeypatch):
+    import threading
+    from src.infrastructure import chatbot_rules
+
+    path = tmp_path / "flujos.json"
+    escribir_flujos(path)
+    servidor = ServidorReglas(str(path), intervalo_recarga=0)
+    patron = servidor.bot.flujos["a"]["intenciones"][0]["patrones"][0]
+
+    primera = servidor.responder("s1", patron)
+    assert primera["ultima_intencion"] == "i0" and primera["flujo_actual"] == "a"
+    assert servidor.responder("s2", "zzzz")["ultima_intencion"] is None
+
+    # Nueva versión del archivo: se compila y reemplaza sin afectar las sesiones existentes
+    data = json.loads(path.read_text(encoding="utf-8"))
+    data["flujos"]["a"]["intenciones"][0]["patrones"] = ["renovar mi soat"]
+    data["flujos"]["a"]["intenciones"][0]["id"] = "soat"
+    path.write_text(json.dumps(data), encoding="utf-8")
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 10**9))
+    anterior = servidor.bot
+
+    # La compilación corre en otro hilo: la petición que detecta el cambio no la espera
+    compilar, liberar = chatbot_rules.compilar_flujos, threading.Event()
+    monkeypatch.setattr(chatbot_rules, "compilar_flujos", lambda ruta: liberar.wait(5) and compilar(ruta))
+    assert servidor.responder("s1", "renovar mi soat")["ultima_intencion"] != "soat"
+    assert servidor.bot is anterior
+    liberar.set()
+    servidor._hilo_recarga.join(5)
+
+    assert servidor.responder("s1", "renovar mi soat")["ultima_intencion"] == "soat"
+    assert servidor.bot is not anterior and servidor.recargas == 1
+    assert len(servidor.sesiones.obtener("s1")["historial"]) == 3
+
+    # Un archivo inválido no reemplaza la versión vigente
+    path.write_text("{", encoding="utf-8")
+    assert servidor.recargar() is False
+    assert servidor.responder("s3", "renovar mi soat")["ultima_intencion"] == "soat"
+
+
+def test_servidor_serializa_mensajes_de_una_misma_sesion(tmp_path):
+    import threading
+    import time
+    from collections import defaultdict
+
+    path = tmp_path / "flujos.json"
+    escribir_flujos(path)
+    servidor = ServidorReglas(str(path), sesiones=AlmacenSesiones(max_historial=None), intervalo_recarga=3600)
+
+    procesar, activos, pico, lock = servidor.bot.procesar_mensaje, defaultdict(int), defaultdict(int), threading.Lock()
+
+    def procesar_lento(mensaje, contexto):
+        sesion = id(contexto)
+        with lock:
+            activos[sesion] += 1
+            pico[sesion] = max(pico[sesion], activos[sesion])
+        time.sleep(0.01)
+        try:
+            return procesar(mensaje, contexto)
+        finally:
+            with lock:
+                activos[sesion] -= 1
+
+    servidor.bot.procesar_mensaje = procesar_lento
+    hilos = [threading.Thread(target=servidor.responder, args=(f"s{n % 2}", f"mensaje {n}")) for n in range(20)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join(10)
+
+    # Cada sesión procesa un mensaje a la vez y su historial conserva todos los suyos
+    assert max(pico.values()) == 1 and len(pico) == 2
+    for n in range(2):
+        historial = servidor.sesiones.obtener(f"s{n}")["historial"]
+        assert sorted(historial) == sorted(f"mensaje {i}" for i in range(n, 20, 2))
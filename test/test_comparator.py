@@ -0,0 +1,117 @@
+import sys
+import os
+import json
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_core.runnables import RunnableLambda
+
+from src.core.tools import comparator
+from src.core.comparison_cache import ComparisonCache
+from src.core.coverage_facts import CoverageFacts
+
+
+def _fake_chain(calls):
+    def extract(inputs):
+        insurers = [line.split()[2] for line in inputs["context_json"].splitlines()
+                    if line.startswith("--- CONTEXTO")]
+        calls.append(insurers)
+        return {"feature": inputs["feature"],
+                "comparison": [{"insurer": name, "value": f"valor {name}"} for name in insurers]}
+    return RunnableLambda(extract)
+
+
+def test_reutiliza_aseguradoras_ya_comparadas(monkeypatch, tmp_path):
+    calls, cache = [], ComparisonCache()
+    facts = CoverageFacts(str(tmp_path / "facts.sqlite"))
+    monkeypatch.setattr(comparator, "get_comparison_cache", lambda: cache)
+    monkeypatch.setattr(comparator, "get_coverage_facts", lambda: facts)
+    monkeypatch.setattr(comparator, "get_index_generation", lambda: 1)
+    monkeypatch.setattr(comparator, "retrieve_by_insurer", lambda feature, keys: {k: [] for k in keys})
+    monkeypatch.setattr(comparator, "_comparison_chain", lambda: _fake_chain(calls))
+
+    comparator.compare_policies.invoke({"feature": "Deducible", "insurers": ["rimac", "MAPFRE"]})
+    result = json.loads(comparator.compare_policies.invoke(
+        {"feature": "deducible ", "insurers": ["RIMAC", "MAPFRE", "Pacifico"]}
+    ))
+
+    # Solo PACIFICO se extrae de nuevo; el orden respeta la petición
+    assert calls == [["RIMAC", "MAPFRE"], ["PACIFICO"]]
+    assert [e["insurer"] for e in result["comparison"]] == ["RIMAC", "MAPFRE", "PACIFICO"]
+
+    # Mismo conjunto: sin búsquedas ni LLM; nueva generación del índice: se recalcula
+    comparator.compare_policies.invoke({"feature": "deducible", "insurers": ["PACIFICO", "RIMAC"]})
+    assert len(calls) == 2
+    monkeypatch.setattr(comparator, "get_index_generation", lambda: 2)
+    comparator.compare_policies.invoke({"feature": "deducible", "insurers": ["RIMAC"]})
+    assert calls[-1] == ["RIMAC"]
+
+
+def test_matriz_precalculada_evita_la_extraccion_en_vivo(monkeypatch, tmp_path):
+    calls = []
+    facts = CoverageFacts(str(tmp_path / "facts.sqlite"))
+    facts.upsert("Deducible", {"RIMAC": {"value": "10%", "details": "", "source": "Pág 3"}}, generation=1)
+    monkeypatch.setattr(comparator, "get_comparison_cache", lambda: ComparisonCache())
+    monkeypatch.setattr(comparator, "get_coverage_facts", lambda: facts)
+    monkeypatch.setattr(comparator, "get_index_generation", lambda: 1)
+    monkeypatch.setattr(comparator, "retrieve_by_insurer", lambda feature, keys: {k: [] for k in keys})
+    monkeypatch.setattr(comparator, "_comparison_chain", lambda: _fake_chain(calls))
+
+    result = json.loads(comparator.compare_policies.invoke({"feature": "deducible", "insurers": ["Rimac", "MAPFRE"]}))
+    assert calls == [["MAPFRE"]]
+    assert result["comparison"][0] == {"insurer": "RIMAC", "value": "10%", "details": "", "source": "Pág 3"}
+
+    # Filas de una generación anterior del índice no se sirven
+    assert facts.lookup("deducible", ["RIMAC"], generation=2) == {}
+
+
+def test_no_asigna_entradas_por_posicion(monkeypatch, tmp_path):
+    cache = ComparisonCache()
+    monkeypatch.setattr(comparator, "get_comparison_cache", lambda: cache)
+    monkeypatch.setattr(comparator, "get_coverage_facts", lambda: CoverageFacts(str(tmp_path / "facts.sqlite")))
+    monkeypatch.setattr(comparator, "get_index_generation", lambda: 1)
+    monkeypatch.setattr(comparator, "retrieve_by_insurer", lambda feature, keys: {k: [] for k in keys})
+
+    # Orden cambiado y nombre con tilde: cada entrada va a su aseguradora por nombre
+    output = {"comparison": [{"insurer": "MAPFRE", "value": "5%"}, {"insurer": "Rímac Seguros", "value": "10%"}]}
+    monkeypatch.setattr(comparator, "_comparison_chain", lambda: RunnableLambda(lambda inputs: output))
+    result = json.loads(comparator.compare_policies.invoke({"feature": "deducible", "insurers": ["RIMAC", "MAPFRE"]}))
+    assert [(e["insurer"], e["value"]) for e in result["comparison"]] == [("Rímac Seguros", "10%"), ("MAPFRE", "5%")]
+    assert cache.get_many("deducible", ["RIMAC"], 1)["RIMAC"]["value"] == "10%"
+
+    # Una entrada que no nombra a la aseguradora no se le asigna ni se cachea
+    output = {"comparison": [{"insurer": "MAPFRE", "value": "5%"}, {"insurer": "Otra", "value": "1%"}]}
+    result = json.loads(comparator.compare_policies.invoke({"feature": "franquicia", "insurers": ["PACIFICO", "MAPFRE"]}))
+    assert result["comparison"][0]["value"] == "No especificado"
+    assert cache.get_many("franquicia", ["PACIFICO"], 1) == {}
+
+
+def test_conserva_entradas_conocidas_si_la_extraccion_no_aporta(monkeypatch, tmp_path):
+    import asyncio
+
+    facts = CoverageFacts(str(tmp_path / "facts.sqlite"))
+    facts.upsert("Deducible", {"RIMAC": {"value": "10%", "details": "", "source": "Pág 3"}}, generation=1)
+    monkeypatch.setattr(comparator, "get_comparison_cache", lambda: ComparisonCache())
+    monkeypatch.setattr(comparator, "get_coverage_facts", lambda: facts)
+    monkeypatch.setattr(comparator, "get_index_generation", lambda: 1)
+
+    async def fake_aretrieve(feature, keys):
+        return {k: [] for k in keys}
+
+    monkeypatch.setattr(comparator, "aretrieve_by_insurer", fake_aretrieve)
+    monkeypatch.setattr(comparator, "retrieve_by_insurer", lambda feature, keys: {k: [] for k in keys})
+
+    # El LLM no devuelve ninguna entrada reconocible para MAPFRE
+    output = {"comparison": [{"insurer": "Otra", "value": "1%"}]}
+    monkeypatch.setattr(comparator, "_comparison_chain", lambda: RunnableLambda(lambda inputs: output))
+    result, origins = asyncio.run(comparator.acompare("deducible", ["RIMAC", "MAPFRE"]))
+    assert [(e["insurer"], e["value"]) for e in result["comparison"]] == [("RIMAC", "10%"), ("MAPFRE", "No especificado")]
+    assert origins == {"RIMAC": "precomputed"}
+
+    # Si la extracción falla, se sirve igualmente lo conocido
+    def falla(inputs):
+        raise RuntimeError("LLM caído")
+
+    monkeypatch.setattr(comparator, "_comparison_chain", lambda: RunnableLambda(falla))
+    result = json.loads(comparator.compare_policies.invoke({"feature": "deducible", "insurers": ["RIMAC", "MAPFRE"]}))
+    assert result["comparison"][1]["value"] == "No especificado"
@@ -0,0 +1,84 @@
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.core.embedding_cache import CachedEmbeddings, normalize_query
+
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.calls = []
+
+    def embed_query(self, text):
+        self.calls.append(text)
+        return [float(len(text)), 1.0, 0.0]
+
+    async def aembed_query(self, text):
+        return self.embed_query(text)
+
+
+def test_normalize_query():
+    assert normalize_query("  ¿Qué   CUBRE el SOAT? ") == "qué cubre el soat"
+
+
+def test_memory_hits_share_normalized_key():
+    base = CountingEmbeddings()
+    cache = CachedEmbeddings(base, model="m", dimensions=3)
+
+    first = cache.embed_query("¿Qué cubre el SOAT?")
+    second = cache.embed_query("que cubre el soat".replace("que", "qué"))
+
+    assert first == second
+    # Se embebe el texto original; la forma normalizada solo es la clave de la caché
+    assert base.calls == ["¿Qué cubre el SOAT?"]
+    assert cache.stats()["hits_memory"] == 1
+
+
+def test_lru_eviction():
+    base = CountingEmbeddings()
+    cache = CachedEmbeddings(base, model="m", dimensions=3, max_size=2)
+    for text in ["a1", "b2", "c3"]:
+        cache.embed_query(text)
+    cache.embed_query("a1")
+    assert base.calls == ["a1", "b2", "c3", "a1"]
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    db_path = str(tmp_path / "cache.sqlite")
+    cache = CachedEmbeddings(CountingEmbeddings(), model="m", dimensions=3, db_path=db_path)
+    cache.embed_query("deducible")
+
+    base = CountingEmbeddings()
+    restarted = CachedEmbeddings(base, model="m", dimensions=3, db_path=db_path)
+    assert restarted.embed_query("Deducible") == [9.0, 1.0, 0.0]
+    assert base.calls == []
+    assert restarted.stats()["hits_disk"] == 1
+
+    # Otro modelo no reutiliza los vectores
+    other = CachedEmbeddings(base, model="otro", dimensions=3, db_path=db_path)
+    other.embed_query("deducible")
+    assert base.calls == ["deducible"]
+
+
+def test_nivel_en_disco_fuera_del_event_loop(tmp_path):
+    import asyncio
+    import threading
+
+    cache = CachedEmbeddings(CountingEmbeddings(), model="m", dimensions=3, db_path=str(tmp_path / "cache.sqlite"))
+    hilos = []
+    for name in ("_disk_get", "_disk_put"):
+        original = getattr(cache, name)
+        setattr(cache, name, lambda *args, original=original: hilos.append(threading.current_thread()) or original(*args))
+
+    async def run():
+        loop_thread = threading.current_thread()
+        await cache.aembed_query("deducible")
+        cache._memory.clear()
+        vector = await cache.aembed_query("Deducible")
+        return loop_thread, vector
+
+    loop_thread, vector = asyncio.run(run())
+    assert vector == [9.0, 1.0, 0.0]
+    assert cache.stats()["hits_disk"] == 1
+    assert len(hilos) == 3 and loop_thread not in hilos
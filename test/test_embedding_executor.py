@@ -0,0 +1,76 @@
+import sys
+import os
+import asyncio
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.infrastructure.embedding_executor import AsyncEmbeddingExecutor
+
+
+class FakeRateLimitError(Exception):
+    status_code = 429
+
+
+class RateLimitedEmbeddings:
+    """Servidor de embeddings simulado: responde 429 si hay más de `capacity` requests en vuelo."""
+
+    def __init__(self, capacity=2, latency=0.01):
+        self.capacity = capacity
+        self.latency = latency
+        self.in_flight = 0
+        self.calls = 0
+
+    async def aembed_documents(self, texts):
+        self.calls += 1
+        self.in_flight += 1
+        try:
+            if self.in_flight > self.capacity:
+                raise FakeRateLimitError("rate limit")
+            await asyncio.sleep(self.latency)
+            return [[float(len(t)), 1.0] for t in texts]
+        finally:
+            self.in_flight -= 1
+
+
+def test_executor_respeta_orden_y_se_adapta_a_429():
+    fake = RateLimitedEmbeddings(capacity=2)
+    executor = AsyncEmbeddingExecutor(fake, max_concurrency=8, initial_concurrency=8,
+                                      base_backoff=0.001, max_backoff=0.01)
+    batches = [[f"texto {i}" * (i + 1)] for i in range(20)]
+
+    results = asyncio.run(executor.embed_batches(batches))
+
+    assert [r[0][0] for r in results] == [float(len(b[0])) for b in batches]
+    metrics = executor.metrics()
+    assert metrics["requests"] == 20
+    assert metrics["rate_limited"] > 0
+    assert metrics["concurrency"] < 8
+    assert metrics["tokens_per_sec"] > 0
+
+
+def test_executor_propaga_errores_no_transitorios():
+    class Broken:
+        async def aembed_documents(self, texts):
+            raise ValueError("input inválido")
+
+    executor = AsyncEmbeddingExecutor(Broken(), max_concurrency=2)
+    results = asyncio.run(executor.embed_batches([["a"], ["b"]], return_exceptions=True))
+
+    assert all(isinstance(r, ValueError) for r in results)
+    assert executor.metrics()["failures"] == 2
+
+
+def test_metricas_solo_cuentan_el_tiempo_de_embedding():
+    executor = AsyncEmbeddingExecutor(RateLimitedEmbeddings(capacity=8, latency=0.05), max_concurrency=4)
+
+    async def run():
+        await asyncio.sleep(0.3)       # parseo antes del primer envío
+        tasks = [asyncio.create_task(executor.embed([f"texto {i}"])) for i in range(8)]
+        await asyncio.gather(*tasks)
+        await asyncio.sleep(0.3)       # upserts después de la última respuesta
+
+    asyncio.run(run())
+    metrics = executor.metrics()
+    assert metrics["requests"] == 8
+    assert metrics["elapsed_s"] < 0.3
+    assert metrics["max_in_flight"] > 1
@@ -0,0 +1,97 @@
+import sys
+import os
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.core.exemplars import ExemplarIndex
+
+
+def _fake_embed(texts):
+    # Vector one-hot por texto: cada frase solo se parece a sí misma
+    vectors = np.zeros((len(texts), 8), dtype=np.float32)
+    for i, text in enumerate(texts):
+        vectors[i, sum(map(ord, text)) % 8] = 2.0
+    return vectors
+
+
+def test_top_k_ordena_por_score_y_persiste_npy(tmp_path):
+    texts = ["hola", "adios"]
+    path = str(tmp_path / "exemplars.npy")
+    index = ExemplarIndex.load_or_build(path, texts, ["greeting", "farewell"], _fake_embed)
+
+    query = _fake_embed(["adios"])[0] * 5
+    best_text, best_label, best_score = index.top_k(query, k=2)[0]
+    assert (best_text, best_label) == ("adios", "farewell")
+    assert abs(best_score - 1.0) < 1e-5
+
+    # Segunda carga: desde el .npy (mmap), sin volver a generar embeddings
+    def _fail(texts):
+        raise AssertionError("no debería regenerar")
+    reloaded = ExemplarIndex.load_or_build(path, texts, ["greeting", "farewell"], _fail)
+    assert isinstance(reloaded.matrix, np.memmap)
+    assert reloaded.matrix.dtype == np.float32
+
+
+class _CountingEmbeddings:
+    def __init__(self):
+        self.calls = 0
+
+    def embed_query(self, text):
+        self.calls += 1
+        return _fake_embed([text])[0].tolist()
+
+
+def test_semantic_gate_una_pasada_con_el_embedding_del_turno(tmp_path):
+    from types import SimpleNamespace
+    from src.core.semantic_gate import SemanticGate
+    from src.core.query_context import query_turn, embed_query
+
+    threats = ExemplarIndex(["hackear"], ["hackear"], np.asarray(_fake_embed(["hackear"])))
+    intents = ExemplarIndex(["hola"], ["greeting"], np.asarray(_fake_embed(["hola"])))
+    gate = SemanticGate(
+        security=SimpleNamespace(index=threats, threshold=0.82),
+        router=SimpleNamespace(index=intents, threshold=0.85),
+    )
+
+    embeddings = _CountingEmbeddings()
+    with query_turn("Hola", embeddings) as turn:
+        decision = gate.evaluate(turn.vector)
+        # La búsqueda del mismo texto reutiliza el vector del turno
+        assert embed_query("  hola ") == turn.vector
+
+    assert embeddings.calls == 1
+    assert not decision.is_blocked
+    assert decision.intent == "greeting"
+    assert gate.evaluate(_fake_embed(["hackear"])[0]).is_blocked
+
+
+def test_cache_por_frase_solo_embebe_las_nuevas_y_poda_las_eliminadas(tmp_path):
+    path = str(tmp_path / "exemplars.npy")
+    calls = []
+
+    def _embed(texts):
+        calls.append(list(texts))
+        return _fake_embed(texts)
+
+    ExemplarIndex.load_or_build(path, ["hola", "adios"], ["greeting", "farewell"], _embed,
+                                model="m", dimensions=8)
+
+    # Se agrega una frase y se elimina otra: solo se embebe la nueva
+    index = ExemplarIndex.load_or_build(path, ["adios", "gracias"], ["farewell", "thanks"], _embed,
+                                        model="m", dimensions=8)
+    assert calls == [["hola", "adios"], ["gracias"]]
+    assert index.matrix.shape == (2, 8)
+    assert index.top_k(_fake_embed(["adios"])[0], k=1)[0][1] == "farewell"
+
+    # Sin cambios: se abre tal cual (mmap) sin llamar al modelo
+    reloaded = ExemplarIndex.load_or_build(path, ["adios", "gracias"], ["farewell", "thanks"], _embed,
+                                           model="m", dimensions=8)
+    assert isinstance(reloaded.matrix, np.memmap)
+    assert len(calls) == 2
+
+    # Otro modelo invalida todas las filas
+    ExemplarIndex.load_or_build(path, ["adios", "gracias"], ["farewell", "thanks"], _embed,
+                                model="otro", dimensions=8)
+    assert calls[-1] == ["adios", "gracias"]
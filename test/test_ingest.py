@@ -0,0 +1,93 @@
+import sys
+import os
+from pathlib import Path
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.infrastructure.ingest import plan_ingest, chunk_id, ingest_settings, resume_offset, parse_documents
+
+
+def _manifest(files):
+    return {"version": 1, "files": files}
+
+
+def test_plan_ingest_solo_archivos_nuevos_o_modificados():
+    settings = ingest_settings()
+    manifest = _manifest({
+        "rimac/a.pdf": {"sha256": "h1", "settings": settings, "ids": ["x"]},
+        "rimac/b.pdf": {"sha256": "h2", "settings": settings, "ids": ["y"]},
+        "mapfre/c.pdf": {"sha256": "h3", "settings": settings, "ids": ["z"]},
+    })
+    current = {"rimac/a.pdf": "h1", "rimac/b.pdf": "h2-nuevo", "pacifico/d.pdf": "h4"}
+
+    to_index, to_remove = plan_ingest(current, manifest, settings)
+
+    assert to_index == ["pacifico/d.pdf", "rimac/b.pdf"]
+    assert to_remove == ["mapfre/c.pdf"]
+
+
+def test_plan_ingest_reindexa_si_cambia_la_configuracion():
+    settings = ingest_settings()
+    old_settings = dict(settings, chunk_size=500)
+    manifest = _manifest({"rimac/a.pdf": {"sha256": "h1", "settings": old_settings, "ids": []}})
+
+    to_index, to_remove = plan_ingest({"rimac/a.pdf": "h1"}, manifest, settings)
+
+    assert to_index == ["rimac/a.pdf"]
+    assert to_remove == []
+    assert plan_ingest({"rimac/a.pdf": "h1"}, _manifest({}), settings, reprocess=True)[0] == ["rimac/a.pdf"]
+
+
+def test_chunk_id_determinista():
+    assert chunk_id("rimac/a.pdf", "h1", 0) == chunk_id("rimac/a.pdf", "h1", 0)
+    assert chunk_id("rimac/a.pdf", "h1", 0) != chunk_id("rimac/a.pdf", "h1", 1)
+    assert chunk_id("rimac/a.pdf", "h1", 0) != chunk_id("rimac/a.pdf", "h2", 0)
+
+
+def test_ingesta_parcial_se_reanuda_desde_el_ultimo_lote():
+    settings = ingest_settings()
+    partial = {"sha256": "h1", "settings": settings, "status": "partial", "chunks": 10, "committed": 4, "ids": []}
+    manifest = _manifest({"rimac/a.pdf": partial})
+
+    assert plan_ingest({"rimac/a.pdf": "h1"}, manifest, settings)[0] == ["rimac/a.pdf"]
+    assert resume_offset(partial, "h1", settings) == 4
+    # Si el archivo cambió, se reindexa desde cero
+    assert resume_offset(partial, "h2", settings) == 0
+
+
+class _ArchivosContados(dict):
+    """dict que cuenta cuántos archivos ha consumido parse_documents."""
+
+    consumidos = 0
+
+    def items(self):
+        for item in super().items():
+            self.consumidos += 1
+            yield item
+
+
+def test_parse_documents_en_pool_de_procesos(tmp_path):
+    data_dir = Path(__file__).resolve().parent.parent / "data"
+    pdfs = sorted(data_dir.glob("*/*.pdf"), key=lambda p: p.stat().st_size)[:5]
+    corrupto = tmp_path / "rimac" / "corrupto.pdf"
+    corrupto.parent.mkdir()
+    corrupto.write_bytes(b"esto no es un pdf")
+
+    files = _ArchivosContados({p.relative_to(data_dir).as_posix(): p for p in pdfs})
+    files["rimac/corrupto.pdf"] = corrupto
+
+    resultados = {}
+    for rel_path, docs, elapsed, error in parse_documents(files, workers=2):
+        resultados[rel_path] = (docs, error)
+        # Ventana acotada: nunca más de 2 * workers PDFs enviados sin haber retornado
+        assert files.consumidos - len(resultados) <= 4
+
+    assert set(resultados) == set(files)
+    docs, error = resultados["rimac/corrupto.pdf"]
+    assert docs is None and error is not None
+    for pdf in pdfs:
+        docs, error = resultados[pdf.relative_to(data_dir).as_posix()]
+        assert error is None and docs
+        assert {doc.metadata["source"] for doc in docs} == {pdf.name}
+        assert {doc.metadata["insurer"] for doc in docs} == {pdf.parent.name.upper()}
+        assert [doc.metadata["page"] for doc in docs] == list(range(len(docs)))
@@ -0,0 +1,40 @@
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.infrastructure.intent_classifier import IntentClassifier
+
+
+def test_router_local_y_derivacion_al_llm(tmp_path):
+    path = str(tmp_path / "intent_router.joblib")
+    classifier = IntentClassifier.load_or_train(path, threshold=0.8)
+
+    assert classifier.classify("¡Hola, buenos días!")[0] == "SALUDO"
+    assert classifier.classify("Choqué mi auto en la avenida")[0] == "EMERGENCIA"
+    assert classifier.classify("¿Cuál es el deducible de Rimac?")[0] == "CONSULTA"
+
+    llm_calls = []
+
+    def fallback(text):
+        llm_calls.append(text)
+        return "CONSULTA"
+
+    assert classifier.route("me robaron mi auto", fallback) == "EMERGENCIA"
+    assert llm_calls == []
+
+    # Con un umbral inalcanzable toda decisión se deriva al LLM
+    strict = IntentClassifier.load_or_train(path, threshold=1.01)
+    assert strict.route("hola", fallback) == "CONSULTA"
+    assert llm_calls == ["hola"]
+    assert strict.stats()["fallback_rate"] == 1.0
+
+
+def test_scorer_compilado_reproduce_el_pipeline(tmp_path):
+    import numpy as np
+
+    classifier = IntentClassifier.load_or_train(str(tmp_path / "intent_router.joblib"))
+    texts = ["hola", "me chocaron", "cual es el deducible de rimac", "texto sin vocabulario zzz", ""]
+
+    compiled = np.array([classifier.scorer.predict_proba(text) for text in texts])
+    assert np.allclose(compiled, classifier.pipeline.predict_proba(texts))
@@ -0,0 +1,202 @@
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableLambda
+
+from src.core.tools import rag_tool
+from src.core.lexical_index import LexicalIndex
+from src.core.answer_cache import SemanticAnswerCache
+from src.core.tools.rag_tool import (retrieval_path, consult_policy, fuse_rankings,
+                                     INITIAL_K, WIDE_K, FAST_N)
+
+
+class FakeVectorStore:
+    """Devuelve candidatos con los scores indicados (y registra los k pedidos)."""
+
+    def __init__(self, scores):
+        self.scores = scores
+        self.calls = []
+
+    def similarity_search_by_vector_with_relevance_scores(self, vector, k, filter=None):
+        self.calls.append(k)
+        scores = (self.scores + [self.scores[-1]] * k)[:k]
+        # Chroma devuelve distancias: menor = más similar
+        return [(Document(page_content=f"fragmento {i}", metadata={"insurer": "RIMAC"}), 1 - s)
+                for i, s in enumerate(scores)]
+
+    def _select_relevance_score_fn(self):
+        return lambda distance: 1 - distance
+
+
+def test_retrieval_path_segun_forma_de_scores():
+    assert retrieval_path([0.9, 0.88, 0.87] + [0.6] * 12) == "fast"
+    assert retrieval_path([0.71] + [0.70] * 14) == "wide"
+    assert retrieval_path([0.8 - 0.01 * i for i in range(15)]) == "rerank"
+
+
+def _invoke(monkeypatch, scores, cache=None, vector=(0.0,), lexical=()):
+    store = FakeVectorStore(scores)
+    cache = cache or SemanticAnswerCache()
+    monkeypatch.setattr(rag_tool, "get_vectorstore", lambda: store)
+    monkeypatch.setattr(rag_tool, "embed_query", lambda text: list(vector))
+    monkeypatch.setattr(rag_tool, "lexical_search", lambda query, k, filter=None: list(lexical))
+    monkeypatch.setattr(rag_tool, "get_answer_cache", lambda: cache)
+    monkeypatch.setattr(rag_tool, "_answer_chain", lambda: RunnableLambda(lambda x: x["context"]))
+    message = consult_policy.invoke({
+        "type": "tool_call", "id": "1", "name": "consult_policy", "args": {"query": "deducible"}
+    })
+    return store, message
+
+
+def test_consult_policy_camino_rapido_sin_reranking(monkeypatch):
+    store, message = _invoke(monkeypatch, [0.9, 0.88, 0.87] + [0.6] * 12)
+    assert message.artifact["retrieval_path"] == "fast"
+    assert message.artifact["context_docs"] == FAST_N
+    assert store.calls == [INITIAL_K]
+
+
+def test_consult_policy_amplia_k_con_scores_planos(monkeypatch):
+    store, message = _invoke(monkeypatch, [0.71] + [0.70] * 14)
+    assert message.artifact["retrieval_path"] == "wide"
+    assert store.calls == [INITIAL_K, WIDE_K]
+
+
+class RecordingReranker:
+    def __init__(self):
+        self.scores = None
+
+    def rerank(self, query, docs, scores=None, top_n=5):
+        self.docs, self.scores = docs, scores
+        return docs[:top_n]
+
+
+def test_consult_policy_con_bm25_usa_scores_vectoriales(monkeypatch):
+    lexical = [Document(page_content="lexico", metadata={"insurer": "MAPFRE"})]
+
+    # Camino rápido: el contexto son los FAST_N primeros vectoriales, no la lista fusionada por RRF
+    store, message = _invoke(monkeypatch, [0.9, 0.88, 0.87] + [0.6] * 12, lexical=lexical)
+    assert message.artifact["retrieval_path"] == "fast"
+    assert all(f"fragmento {i}" in message.content for i in range(FAST_N))
+    assert "lexico" not in message.content
+
+    # Reranking: recibe la relevancia vectorial de cada fragmento (0 para los que solo halló BM25)
+    reranker = RecordingReranker()
+    monkeypatch.setattr(rag_tool, "get_reranker", lambda: reranker)
+    scores = [0.8 - 0.01 * i for i in range(15)]
+    store, message = _invoke(monkeypatch, scores, lexical=lexical)
+    assert message.artifact["retrieval_path"] == "rerank"
+    relevance = dict(zip((d.page_content for d in reranker.docs), reranker.scores))
+    assert relevance["lexico"] == 0.0
+    assert relevance["fragmento 0"] == scores[0] and relevance["fragmento 2"] == scores[2]
+
+
+def test_indice_lexico_encuentra_codigos_exactos_y_filtra(tmp_path):
+    index = LexicalIndex(str(tmp_path / "lexical.sqlite"))
+    index.upsert(
+        ["a", "b", "c"],
+        ["Producto 0020200013: cobertura de robo.", "Artículo 5: exclusiones generales.", "Póliza de RIMAC."],
+        [{"insurer": "INTERSEGURO"}, {"insurer": "RIMAC"}, {"insurer": "RIMAC"}],
+    )
+    assert [d.id for d, _ in index.search("código 0020200013")] == ["a"]
+    assert [d.id for d, _ in index.search("articulo 5 poliza", filter={"insurer": "RIMAC"})] != []
+    assert index.search("robo", filter={"insurer": {"$in": ["RIMAC"]}}) == []
+
+    index.upsert(["a"], ["Texto nuevo"], [{"insurer": "INTERSEGURO"}])
+    index.delete(["b"])
+    assert index.count() == 2
+    assert index.search("0020200013") == []
+
+
+def test_indice_lexico_se_reconstruye_en_una_transaccion(tmp_path, monkeypatch):
+    from src.core import database
+
+    path = str(tmp_path / "lexical.sqlite")
+    index = LexicalIndex(path)
+    index.upsert(["viejo"], ["Cobertura anterior"], [{"insurer": "RIMAC"}])
+    lector = LexicalIndex(path)      # otro proceso (p. ej. un worker del API)
+    vistos = []
+
+    class FakeChroma:
+        class _collection:
+            count = staticmethod(lambda: 3)
+
+        def get(self, include, limit, offset):
+            # A mitad de la reconstrucción los lectores siguen viendo el índice anterior
+            vistos.append(lector.count())
+            ids = ["a", "b", "c"][offset:offset + limit]
+            return {"ids": ids, "documents": [f"texto {i}" for i in ids], "metadatas": [{}] * len(ids)}
+
+    # Abrir el índice (API) no lo reconstruye; solo la ingesta reconcilia
+    monkeypatch.setattr(database, "LEXICAL_INDEX_PATH", path)
+    monkeypatch.setattr(database, "get_vectorstore", lambda: FakeChroma())
+    monkeypatch.setattr(database.registry, "get", lambda name, factory: factory())
+    assert database.get_lexical_index().count() == 1
+    assert vistos == []
+
+    monkeypatch.setattr(database, "get_lexical_index", lambda: index)
+    database.reconcile_lexical_index()
+    assert vistos and set(vistos) == {1}
+    assert lector.count() == 3 and lector.search("cobertura") == []
+
+
+def test_rrf_prioriza_fragmentos_presentes_en_ambas_listas():
+    docs = {name: Document(page_content=name, id=name) for name in "abcd"}
+    fused, scores = fuse_rankings([docs["a"], docs["b"], docs["c"]], [docs["c"], docs["d"]], limit=3)
+    assert [d.id for d in fused] == ["c", "a", "b"]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_cache_semantica_reutiliza_respuesta_hasta_nueva_generacion(monkeypatch):
+    cache = SemanticAnswerCache(threshold=0.95)
+    scores = [0.8 - 0.01 * i for i in range(15)]
+    monkeypatch.setattr(rag_tool, "get_index_generation", lambda: 1)
+
+    store, first = _invoke(monkeypatch, scores, cache, vector=(1.0, 0.0))
+    assert first.artifact["cache"] == "miss"
+
+    # Consulta parafraseada (vector casi idéntico): no vuelve a buscar
+    store, second = _invoke(monkeypatch, scores, cache, vector=(0.99, 0.05))
+    assert second.artifact["cache"] == "hit"
+    assert second.content == first.content
+    assert store.calls == []
+
+    # La ingesta incrementa la generación: la respuesta anterior deja de valer
+    monkeypatch.setattr(rag_tool, "get_index_generation", lambda: 2)
+    store, third = _invoke(monkeypatch, scores, cache, vector=(1.0, 0.0))
+    assert third.artifact["cache"] == "miss"
+    assert cache.stats()["hits"] == 1 and cache.stats()["expired"] == 1
+
+
+
+def test_cache_semantica_reutiliza_filas_al_descartar():
+    cache = SemanticAnswerCache(threshold=0.95, max_size=2)
+    cache.store("a", (1.0, 0.0, 0.0), "A", {}, 1)
+    cache.store("b", (0.0, 1.0, 0.0), "B", {}, 1)
+    matrix = cache._matrix
+
+    # La tercera respuesta ocupa la fila de la menos usada, sin reconstruir la matriz
+    cache.store("c", (0.0, 0.0, 1.0), "C", {}, 1)
+    assert cache._matrix is matrix and cache.stats()["evicted"] == 1
+    assert cache.lookup((1.0, 0.0, 0.0), 1) is None
+    assert cache.lookup((0.0, 1.0, 0.0), 1)[0] == "B"
+    assert cache.lookup((0.0, 0.0, 1.0), 1)[0] == "C"
+
+def test_precalentamiento_no_registra_consultas(monkeypatch):
+    import asyncio
+
+    registradas = []
+    monkeypatch.setattr(rag_tool, "append_query_log", registradas.append)
+    monkeypatch.setattr(rag_tool, "load_query_log", lambda path, limit: ["deducible", "robo"])
+
+    async def fake_aembed(text):
+        return [0.0]
+
+    monkeypatch.setattr(rag_tool, "aembed_query", fake_aembed)
+    store, message = _invoke(monkeypatch, [0.8 - 0.01 * i for i in range(15)])
+    assert registradas == ["deducible"]
+
+    assert asyncio.run(rag_tool.awarm_answer_cache("consultas.jsonl", limit=2)) == 2
+    assert registradas == ["deducible"]
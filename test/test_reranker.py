@@ -0,0 +1,41 @@
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_core.documents import Document
+
+from src.core.lexical import tokenize
+from src.core.reranker import Reranker, LexicalReranker, LLMReranker
+
+
+def test_tokenize_quita_tildes_y_palabras_vacias():
+    assert tokenize("¿Cuál es el deducible de la Póliza?") == ["deducible", "poliza"]
+
+
+def test_lexical_reranker_combina_bm25_y_score_vectorial():
+    docs = [
+        Document(page_content="Condiciones generales de la póliza vehicular."),
+        Document(page_content="El deducible por robo total es del 20% del siniestro."),
+        Document(page_content="Cobertura de responsabilidad civil frente a terceros."),
+    ]
+    # La búsqueda vectorial los dejó casi empatados; el término 'deducible' decide
+    reranked = LexicalReranker().rerank("deducible por robo", docs, scores=[0.81, 0.80, 0.79], top_n=2)
+    assert reranked[0] is docs[1]
+    assert len(reranked) == 2
+
+
+def test_llm_reranker_parsea_indices_y_cae_al_orden_original():
+    docs = [Document(page_content=str(i)) for i in range(6)]
+    assert [d.page_content for d in LLMReranker._parse("3, 1,x,9", docs, top_n=5)] == ["3", "1"]
+    assert LLMReranker._parse("ninguno", docs, top_n=5) == docs[:5]
+
+
+def test_estrategia_sin_rerank_falla_al_construirse():
+    import pytest
+
+    class Incompleta(Reranker):
+        name = "incompleta"
+
+    with pytest.raises(TypeError):
+        Incompleta()
@@ -0,0 +1,29 @@
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pandas as pd
+
+from src.infrastructure.rules import INTENTS, iter_dataset_rules, entrenar_rules_streaming
+
+
+def test_dataset_por_bloques_es_determinista_y_aumentado():
+    chunks = list(iter_dataset_rules(n_rows=2500, chunk_size=1000, seed=7))
+
+    assert [len(chunk) for chunk in chunks] == [1000, 1000, 500]
+    df = pd.concat(chunks)
+    assert set(df["label"]) == set(INTENTS)
+    # Slots rellenados y variantes sin tildes
+    assert not df["text"].str.contains("{").any()
+    assert df["text"].str.contains("rimac|pacifico|mapfre").any()
+    assert pd.concat(iter_dataset_rules(n_rows=2500, chunk_size=1000, seed=7)).equals(df)
+
+
+def test_entrenamiento_out_of_core():
+    vectorizer, classifier, stats = entrenar_rules_streaming(
+        n_rows=20_000, chunk_size=5_000, n_features=2**16, eval_rows=2_000
+    )
+
+    assert stats["rows"] == 20_000 and stats["holdout_accuracy"] > 0.9
+    assert classifier.predict(vectorizer.transform(["me robaron mi camioneta"]))[0] == "reportar_emergencia"